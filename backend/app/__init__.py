@@ -6,9 +6,10 @@ from flask_mail import Mail
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
-from firebase_admin import credentials
-import firebase_admin
-from .config import FIREBASE_CONFIG
+from .firebase import firebase_project_id
+from .token_cache import TokenVerifier
+from .passwords import PasswordHasher, PasswordHasherBusy
+from .engine import configure_engine, engine_options, sqlite_pragmas
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +18,8 @@ load_dotenv()
 db = SQLAlchemy()
 jwt = JWTManager()
 mail = Mail()
+token_verifier = TokenVerifier()
+password_hasher = PasswordHasher()
 
 def create_app():
     app = Flask(__name__)
@@ -25,23 +28,99 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///tax_services.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLITE_PRAGMAS'] = sqlite_pragmas()
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    app.config['TOKEN_VERSION_CACHE_TTL'] = int(os.getenv('TOKEN_VERSION_CACHE_TTL', 30))
     
     # Email configuration
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('MAIL_USERNAME') or 'no-reply@localhost')
     
-    # Initialize Firebase Admin SDK if not already initialized
-    if not firebase_admin._apps:
-        if FIREBASE_CONFIG:
-            cred = credentials.Certificate(FIREBASE_CONFIG)
-            firebase_admin.initialize_app(cred)
-        else:
-            print("Warning: Firebase configuration not found. Some features may not work.")
+    # Notification outbox: notices are queued in the database and sent by a
+    # background thread (or `flask send-mail`) as one digest per client
+    app.config['MAIL_OUTBOX_ENABLED'] = os.getenv('MAIL_OUTBOX_ENABLED', 'true').lower() == 'true'
+    app.config['MAIL_DIGEST_WINDOW'] = int(os.getenv('MAIL_DIGEST_WINDOW', 60))
+    app.config['MAIL_MIN_INTERVAL'] = int(os.getenv('MAIL_MIN_INTERVAL', 300))
+    app.config['MAIL_RATE_LIMIT'] = int(os.getenv('MAIL_RATE_LIMIT', 60))
+    app.config['MAIL_BATCH_SIZE'] = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    app.config['MAIL_MAX_ATTEMPTS'] = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+    app.config['MAIL_RETRY_BACKOFF'] = float(os.getenv('MAIL_RETRY_BACKOFF', 60))
+    app.config['MAIL_POLL_INTERVAL'] = float(os.getenv('MAIL_POLL_INTERVAL', 10))
+    app.config['MAIL_SEND_TIMEOUT'] = int(os.getenv('MAIL_SEND_TIMEOUT', 600))
+    app.config['MAIL_OUTBOX_RETENTION_DAYS'] = int(os.getenv('MAIL_OUTBOX_RETENTION_DAYS', 30))
+    
+    # Firebase ID token verification cache
+    app.config['FIREBASE_PROJECT_ID'] = os.getenv('FIREBASE_PROJECT_ID')
+    app.config['TOKEN_CACHE_SIZE'] = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+    app.config['TOKEN_CACHE_TTL'] = int(os.getenv('TOKEN_CACHE_TTL', 300))
+    
+    # Password hashing pool; max pending defaults to twice the pool and only
+    # applies backpressure with threaded gunicorn workers
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    app.config['BCRYPT_WORKERS'] = int(os.getenv('BCRYPT_WORKERS', 0)) or None
+    app.config['BCRYPT_MAX_PENDING'] = int(os.getenv('BCRYPT_MAX_PENDING', 0)) or None
+    app.config['BCRYPT_RETRY_AFTER'] = int(os.getenv('BCRYPT_RETRY_AFTER', 2))
+    
+    # Chunked upload limits
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.getenv('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+    app.config['UPLOAD_PARTIAL_TTL'] = int(os.getenv('UPLOAD_PARTIAL_TTL', 24 * 3600))
+    
+    # Uploaded content: 'local' keeps blobs under uploads/.blobs, 's3' puts
+    # them in an S3-compatible bucket (needs boto3) and downloads redirect to
+    # short-lived presigned URLs
+    app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'local')
+    app.config['STORAGE_S3_BUCKET'] = os.getenv('STORAGE_S3_BUCKET')
+    app.config['STORAGE_S3_PREFIX'] = os.getenv('STORAGE_S3_PREFIX', 'blobs/')
+    app.config['STORAGE_S3_ENDPOINT_URL'] = os.getenv('STORAGE_S3_ENDPOINT_URL')
+    app.config['STORAGE_S3_REGION'] = os.getenv('STORAGE_S3_REGION')
+    app.config['STORAGE_S3_URL_TTL'] = int(os.getenv('STORAGE_S3_URL_TTL', 300))
+    
+    # Document downloads: '' serves from Python, 'nginx' sets X-Accel-Redirect,
+    # 'sendfile' sets X-Sendfile for Apache/lighttpd
+    app.config['DOCUMENT_OFFLOAD'] = os.getenv('DOCUMENT_OFFLOAD', '')
+    app.config['DOCUMENT_OFFLOAD_PREFIX'] = os.getenv('DOCUMENT_OFFLOAD_PREFIX', '/protected-uploads/')
+    app.config['USE_X_SENDFILE'] = app.config['DOCUMENT_OFFLOAD'] == 'sendfile'
+    
+    # Request metrics on /metrics (Prometheus text format, scraped with
+    # METRICS_TOKEN as a bearer token; closed when it is unset) and sampled
+    # JSON request logs; slow requests are always logged with their SQL
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', 1000))
+    app.config['REQUEST_LOG_SAMPLE_RATE'] = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', 0.01))
+    
+    # Client dashboard response cache: 'sqlite' is a file shared by all workers
+    # on the host, 'memory' is per process, '' disables it. Memory only sees
+    # its own process's writes, so it is the default only for a single worker
+    # (WEB_CONCURRENCY, gunicorn's worker count) and keeps entries briefly so
+    # writes from CLI commands show up soon
+    web_workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    app.config['DASHBOARD_CACHE'] = os.getenv('DASHBOARD_CACHE', 'sqlite' if web_workers > 1 else 'memory')
+    app.config['DASHBOARD_CACHE_SIZE'] = int(os.getenv('DASHBOARD_CACHE_SIZE', 10000))
+    app.config['DASHBOARD_CACHE_TTL'] = int(os.getenv(
+        'DASHBOARD_CACHE_TTL', 30 if app.config['DASHBOARD_CACHE'] == 'memory' else 300))
+    app.config['DASHBOARD_CACHE_PATH'] = os.getenv('DASHBOARD_CACHE_PATH')
+    
+    # Background jobs: JOB_EXECUTOR is 'thread' or 'process'; with the runner
+    # disabled, jobs only run under `flask run-jobs`
+    app.config['JOB_RUNNER_ENABLED'] = os.getenv('JOB_RUNNER_ENABLED', 'true').lower() == 'true'
+    app.config['JOB_EXECUTOR'] = os.getenv('JOB_EXECUTOR', 'thread')
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    app.config['JOB_RETRY_BACKOFF'] = float(os.getenv('JOB_RETRY_BACKOFF', 5))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 2))
+    app.config['JOB_TIMEOUT'] = int(os.getenv('JOB_TIMEOUT', 900))
+    
+    # Schema and upload directories: created by `flask init-db` at deploy
+    # time, or on the first request when AUTO_INIT_DB is on
+    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
+    app.config['AUTO_INIT_DB'] = os.getenv('AUTO_INIT_DB', 'true').lower() == 'true'
     
     # Configure CORS
     app.config['CORS_HEADERS'] = 'Content-Type'
@@ -50,8 +129,8 @@ def create_app():
              r"/*": {
                  "origins": ["http://localhost:3000"],
                  "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-                 "allow_headers": ["Content-Type", "Authorization", "Accept"],
-                 "expose_headers": ["Content-Type", "Authorization"],
+                 "allow_headers": ["Content-Type", "Authorization", "Accept", "Upload-Offset"],
+                 "expose_headers": ["Content-Type", "Authorization", "ETag", "Content-Range", "Accept-Ranges", "X-Next-Cursor", "Link"],
                  "supports_credentials": False,
                  "send_wildcard": False,
                  "max_age": 3600
@@ -61,27 +140,48 @@ def create_app():
     # Initialize other extensions
     db.init_app(app)
     jwt.init_app(app)
+    from .authz import is_token_revoked
+    jwt.token_in_blocklist_loader(is_token_revoked)
     mail.init_app(app)
+    token_verifier.init_app(app, project_loader=firebase_project_id)
+    password_hasher.init_app(app)
+    from .metrics import request_metrics
+    from .schema import first_request_initializer
+    with app.app_context():
+        configure_engine(db.engine, app.config['SQLITE_PRAGMAS'])
+    request_metrics.init_app(app)
+    from .dashboard_cache import dashboard_cache
+    dashboard_cache.init_app(app)
+    if app.config['AUTO_INIT_DB']:
+        # Registered before the job runner so its first poll finds the tables
+        app.before_request(first_request_initializer(app))
+    from .jobs import job_queue
+    job_queue.init_app(app)
+    from .outbox import outbox
+    outbox.init_app(app)
     
     # Register blueprints
     from .routes.auth import auth_bp
     from .routes.client import client_bp
     from .routes.admin import admin_bp
-    from .routes.documents import documents
+    from .routes.documents import documents, blob_store
+    from .routes.search import search_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(client_bp, url_prefix='/api/client')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(documents, url_prefix='/api/documents')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    blob_store.init_app(app)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(error):
+        response = jsonify({'message': 'Server busy, please retry'})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
     
-    # Create uploads directory if it doesn't exist
-    uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
+    from .commands import register_commands
+    register_commands(app)
     
     # Add root route
     @app.route('/')
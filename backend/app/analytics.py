@@ -0,0 +1,256 @@
+import threading
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models.dashboard_stat import DashboardStat
+from .models.return_change import ReturnChange
+from .models.tax_return import TaxReturn
+
+# numpy and pandas are imported inside the functions that use them: this
+# module loads at startup for its change listener, the frame only on demand.
+
+# Bumped in the writer's transaction on every TaxReturn change, with the ids
+# it wrote logged in return_change under the new value. The counter row stays
+# locked until the writer commits, so versions commit in order and any worker
+# can patch its frame from the ids logged since the version it was built from
+CHANGE_KEY = 'tax_return_changes'
+
+# A write listing more ids than this logs a single NULL row (reload) instead
+MAX_LOGGED_IDS = 1000
+# Frames more versions behind than this, or with more ids to patch, reload
+RETAINED_VERSIONS = 1000
+MAX_PATCH_IDS = 10000
+# Log rows older than RETAINED_VERSIONS are pruned by every PRUNE_INTERVAL-th write
+PRUNE_INTERVAL = 100
+
+stat_table = DashboardStat.__table__
+change_table = ReturnChange.__table__
+
+FRAME_COLUMNS = ['id', 'tax_year', 'status', 'filing_type', 'total_income', 'total_deductions',
+                 'total_tax', 'created_at', 'completed_at']
+CATEGORY_COLUMNS = ['status', 'filing_type']
+MONEY_COLUMNS = ['total_income', 'total_deductions', 'total_tax']
+TURNAROUND_BINS = [0, 7, 14, 30, 60, float('inf')]
+TURNAROUND_LABELS = ['0-7', '7-14', '14-30', '30-60', '60+']
+PERCENTILES = [50, 90, 99]
+
+
+def _percentiles(values):
+    import numpy as np
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {f'p{p}': None for p in PERCENTILES}
+    return {f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _number(value):
+    import pandas as pd
+    return None if pd.isna(value) else float(value)
+
+
+class ReturnAnalytics:
+    def __init__(self):
+        self._frame = None
+        self._version = None
+        self._rollups = {}
+        self._lock = threading.Lock()
+
+    # -- change tracking -------------------------------------------------
+
+    def record_change(self, connection, ids=None):
+        # In the writer's transaction: a rollback leaves no trace, and readers
+        # only see a version once its rows are visible
+        version = connection.execute(
+            update(stat_table).where(stat_table.c.key == CHANGE_KEY)
+            .values(value=stat_table.c.value + 1)
+            .returning(stat_table.c.value)
+        ).scalar()
+        if version is None:
+            # No counter before schema.upgrade(); frames reload on every read
+            return
+        if ids is None or len(ids) > MAX_LOGGED_IDS:
+            rows = [{'version': version, 'return_id': None}]
+        else:
+            rows = [{'version': version, 'return_id': return_id} for return_id in set(ids)]
+        if rows:
+            connection.execute(insert(change_table), rows)
+        if version % PRUNE_INTERVAL == 0:
+            connection.execute(delete(change_table).where(change_table.c.version <= version - RETAINED_VERSIONS))
+
+    def _current_version(self):
+        return db.session.execute(select(stat_table.c.value).where(stat_table.c.key == CHANGE_KEY)).scalar()
+
+    def _changed_ids(self, since, version):
+        # None when the log cannot say which rows changed
+        if not 0 <= version - since <= RETAINED_VERSIONS:
+            return None
+        ids = db.session.execute(
+            select(change_table.c.return_id).distinct()
+            .where(change_table.c.version > since, change_table.c.version <= version)
+        ).scalars().all()
+        if None in ids or len(ids) > MAX_PATCH_IDS:
+            return None
+        return sorted(ids)
+
+    # -- columnar frame --------------------------------------------------
+
+    def _load(self, ids=None):
+        import pandas as pd
+        stmt = select(*[getattr(TaxReturn, column) for column in FRAME_COLUMNS])
+        if ids is not None:
+            stmt = stmt.where(TaxReturn.id.in_(ids))
+        rows = db.session.execute(stmt).all()
+        frame = pd.DataFrame.from_records(rows, columns=FRAME_COLUMNS, index='id', coerce_float=True)
+        for column in MONEY_COLUMNS:
+            frame[column] = frame[column].astype('float64')
+        for column in ('created_at', 'completed_at'):
+            frame[column] = pd.to_datetime(frame[column])
+        for column in CATEGORY_COLUMNS:
+            frame[column] = frame[column].astype('category')
+        return frame
+
+    def _patch(self, ids):
+        import pandas as pd
+        changed = self._load(ids)
+        # Patched on a copy: rollups may still be reading the current frame
+        frame = self._frame.copy()
+        deleted = [i for i in ids if i not in changed.index]
+        existing = changed.index.intersection(frame.index)
+        added = changed.index.difference(frame.index)
+
+        for column in CATEGORY_COLUMNS:
+            missing = set(changed[column].dropna().unique()) - set(frame[column].cat.categories)
+            if missing:
+                frame[column] = frame[column].cat.add_categories(sorted(missing))
+        if len(existing):
+            for column in frame.columns:
+                values = changed.loc[existing, column]
+                frame.loc[existing, column] = values.astype(object) if column in CATEGORY_COLUMNS else values
+        if len(added):
+            frame = pd.concat([frame, changed.loc[added]])
+            for column in CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype('category')
+        if deleted:
+            frame = frame.drop(index=deleted, errors='ignore')
+        self._frame = frame
+
+    def frame(self):
+        return self._snapshot()[0]
+
+    def _snapshot(self):
+        # The version is read before the rows; a change committed in between
+        # is patched again on the next read, which is harmless
+        version = self._current_version()
+        with self._lock:
+            if self._frame is not None and version is not None and version == self._version:
+                return self._frame, version
+
+            ids = None
+            if self._frame is not None and version is not None and self._version is not None:
+                ids = self._changed_ids(self._version, version)
+            if ids is None:
+                self._frame = self._load()
+            elif ids:
+                self._patch(ids)
+
+            self._version = version
+            self._rollups = {}
+            return self._frame, version
+
+    # -- rollups ---------------------------------------------------------
+
+    def rollup(self, tax_year=None):
+        frame, version = self._snapshot()
+        key = (version, tax_year)
+        with self._lock:
+            cached = self._rollups.get(key)
+        if cached is not None:
+            return cached
+
+        if tax_year is not None:
+            frame = frame[frame['tax_year'] == tax_year]
+        result = {
+            'tax_year': tax_year,
+            'total_returns': int(len(frame)),
+            'by_year_and_filing_type': self._grouped_totals(frame),
+            'status_counts': {str(k): int(v) for k, v in frame['status'].value_counts().items() if v},
+            'income_percentiles': _percentiles(frame['total_income'].to_numpy(dtype='float64')),
+            'tax_percentiles': _percentiles(frame['total_tax'].to_numpy(dtype='float64')),
+            'turnaround_days': self._turnaround(frame),
+            'weekly_throughput': self._weekly_throughput(frame)
+        }
+        with self._lock:
+            if version is not None and version == self._version:
+                self._rollups[key] = result
+        return result
+
+    def _grouped_totals(self, frame):
+        import pandas as pd
+        grouped = frame.groupby(['tax_year', 'filing_type'], observed=True, dropna=False).agg(
+            returns=('status', 'size'),
+            total_income=('total_income', 'sum'),
+            total_deductions=('total_deductions', 'sum'),
+            total_tax=('total_tax', 'sum'),
+            mean_income=('total_income', 'mean'),
+            median_tax=('total_tax', 'median')
+        )
+        return [
+            {
+                'tax_year': int(tax_year),
+                'filing_type': None if pd.isna(filing_type) else filing_type,
+                'returns': int(row.returns),
+                'total_income': _number(row.total_income),
+                'total_deductions': _number(row.total_deductions),
+                'total_tax': _number(row.total_tax),
+                'mean_income': _number(row.mean_income),
+                'median_tax': _number(row.median_tax)
+            }
+            for (tax_year, filing_type), row in grouped.iterrows()
+        ]
+
+    def _turnaround(self, frame):
+        import numpy as np
+        import pandas as pd
+        completed = frame[frame['completed_at'].notna() & frame['created_at'].notna()]
+        days = ((completed['completed_at'] - completed['created_at']) / pd.Timedelta(days=1)).to_numpy(dtype='float64')
+        histogram, _ = np.histogram(np.clip(days, 0, None), bins=TURNAROUND_BINS)
+        return {
+            'completed': int(len(days)),
+            'mean': float(days.mean()) if len(days) else None,
+            **_percentiles(days),
+            'histogram': dict(zip(TURNAROUND_LABELS, histogram.tolist()))
+        }
+
+    def _weekly_throughput(self, frame, weeks=26):
+        import pandas as pd
+        completed_at = frame['completed_at'].dropna()
+        if completed_at.empty:
+            return []
+        # Monday of each completion week
+        week_start = (completed_at - pd.to_timedelta(completed_at.dt.weekday, unit='D')).dt.normalize()
+        counts = week_start.value_counts().sort_index().iloc[-weeks:]
+        return [{'week': week.date().isoformat(), 'completed': int(count)} for week, count in counts.items()]
+
+
+return_analytics = ReturnAnalytics()
+
+
+def seed():
+    # Run by schema.upgrade() so record_change() has a counter to bump
+    if db.session.get(DashboardStat, CHANGE_KEY) is not None:
+        return
+    db.session.add(DashboardStat(key=CHANGE_KEY, value=0))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process seeded it first
+        db.session.rollback()
+
+
+@event.listens_for(TaxReturn, 'after_insert')
+@event.listens_for(TaxReturn, 'after_update')
+@event.listens_for(TaxReturn, 'after_delete')
+def _return_changed(mapper, connection, target):
+    return_analytics.record_change(connection, [target.id])
@@ -0,0 +1,122 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import create_access_token, get_jwt, verify_jwt_in_request
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from . import db
+from .models.firebase_identity import FirebaseIdentity
+from .models.token_version import TokenVersion
+from .models.user import User
+
+_versions = {}
+_versions_lock = threading.Lock()
+# Bumped whenever entries are dropped; a lookup that overlapped a drop does
+# not cache what it read, which may predate the change
+_generation = 0
+
+# session.info key for users whose cached versions go once the bump commits
+REVOKED_KEY = 'revoked_token_users'
+
+
+def current_token_version(user_id):
+    # Cached briefly so authorizing a request normally costs no query at all
+    now = time.monotonic()
+    cached = _versions.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    generation = _generation
+
+    # None for a deleted user, so no token issued to that id stays valid
+    row = db.session.execute(
+        select(User.id, TokenVersion.version)
+        .outerjoin(TokenVersion, TokenVersion.user_id == User.id)
+        .where(User.id == user_id)
+    ).first()
+    version = (row.version or 0) if row else None
+    with _versions_lock:
+        if generation == _generation:
+            _versions[user_id] = (version, now + current_app.config['TOKEN_VERSION_CACHE_TTL'])
+    return version
+
+
+def bump_token_version(user_id, connection=None, session=None):
+    if connection is None:
+        session = session or db.session
+        connection = session.connection()
+    result = connection.execute(
+        update(TokenVersion).where(TokenVersion.user_id == user_id).values(version=TokenVersion.version + 1)
+    )
+    if not result.rowcount:
+        connection.execute(insert(TokenVersion).values(user_id=user_id, version=1))
+    _forget_on_commit(session, user_id)
+
+
+def _forget_on_commit(session, user_id):
+    # Until the commit other requests still read the old version; dropping
+    # the cache entry earlier would let them cache it again
+    if session is None:
+        _forget([user_id])
+    else:
+        session.info.setdefault(REVOKED_KEY, set()).add(user_id)
+
+
+def _forget(user_ids):
+    global _generation
+    with _versions_lock:
+        _generation += 1
+        for user_id in user_ids:
+            _versions.pop(user_id, None)
+
+
+def create_user_token(user):
+    return create_access_token(
+        identity=user.id,
+        additional_claims={'role': user.role, 'ver': current_token_version(user.id)}
+    )
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    return jwt_payload.get('ver', 0) != current_token_version(jwt_payload['sub'])
+
+
+def require_role(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            verify_jwt_in_request()
+            if get_jwt().get('role') not in roles:
+                return jsonify({'message': 'Unauthorized'}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+# Tokens carry the role claim, so a role change revokes them like a password
+# change does; any code path that changes or deletes a user goes through these
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    if inspect(target).attrs.role.history.has_changes():
+        bump_token_version(target.id, connection, object_session(target))
+
+
+@event.listens_for(User, 'before_delete')
+def _user_deleted(mapper, connection, target):
+    connection.execute(delete(TokenVersion).where(TokenVersion.user_id == target.id))
+    connection.execute(delete(FirebaseIdentity).where(FirebaseIdentity.user_id == target.id))
+    _forget_on_commit(object_session(target), target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_committed(session):
+    # Also fired when a savepoint is released; only the outer commit counts.
+    # Users left over from a rollback are dropped with the next commit,
+    # which costs one extra lookup each
+    if session.in_nested_transaction():
+        return
+    user_ids = session.info.pop(REVOKED_KEY, None)
+    if user_ids:
+        _forget(user_ids)
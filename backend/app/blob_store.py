@@ -0,0 +1,181 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+
+from . import db
+from .document_tasks import derived_paths
+from .models.blob import Blob, BlobReference
+from .storage import LocalStorage, storage_from_config
+
+READ_BLOCK_SIZE = 64 * 1024
+
+RELEASED_KEY = 'released_blobs'
+STORED_KEY = 'stored_blobs'
+
+
+class BlobStore:
+    def __init__(self, root, derived_dir=None):
+        # Uploads are staged under root/tmp whatever the backend, so local
+        # saves are a same-filesystem rename
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.derived_dir = derived_dir
+        self.storage = LocalStorage(root)
+
+    def init_app(self, app):
+        self.storage = storage_from_config(app.config, self.root)
+
+    def blob_path(self, sha256):
+        # None when the bytes live in a remote backend
+        return self.storage.local_path(sha256)
+
+    def save_stream(self, stream):
+        # Copy an upload to a temp file in the store, hashing as it goes
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            f = open(tmp_path, 'wb')
+        except FileNotFoundError:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            f = open(tmp_path, 'wb')
+        with f:
+            while True:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                f.write(block)
+                hasher.update(block)
+                size += len(block)
+        return tmp_path, hasher.hexdigest(), size
+
+    def _acquire(self, sha256, size):
+        # True when this transaction created the blob row
+        result = db.session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+        )
+        if result.rowcount:
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(sha256=sha256, size=size, ref_count=1))
+        except IntegrityError:
+            # Another request stored the same content first
+            db.session.execute(
+                update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+            )
+            return False
+        # Unless the caller commits, nothing will reference the bytes stored next
+        db.session.info.setdefault(STORED_KEY, []).append((self, sha256))
+        return True
+
+    def _release(self, sha256):
+        db.session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - 1)
+        )
+        result = db.session.execute(
+            delete(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0)
+        )
+        if result.rowcount:
+            # The bytes go only once the row delete has committed
+            db.session.info.setdefault(RELEASED_KEY, []).append((self, sha256))
+
+    def _delete_unreferenced(self, sha256):
+        # A placeholder row holds the key while the bytes are removed, so a
+        # concurrent ingest of the same content waits on it and then stores
+        # the bytes again; if the content was re-added since the release,
+        # the insert fails and the bytes stay
+        blobs = Blob.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(blobs).values(sha256=sha256, size=0, ref_count=0))
+                self.storage.delete(sha256)
+                self._delete_derived(sha256)
+                connection.execute(delete(blobs).where(blobs.c.sha256 == sha256, blobs.c.ref_count <= 0))
+        except IntegrityError:
+            pass
+
+    def _delete_derived(self, sha256):
+        if self.derived_dir is None:
+            return
+        for path in derived_paths(self.derived_dir, sha256):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def ingest(self, owner_uid, path, tmp_path, sha256, size):
+        # The blob row is claimed before the bytes are stored. An existing
+        # row was committed after its bytes were saved, so a duplicate
+        # upload skips the save (for S3, a PUT of the whole file).
+        # Runs in the caller's transaction; the caller commits
+        if self._acquire(sha256, size):
+            self.storage.save(sha256, tmp_path)
+        else:
+            self.discard_tmp(tmp_path)
+
+        reference = BlobReference.query.filter_by(owner_uid=owner_uid, path=path).first()
+        if reference:
+            previous = reference.sha256
+            reference.sha256 = sha256
+            reference.created_at = datetime.utcnow()
+            db.session.flush()
+            self._release(previous)
+        else:
+            reference = BlobReference(owner_uid=owner_uid, path=path, sha256=sha256)
+            db.session.add(reference)
+            db.session.flush()
+        return reference
+
+    def list(self, owner_uid):
+        # Served by the (owner_uid, path) unique index, never a directory walk
+        return BlobReference.query.options(joinedload(BlobReference.blob))\
+            .filter_by(owner_uid=owner_uid).order_by(BlobReference.path).all()
+
+    def resolve(self, owner_uid, path):
+        return BlobReference.query.filter_by(owner_uid=owner_uid, path=path).first()
+
+    def remove(self, owner_uid, path):
+        reference = BlobReference.query.filter_by(owner_uid=owner_uid, path=path).first()
+        if not reference:
+            return False
+        sha256 = reference.sha256
+        db.session.delete(reference)
+        db.session.flush()
+        self._release(sha256)
+        db.session.commit()
+        return True
+
+    def discard_tmp(self, tmp_path):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_released(session):
+    # Also fired when a savepoint is released; only the outer commit counts
+    if session.in_nested_transaction():
+        return
+    session.info.pop(STORED_KEY, None)
+    for store, sha256 in session.info.pop(RELEASED_KEY, ()):
+        store._delete_unreferenced(sha256)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted(session, transaction):
+    # Anything left when the outer transaction ends was rolled back (or the
+    # session closed without committing): the releases never happened and
+    # the bytes stored for new blobs are unreferenced. Savepoints and their
+    # rollbacks (see _acquire) leave both lists alone
+    if transaction.parent is not None:
+        return
+    session.info.pop(RELEASED_KEY, None)
+    for store, sha256 in session.info.pop(STORED_KEY, ()):
+        store._delete_unreferenced(sha256)
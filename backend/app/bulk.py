@@ -0,0 +1,134 @@
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, select, update
+
+from . import db, search, stats
+from .analytics import return_analytics
+from .dashboard_cache import dashboard_cache
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .models.user import User
+from .outbox import outbox
+
+RETURN_STATUSES = ('not_started', 'in_progress', 'review', 'completed')
+RETURN_FILTERS = ('status', 'tax_year', 'filing_type')
+MAX_BULK_ROWS = 10000
+
+return_table = TaxReturn.__table__
+document_table = Document.__table__
+
+
+class BulkUpdateError(ValueError):
+    pass
+
+
+def _parse_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        raise BulkUpdateError('ids must be a non-empty list')
+    if any(not isinstance(value, int) or isinstance(value, bool) for value in ids):
+        raise BulkUpdateError('ids must be integers')
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BULK_ROWS:
+        raise BulkUpdateError(f'At most {MAX_BULK_ROWS} ids per request')
+    return ids
+
+
+def _return_condition(ids, filters):
+    if (ids is None) == (filters is None):
+        raise BulkUpdateError('Provide either ids or filter')
+    if ids is not None:
+        return TaxReturn.id.in_(ids)
+    if not isinstance(filters, dict) or not filters:
+        raise BulkUpdateError('filter must name at least one of: ' + ', '.join(RETURN_FILTERS))
+    unknown = [name for name in filters if name not in RETURN_FILTERS]
+    if unknown:
+        raise BulkUpdateError('Unknown filters: ' + ', '.join(unknown))
+    conditions = []
+    for name, value in filters.items():
+        if name == 'tax_year':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise BulkUpdateError('Invalid tax_year')
+        conditions.append(getattr(TaxReturn, name) == value)
+    return and_(*conditions)
+
+
+def _results(requested, found, outcome):
+    results = [{'id': row_id, 'result': outcome if row_id in found else 'not_found'} for row_id in requested]
+    return {outcome: len(found), 'not_found': len(requested) - len(found), 'results': results}
+
+
+def update_returns(ids=None, filters=None, status=None, notes=None):
+    if ids is not None:
+        ids = _parse_ids(ids)
+    condition = _return_condition(ids, filters)
+    if status is None and notes is None:
+        raise BulkUpdateError('Nothing to update; provide status and/or notes')
+    if status is not None and status not in RETURN_STATUSES:
+        raise BulkUpdateError('Invalid status')
+
+    # Lock the matched rows first: their old statuses drive the counter
+    # deltas and notices, and the UPDATE below touches exactly this set
+    rows = db.session.execute(
+        select(TaxReturn.id, TaxReturn.user_id, TaxReturn.status, TaxReturn.tax_year, User.email)
+        .outerjoin(User, User.id == TaxReturn.user_id)
+        .where(condition)
+        .order_by(TaxReturn.id)
+        .limit(MAX_BULK_ROWS + 1)
+        .with_for_update(of=TaxReturn)
+    ).all()
+    if len(rows) > MAX_BULK_ROWS:
+        db.session.rollback()
+        raise BulkUpdateError(f'Filter matches more than {MAX_BULK_ROWS} returns')
+    matched = [row.id for row in rows]
+    if ids is None:
+        ids = matched
+
+    if matched:
+        values = {}
+        if notes is not None:
+            values['notes'] = notes
+        if status is not None:
+            values['status'] = status
+            # Same rule as TaxReturn.set_status, evaluated per row
+            values['completed_at'] = case(
+                (return_table.c.status == 'completed', return_table.c.completed_at),
+                else_=datetime.utcnow()
+            ) if status == 'completed' else None
+        db.session.execute(update(return_table).where(return_table.c.id.in_(matched)).values(**values))
+
+        # Core writes skip mapper events (see app/stats.py, app/search.py)
+        connection = db.session.connection()
+        changed = [row for row in rows if status is not None and row.status != status]
+        if status is not None:
+            stats.adjust(connection, {'pending_returns': sum(
+                (status == 'in_progress') - (row.status == 'in_progress') for row in changed
+            )})
+        if notes is not None:
+            search.index_records(connection, 'tax_return', matched)
+        return_analytics.record_change(connection, matched)
+        outbox.notify_many([(row.email, 'return_status_changed', {'tax_year': row.tax_year, 'status': status})
+                            for row in changed])
+    db.session.commit()
+    dashboard_cache.invalidate({row.user_id for row in rows})
+
+    return _results(ids, set(matched), 'updated')
+
+
+def delete_documents(ids):
+    ids = _parse_ids(ids)
+    rows = db.session.execute(
+        select(Document.id, Document.user_id).where(Document.id.in_(ids)).with_for_update()
+    ).all()
+    found = [row.id for row in rows]
+
+    if found:
+        db.session.execute(delete(document_table).where(document_table.c.id.in_(found)))
+        connection = db.session.connection()
+        stats.adjust(connection, {'total_documents': -len(found)})
+        search.remove_records(connection, 'document', found)
+    db.session.commit()
+    dashboard_cache.invalidate({row.user_id for row in rows})
+
+    return _results(ids, set(found), 'deleted')
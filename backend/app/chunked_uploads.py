@@ -0,0 +1,203 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class OffsetMismatch(UploadError):
+    status_code = 409
+
+    def __init__(self, expected):
+        super().__init__(f'Expected offset {expected}')
+        self.expected = expected
+
+
+class ChecksumMismatch(UploadError):
+    status_code = 422
+
+    def __init__(self, actual):
+        super().__init__('Checksum mismatch')
+        self.actual = actual
+
+
+class ChunkedUploadStore:
+    def __init__(self, root):
+        self.root = root
+        # upload_id -> (offset, writes, running sha256). The state file counts
+        # every write; a digest is reused only if this process made all of
+        # them, otherwise it is rebuilt from the partial file
+        self._hashers = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.root, upload_id + '.json')
+
+    def part_path(self, upload_id):
+        return os.path.join(self.root, upload_id + '.part')
+
+    def completed_path(self, upload_id):
+        return os.path.join(self.root, upload_id + '.done')
+
+    def _lock(self, upload_id):
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    @contextmanager
+    def _locked(self, upload_id):
+        # The thread lock serializes this process; flock on the part file
+        # serializes gunicorn workers handling retries of the same chunk
+        with self._lock(upload_id):
+            try:
+                f = open(self.part_path(upload_id), 'r+b')
+            except (OSError, ValueError):
+                raise UploadNotFound('Upload not found')
+            with f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                yield f
+
+    def _save(self, state):
+        tmp_path = self._state_path(state['upload_id']) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path(state['upload_id']))
+
+    def create(self, user_id, filename, size=None):
+        state = {
+            'upload_id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'writes': 0,
+            'created_at': time.time()
+        }
+        os.makedirs(self.root, exist_ok=True)
+        open(self.part_path(state['upload_id']), 'wb').close()
+        self._save(state)
+        self._hashers[state['upload_id']] = (0, 0, hashlib.sha256())
+        return state
+
+    def get(self, upload_id, user_id):
+        if not upload_id.isalnum():
+            raise UploadNotFound('Upload not found')
+        try:
+            with open(self._state_path(upload_id)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFound('Upload not found')
+        if state['user_id'] != user_id:
+            raise UploadNotFound('Upload not found')
+        return state
+
+    def append(self, upload_id, user_id, offset, stream, max_bytes):
+        if not upload_id.isalnum():
+            raise UploadNotFound('Upload not found')
+        with self._locked(upload_id) as f:
+            state = self.get(upload_id, user_id)
+            if state.get('completed'):
+                raise UploadNotFound('Upload not found')
+            if offset != state['offset']:
+                raise OffsetMismatch(state['offset'])
+
+            hasher = self._hasher(upload_id, state, f).copy()
+            written = 0
+            f.seek(offset)
+            # Drop bytes from an interrupted chunk that was never acknowledged
+            f.truncate()
+            while True:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    f.truncate(offset)
+                    raise UploadError(f'Chunk exceeds {max_bytes} bytes')
+                if state['size'] is not None and offset + written > state['size']:
+                    f.truncate(offset)
+                    raise UploadError('Chunk extends past the declared upload size')
+                f.write(block)
+                hasher.update(block)
+            f.flush()
+
+            state['offset'] = offset + written
+            state['writes'] = state.get('writes', 0) + 1
+            self._hashers[upload_id] = (state['offset'], state['writes'], hasher)
+            self._save(state)
+            return state
+
+    def _hasher(self, upload_id, state, f):
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[:2] == (state['offset'], state.get('writes', 0)):
+            return cached[2]
+
+        hasher = hashlib.sha256()
+        remaining = state['offset']
+        f.seek(0)
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+        return hasher
+
+    def complete(self, upload_id, user_id, expected_sha256=None):
+        if not upload_id.isalnum():
+            raise UploadNotFound('Upload not found')
+        with self._locked(upload_id) as f:
+            state = self.get(upload_id, user_id)
+            if state.get('completed'):
+                raise UploadNotFound('Upload not found')
+            if state['size'] is not None and state['offset'] != state['size']:
+                raise OffsetMismatch(state['offset'])
+            state['sha256'] = self._hasher(upload_id, state, f).hexdigest()
+            # Checked before anything changes, so the client can resend
+            # chunks or abort
+            if expected_sha256 and expected_sha256.lower() != state['sha256']:
+                raise ChecksumMismatch(state['sha256'])
+            # Still under the lock: later appends are refused and the bytes
+            # that were hashed move out of reach of any waiting writer
+            state['completed'] = True
+            self._save(state)
+            os.replace(self.part_path(upload_id), self.completed_path(upload_id))
+            state['path'] = self.completed_path(upload_id)
+            return state
+
+    def purge_stale(self, max_age):
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.root):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.root, name)) < cutoff:
+                    self.discard(upload_id)
+            except OSError:
+                pass
+
+    def discard(self, upload_id):
+        for path in (self.part_path(upload_id), self.completed_path(upload_id), self._state_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._hashers.pop(upload_id, None)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
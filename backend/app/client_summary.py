@@ -0,0 +1,89 @@
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import load_only, raiseload
+
+from . import db
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .models.user import User
+from .pagination import after_cursor, encode_cursor, page_limit
+
+UNTYPED = 'unspecified'
+
+
+def overview_statement(limit):
+    # One statement per page: the page of clients, their document counts per
+    # type and their latest return, with the aggregates limited to the page
+    page = after_cursor(select(User.id).where(User.role == 'client'), User, User.created_at)\
+        .order_by(User.created_at.desc(), User.id.desc())\
+        .limit(limit + 1)\
+        .cte('client_page')
+    page_ids = select(page.c.id)
+
+    document_counts = select(
+        Document.user_id,
+        Document.document_type,
+        func.count().label('count'),
+        func.max(Document.upload_date).label('last_upload')
+    ).where(Document.user_id.in_(page_ids))\
+        .group_by(Document.user_id, Document.document_type)\
+        .subquery()
+
+    ranked_returns = select(
+        TaxReturn.user_id,
+        TaxReturn.id,
+        TaxReturn.tax_year,
+        TaxReturn.status,
+        func.row_number().over(partition_by=TaxReturn.user_id,
+                               order_by=(TaxReturn.created_at.desc(), TaxReturn.id.desc())).label('position')
+    ).where(TaxReturn.user_id.in_(page_ids)).subquery()
+
+    # The relationships stay unloaded; touching them would be one query per client
+    return select(
+        User,
+        document_counts.c.document_type,
+        document_counts.c.count,
+        document_counts.c.last_upload,
+        ranked_returns.c.id,
+        ranked_returns.c.tax_year,
+        ranked_returns.c.status
+    ).join(page, page.c.id == User.id)\
+        .outerjoin(document_counts, document_counts.c.user_id == User.id)\
+        .outerjoin(ranked_returns, and_(ranked_returns.c.user_id == User.id, ranked_returns.c.position == 1))\
+        .options(load_only(User.email, User.first_name, User.last_name, User.created_at, User.last_login),
+                 raiseload('*'))
+
+
+def client_overview():
+    limit = page_limit()
+    clients = {}
+    for user, document_type, count, last_upload, return_id, tax_year, status in \
+            db.session.execute(overview_statement(limit)):
+        client = clients.get(user.id)
+        if client is None:
+            client = clients[user.id] = {
+                'id': user.id,
+                'email': user.email,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'created_at': user.created_at,
+                'last_login': user.last_login.isoformat() if user.last_login else None,
+                'document_count': 0,
+                'documents_by_type': {},
+                'last_upload': None,
+                'latest_return': {'id': return_id, 'tax_year': tax_year, 'status': status} if return_id else None
+            }
+        if count:
+            client['document_count'] += count
+            client['documents_by_type'][document_type or UNTYPED] = count
+            if client['last_upload'] is None or last_upload > client['last_upload']:
+                client['last_upload'] = last_upload
+
+    # Joined rows come back in no particular order; restore the page order
+    page = sorted(clients.values(), key=lambda client: (client['created_at'], client['id']), reverse=True)
+    next_cursor = encode_cursor(page[limit - 1]['created_at'], page[limit - 1]['id']) if len(page) > limit else None
+    page = page[:limit]
+    for client in page:
+        client['created_at'] = client['created_at'].isoformat()
+        if client['last_upload']:
+            client['last_upload'] = client['last_upload'].isoformat()
+    return page, next_cursor
@@ -0,0 +1,76 @@
+import click
+from flask import current_app
+
+from .schema import initialize, upgrade
+
+
+def register_commands(app):
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        created = upgrade()
+        for name in created:
+            print(f"Created index {name}")
+        print("Database schema is up to date")
+
+    @app.cli.command('init-db')
+    def init_db():
+        # One-time setup for deployments that run with AUTO_INIT_DB=false
+        created = initialize(current_app)
+        for name in created:
+            print(f"Created {name}")
+        print("Database and upload folders are initialized")
+
+    @app.cli.command('run-jobs')
+    @click.option('--once', is_flag=True, help='Exit when no jobs are runnable')
+    def run_jobs(once):
+        # Dedicated worker process; pair with JOB_RUNNER_ENABLED=false on the web tier
+        from .jobs import job_queue
+        try:
+            job_queue.run(once=once)
+        finally:
+            job_queue.stop(wait=True)
+
+    @app.cli.command('send-mail')
+    @click.option('--once', is_flag=True, help='Exit when no digests are due')
+    def send_mail(once):
+        # Dedicated sender process; pair with MAIL_OUTBOX_ENABLED=false on the web tier
+        from .outbox import outbox
+        try:
+            outbox.run(once=once)
+        finally:
+            outbox.stop(wait=True)
+
+    @app.cli.command('mail-sink')
+    @click.option('--host', default='127.0.0.1', show_default=True)
+    @click.option('--port', default=1025, show_default=True)
+    def mail_sink(host, port):
+        # Local SMTP stand-in for development: run with MAIL_SERVER=127.0.0.1,
+        # MAIL_PORT=1025 and MAIL_USE_TLS=false
+        from .smtp_sink import SMTPSink
+
+        def show(mail_from, rcpt_to, message):
+            print(f"--- {mail_from} -> {', '.join(rcpt_to)}: {message['Subject']}")
+            print(message.get_body(('plain',)).get_content())
+
+        sink = SMTPSink(host, port, on_message=show)
+        print(f"SMTP sink listening on {sink.host}:{sink.port}")
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    @app.cli.command('s3-sink')
+    @click.option('--host', default='127.0.0.1', show_default=True)
+    @click.option('--port', default=9000, show_default=True)
+    def s3_sink(host, port):
+        # Local S3 stand-in for development: run with STORAGE_BACKEND=s3,
+        # STORAGE_S3_BUCKET=<any>, STORAGE_S3_ENDPOINT_URL=http://127.0.0.1:9000
+        # and any AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY
+        from .s3_sink import S3Sink
+
+        sink = S3Sink(host, port)
+        print(f"S3 sink listening on {sink.endpoint_url} (objects are kept in memory)")
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
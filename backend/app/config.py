@@ -1,21 +1,24 @@
 import os
 import json
+from functools import lru_cache
 from pathlib import Path
 
 # Get the path to the service account file
 service_account_path = Path(__file__).parent.parent / 'taxservices-72ea6-firebase-adminsdk-sakqk-ab79108bb5.json'
 
-# Load the service account file
-try:
-    with open(service_account_path) as f:
-        service_account = json.load(f)
-except FileNotFoundError:
-    print("Warning: Service account file not found. Using environment variables if available.")
-    service_account = None
-
-# Firebase configuration
-if service_account:
-    FIREBASE_CONFIG = {
+@lru_cache(maxsize=1)
+def firebase_config():
+    # Read on first use rather than at import, so starting the app does not
+    # touch the filesystem for credentials it may never need
+    try:
+        with open(service_account_path) as f:
+            service_account = json.load(f)
+    except FileNotFoundError:
+        print("Warning: Service account file not found. Using environment variables if available.")
+        print("No Firebase configuration available. Please ensure service account file exists.")
+        return None
+    
+    return {
         "type": service_account.get("type"),
         "project_id": service_account.get("project_id"),
         "private_key_id": service_account.get("private_key_id"),
@@ -27,7 +30,3 @@ if service_account:
         "auth_provider_x509_cert_url": service_account.get("auth_provider_x509_cert_url"),
         "client_x509_cert_url": service_account.get("client_x509_cert_url")
     }
-else:
-    # Fallback to environment variables if service account file is not found
-    FIREBASE_CONFIG = None
-    print("No Firebase configuration available. Please ensure service account file exists.")
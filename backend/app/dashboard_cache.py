@@ -0,0 +1,295 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from .models.document import Document
+from .models.tax_return import TaxReturn
+
+PENDING_KEY = 'dashboard_cache_users'
+
+
+def make_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+# Every entry carries the generation it was read under. invalidate() stamps
+# the key with a fresh generation, so a request that read the old rows and
+# stores its body after a concurrent commit is discarded instead of cached.
+# Evicted keys fall back to the floor (the highest generation ever evicted),
+# which keeps that check conservative without remembering every key.
+
+class MemoryBackend:
+    # Per process: writes from other workers or CLI commands are only seen
+    # once an entry expires
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self._floor, None
+            self._entries.move_to_end(key)
+            generation, stored_at, cached = entry
+            if cached is None or (self.ttl and time.time() - stored_at > self.ttl):
+                return generation, None
+            return generation, cached
+
+    def put(self, key, generation, cached):
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry[0] if entry else self._floor) != generation:
+                return
+            self._entries[key] = (generation, time.time(), cached)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._generation = max(self._generation, self._floor) + 1
+            for key in keys:
+                self._entries[key] = (self._generation, 0, None)
+                self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for generation, _, _ in self._entries.values():
+                self._floor = max(self._floor, generation)
+            self._entries.clear()
+            self._generation = self._floor
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            _, (generation, _, _) = self._entries.popitem(last=False)
+            self._floor = max(self._floor, generation)
+
+
+class SQLiteBackend:
+    # A local file shared by every gunicorn worker (and CLI command) on the
+    # host; invalidations from any process are seen by all of them
+    def __init__(self, path, max_entries=10000, ttl=300, timeout=5):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript('''
+            CREATE TABLE IF NOT EXISTS dashboard_cache (
+                key TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                body BLOB
+            );
+            CREATE INDEX IF NOT EXISTS ix_dashboard_cache_accessed_at ON dashboard_cache (accessed_at);
+            CREATE TABLE IF NOT EXISTS dashboard_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO dashboard_cache_meta VALUES ('generation', 0), ('floor', 0);
+        ''')
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork (gunicorn --preload)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL')
+            # Losing the cache in a power failure only costs a recomputation
+            connection.execute('PRAGMA synchronous = OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _floor(self, connection):
+        return connection.execute("SELECT value FROM dashboard_cache_meta WHERE name = 'floor'").fetchone()[0]
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute('SELECT generation, stored_at, etag, body FROM dashboard_cache WHERE key = ?',
+                                 (key,)).fetchone()
+        if row is None:
+            return self._floor(connection), None
+        generation, stored_at, etag, body = row
+        now = time.time()
+        if etag is None or (self.ttl and now - stored_at > self.ttl):
+            return generation, None
+        connection.execute('UPDATE dashboard_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return generation, (etag, body)
+
+    def put(self, key, generation, cached):
+        connection = self._connection()
+        etag, body = cached
+        now = time.time()
+        with self._transaction(connection):
+            row = connection.execute('SELECT generation FROM dashboard_cache WHERE key = ?', (key,)).fetchone()
+            if (row[0] if row else self._floor(connection)) != generation:
+                return
+            connection.execute(
+                'INSERT INTO dashboard_cache VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET stored_at = excluded.stored_at, '
+                'accessed_at = excluded.accessed_at, etag = excluded.etag, body = excluded.body',
+                (key, generation, now, now, etag, body)
+            )
+            self._evict(connection)
+
+    def invalidate(self, keys):
+        connection = self._connection()
+        now = time.time()
+        with self._transaction(connection):
+            connection.execute("UPDATE dashboard_cache_meta SET value = value + 1 WHERE name = 'generation'")
+            generation = connection.execute(
+                "SELECT value FROM dashboard_cache_meta WHERE name = 'generation'"
+            ).fetchone()[0]
+            connection.executemany(
+                'INSERT INTO dashboard_cache VALUES (?, ?, 0, ?, NULL, NULL) '
+                'ON CONFLICT (key) DO UPDATE SET generation = excluded.generation, stored_at = 0, '
+                'accessed_at = excluded.accessed_at, etag = NULL, body = NULL',
+                [(key, generation, now) for key in keys]
+            )
+            self._evict(connection)
+
+    def clear(self):
+        connection = self._connection()
+        with self._transaction(connection):
+            self._raise_floor(connection, 'SELECT MAX(generation) FROM dashboard_cache')
+            connection.execute('DELETE FROM dashboard_cache')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM dashboard_cache').fetchone()[0]
+
+    @contextmanager
+    def _transaction(self, connection):
+        # Takes the write lock up front so the generation check and the write
+        # cannot interleave with another worker's invalidation
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _raise_floor(self, connection, generation_query, params=()):
+        connection.execute(
+            f"UPDATE dashboard_cache_meta SET value = MAX(value, COALESCE(({generation_query}), 0)) "
+            f"WHERE name = 'floor'", params
+        )
+
+    def _evict(self, connection):
+        excess = connection.execute('SELECT COUNT(*) FROM dashboard_cache').fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        oldest = 'SELECT key FROM dashboard_cache ORDER BY accessed_at LIMIT ?'
+        self._raise_floor(connection, f'SELECT MAX(generation) FROM dashboard_cache WHERE key IN ({oldest})',
+                          (excess,))
+        connection.execute(f'DELETE FROM dashboard_cache WHERE key IN ({oldest})', (excess,))
+
+
+class DashboardCache:
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        kind = app.config['DASHBOARD_CACHE']
+        size = app.config['DASHBOARD_CACHE_SIZE']
+        ttl = app.config['DASHBOARD_CACHE_TTL']
+        if kind == 'memory':
+            self.backend = MemoryBackend(size, ttl)
+        elif kind == 'sqlite':
+            path = app.config['DASHBOARD_CACHE_PATH'] or os.path.join(app.instance_path, 'dashboard_cache.db')
+            self.backend = SQLiteBackend(path, size, ttl)
+        elif kind:
+            raise ValueError(f'Unknown DASHBOARD_CACHE backend: {kind}')
+        else:
+            self.backend = None
+
+    def get(self, user_id):
+        # Returns (generation, (etag, body) or None); pass the generation to put()
+        if self.backend is None:
+            return None, None
+        generation, cached = self.backend.get(str(user_id))
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return generation, cached
+
+    def put(self, user_id, generation, body):
+        cached = (make_etag(body), body)
+        if self.backend is not None:
+            self.backend.put(str(user_id), generation, cached)
+        return cached
+
+    def invalidate(self, user_ids):
+        # For Core writes that bypass the mapper events; call after commit
+        keys = {str(user_id) for user_id in user_ids if user_id is not None}
+        if self.backend is not None and keys:
+            self.backend.invalidate(keys)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.backend) if self.backend is not None else 0
+        }
+
+
+dashboard_cache = DashboardCache()
+
+
+# ORM writes: collect the owners touched in the flush and invalidate once the
+# transaction commits, so no request can re-cache the pre-commit rows. Owners
+# left over from a rollback are invalidated with the next commit, which is
+# harmless.
+
+def _owners(target):
+    history = inspect(target).attrs.user_id.history
+    return {target.user_id, *history.deleted}
+
+
+def _touched(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_KEY, set()).update(_owners(target))
+
+
+for _model in (Document, TaxReturn):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _touched)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # Also fired when a savepoint is released; only the outer commit counts
+    if session.in_nested_transaction():
+        return
+    users = session.info.pop(PENDING_KEY, None)
+    if users:
+        dashboard_cache.invalidate(users)
+
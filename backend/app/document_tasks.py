@@ -0,0 +1,169 @@
+import os
+import re
+import zipfile
+
+from .storage import create_storage
+
+# Post-upload processing. These run in the job runner's worker pool (possibly
+# a separate process), so they take plain paths and storage settings, return
+# plain dicts and never touch the database.
+
+SNIFF_BYTES = 8192
+THUMBNAIL_SIZE = (256, 256)
+MAX_TEXT_CHARS = 1024 * 1024
+DERIVED_SUFFIXES = ('.txt', '.png')
+
+EXTENSION_TYPES = {
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg'
+}
+
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+PDF_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+DOCX_PAGES = re.compile(rb'<Pages>(\d+)</Pages>')
+XML_PARAGRAPH = re.compile(r'</w:p>')
+XML_TAG = re.compile(r'<[^>]+>')
+
+
+def sniff_type(path):
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(OLE2_MAGIC):
+        return 'application/msword'
+    if head.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                if 'word/document.xml' in archive.namelist():
+                    return EXTENSION_TYPES['docx']
+        except zipfile.BadZipFile:
+            pass
+        return 'application/zip'
+    return 'application/octet-stream'
+
+
+def _pdf_reader(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    return PdfReader(path)
+
+
+def count_pages(path, mime_type):
+    if mime_type == 'application/pdf':
+        reader = _pdf_reader(path)
+        if reader is not None:
+            return len(reader.pages)
+        # Without pypdf, count page objects; misses pages inside compressed
+        # object streams, so it is a lower bound
+        with open(path, 'rb') as f:
+            return len(PDF_PAGE.findall(f.read())) or None
+    if mime_type == EXTENSION_TYPES['docx']:
+        with zipfile.ZipFile(path) as archive:
+            if 'docProps/app.xml' in archive.namelist():
+                match = DOCX_PAGES.search(archive.read('docProps/app.xml'))
+                return int(match.group(1)) if match else None
+    if mime_type in ('image/png', 'image/jpeg'):
+        return 1
+    return None
+
+
+def extract_text(path, mime_type):
+    if mime_type == 'application/pdf':
+        reader = _pdf_reader(path)
+        if reader is None:
+            return None
+        parts = []
+        size = 0
+        for page in reader.pages:
+            text = page.extract_text() or ''
+            parts.append(text)
+            size += len(text)
+            if size >= MAX_TEXT_CHARS:
+                break
+        return '\n'.join(parts)[:MAX_TEXT_CHARS]
+    if mime_type == EXTENSION_TYPES['docx']:
+        with zipfile.ZipFile(path) as archive:
+            xml = archive.read('word/document.xml').decode('utf-8', 'replace')
+        text = XML_TAG.sub('', XML_PARAGRAPH.sub('\n', xml))
+        return text[:MAX_TEXT_CHARS]
+    return None
+
+
+def make_thumbnail(path, mime_type, output_path):
+    if mime_type not in ('image/png', 'image/jpeg'):
+        return None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        tmp_path = output_path + '.tmp'
+        image.save(tmp_path, 'PNG')
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def derived_paths(derived_dir, sha256):
+    # Extracted text and thumbnail; removed with the blob (see BlobStore)
+    return [os.path.join(derived_dir, sha256 + suffix) for suffix in DERIVED_SUFFIXES]
+
+
+def outputs_exist(payload, result):
+    # A duplicate upload reuses an earlier result only while the files it
+    # names are still there; they go when the last copy of the blob does
+    return all(os.path.exists(os.path.join(payload['derived_dir'], result[key]))
+               for key in ('text_path', 'thumbnail_path') if result and result.get(key))
+
+
+def process_document(payload):
+    with create_storage(payload['storage']).local_copy(payload['sha256']) as path:
+        return _process_file(payload, path)
+
+
+def _process_file(payload, path):
+    # Outputs are keyed by content hash, so a duplicate upload reuses them
+    derived_dir = payload['derived_dir']
+    sha256 = payload['sha256']
+    os.makedirs(derived_dir, exist_ok=True)
+
+    mime_type = sniff_type(path)
+    extension = payload['filename'].rsplit('.', 1)[-1].lower() if '.' in payload['filename'] else ''
+    result = {
+        'sha256': sha256,
+        'size': os.path.getsize(path),
+        'mime_type': mime_type,
+        'extension_matches': EXTENSION_TYPES.get(extension) == mime_type,
+        'pages': count_pages(path, mime_type),
+        'text_path': None,
+        'text_chars': None,
+        'thumbnail_path': None
+    }
+
+    text_path, thumbnail_path = derived_paths(derived_dir, sha256)
+    text = extract_text(path, mime_type)
+    if text is not None:
+        with open(text_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(text_path + '.tmp', text_path)
+        result['text_path'] = os.path.basename(text_path)
+        result['text_chars'] = len(text)
+
+    thumbnail = make_thumbnail(path, mime_type, thumbnail_path)
+    if thumbnail:
+        result['thumbnail_path'] = os.path.basename(thumbnail)
+
+    return result
@@ -0,0 +1,53 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri):
+    # One pooled connection per request thread plus the background job runner;
+    # overflow absorbs bursts such as bulk imports running alongside requests
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+    options = {
+        'pool_pre_ping': _flag('DB_POOL_PRE_PING', 'true'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+    }
+    if not is_memory_sqlite(uri):
+        # In-memory SQLite runs on a single StaticPool connection
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', threads + 1))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', threads))
+        options['pool_timeout'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    return options
+
+
+def sqlite_pragmas():
+    pragmas = {
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    }
+    if _flag('SQLITE_WAL', 'true'):
+        # Readers no longer block the writer, and NORMAL sync is durable
+        # across application crashes in WAL mode
+        pragmas['journal_mode'] = 'WAL'
+    return pragmas
+
+
+def configure_engine(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
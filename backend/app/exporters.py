@@ -0,0 +1,91 @@
+import csv
+import io
+import zlib
+
+from flask import current_app, stream_with_context
+from sqlalchemy import select
+
+from . import db
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .serializers import MODEL_FIELDS, model_columns, encoder_for
+
+# kind -> (model, ordering column, accepted filters)
+EXPORTS = {
+    'tax-returns': (TaxReturn, TaxReturn.created_at, ('status', 'tax_year', 'filing_type')),
+    'documents': (Document, Document.upload_date, ('status', 'tax_year', 'document_type'))
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+BATCH_SIZE = 1000
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_statement(model, sort_column):
+    return select(*model_columns(model)).order_by(sort_column, model.id)
+
+
+def iter_batches(stmt, batch_size=BATCH_SIZE):
+    # yield_per streams from a server-side cursor where the driver supports it
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    yield from result.partitions()
+
+
+def ndjson_chunks(model, batches):
+    encoder = encoder_for(model)
+    for rows in batches:
+        yield encoder.encode_lines(rows)
+
+
+def csv_cell(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Filenames and notes are user input; a leading quote keeps them text
+        return "'" + value
+    return value
+
+
+def csv_chunks(model, batches):
+    fields = MODEL_FIELDS[model]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        writer.writerows([csv_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # Sync-flush per batch so the client sees data as soon as it is read
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_response(kind, stmt, file_format, compress):
+    model = EXPORTS[kind][0]
+    batches = iter_batches(stmt)
+    chunks = ndjson_chunks(model, batches) if file_format == 'ndjson' else csv_chunks(model, batches)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{file_format}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
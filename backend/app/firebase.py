@@ -0,0 +1,29 @@
+import threading
+
+from .config import firebase_config
+
+_lock = threading.Lock()
+_warned = False
+
+
+def firebase_app():
+    # firebase_admin and its Google auth dependencies are imported and the SDK
+    # initialized only when a request first needs them
+    import firebase_admin
+    from firebase_admin import credentials
+
+    global _warned
+    with _lock:
+        if not firebase_admin._apps:
+            config = firebase_config()
+            if not config:
+                if not _warned:
+                    print("Warning: Firebase configuration not found. Some features may not work.")
+                    _warned = True
+                return None
+            firebase_admin.initialize_app(credentials.Certificate(config))
+    return firebase_admin.get_app()
+
+
+def firebase_project_id():
+    return (firebase_config() or {}).get('project_id')
@@ -0,0 +1,143 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from . import db, search, stats
+from .analytics import return_analytics
+from .dashboard_cache import dashboard_cache
+from .models.tax_return import TaxReturn
+from .models.user import User
+
+RETURN_COLUMNS = ['user_id', 'tax_year', 'status', 'filing_type', 'total_income', 'total_deductions',
+                  'total_tax', 'created_at', 'completed_at', 'notes']
+REQUIRED_COLUMNS = ['user_id', 'tax_year']
+MONEY_COLUMNS = ['total_income', 'total_deductions', 'total_tax']
+RETURN_STATUSES = ['not_started', 'in_progress', 'review', 'completed']
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('parquet', 'pq'):
+        return 'parquet'
+    if extension == 'csv':
+        return 'csv'
+    raise BulkImportError('Unsupported file type; expected .csv or .parquet')
+
+
+def iter_chunks(source, file_format, chunk_size):
+    # pandas loads on the first import, not when the admin routes do
+    import pandas as pd
+    if file_format == 'csv':
+        # Everything as strings so coercion failures can be reported per row
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, skipinitialspace=True)
+    elif file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise BulkImportError('Parquet import requires pyarrow')
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise BulkImportError(f'Unknown format: {file_format}')
+
+
+def _flag(errors, mask, message):
+    # Keep the first error per row
+    return errors.mask(mask & errors.isna(), message)
+
+
+def validate_chunk(frame):
+    import numpy as np
+    import pandas as pd
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise BulkImportError('Missing required columns: ' + ', '.join(missing))
+
+    frame = frame.reindex(columns=RETURN_COLUMNS)
+    errors = pd.Series(np.nan, index=frame.index, dtype=object)
+    present = frame.notna() & (frame.astype(str).apply(lambda column: column.str.strip()) != '')
+
+    user_id = pd.to_numeric(frame['user_id'], errors='coerce')
+    errors = _flag(errors, user_id.isna() | (user_id % 1 != 0), 'invalid user_id')
+
+    tax_year = pd.to_numeric(frame['tax_year'], errors='coerce')
+    errors = _flag(errors, tax_year.isna() | (tax_year % 1 != 0) | ~tax_year.between(1900, 2100),
+                   'invalid tax_year')
+
+    status = frame['status'].where(present['status'], 'not_started').astype(str).str.strip().str.lower()
+    errors = _flag(errors, ~status.isin(RETURN_STATUSES), 'invalid status')
+
+    money = {}
+    for column in MONEY_COLUMNS:
+        money[column] = pd.to_numeric(frame[column], errors='coerce')
+        errors = _flag(errors, present[column] & money[column].isna(), f'invalid {column}')
+
+    dates = {}
+    for column in ('created_at', 'completed_at'):
+        dates[column] = pd.to_datetime(frame[column], errors='coerce')
+        errors = _flag(errors, present[column] & dates[column].isna(), f'invalid {column}')
+
+    # One query per chunk for foreign key validation
+    candidate_ids = user_id[errors.isna()].dropna().astype('int64').unique().tolist()
+    known_ids = set(db.session.execute(select(User.id).where(User.id.in_(candidate_ids))).scalars())
+    errors = _flag(errors, ~user_id.isin(list(known_ids)), 'unknown user_id')
+
+    valid = errors.isna()
+    now = datetime.utcnow()
+    records = pd.DataFrame({
+        'user_id': user_id[valid].astype('int64'),
+        'tax_year': tax_year[valid].astype('int64'),
+        'status': status[valid],
+        'filing_type': frame['filing_type'][valid].where(present['filing_type'][valid], None),
+        **{column: money[column][valid] for column in MONEY_COLUMNS},
+        'created_at': dates['created_at'][valid].fillna(now),
+        'completed_at': dates['completed_at'][valid],
+        'notes': frame['notes'][valid].where(present['notes'][valid], None)
+    })
+    return records, errors[~valid]
+
+
+def _to_rows(records):
+    # Plain Python values for the DB-API driver: NaN/NaT -> None, numpy -> builtins
+    rows = records.astype(object).where(records.notna(), None)
+    for column in ('created_at', 'completed_at'):
+        rows[column] = [value.to_pydatetime() if value is not None else None for value in rows[column]]
+    return rows.to_dict('records')
+
+
+def import_tax_returns(source, file_format, chunk_size=10000, max_reported_errors=1000):
+    summary = {'inserted': 0, 'failed': 0, 'errors': []}
+    row_offset = 0
+
+    for frame in iter_chunks(source, file_format, chunk_size):
+        records, errors = validate_chunk(frame)
+        for index, message in errors.items():
+            if len(summary['errors']) < max_reported_errors:
+                summary['errors'].append({'row': row_offset + frame.index.get_loc(index) + 1, 'error': message})
+        summary['failed'] += len(errors)
+        row_offset += len(frame)
+
+        if records.empty:
+            continue
+
+        # One executemany and one commit per chunk keeps transactions bounded.
+        # Core inserts skip mapper events, so the dashboard counters, the
+        # analytics change marker and the search index are updated here in
+        # the same transaction, and the owners' cached dashboards after it.
+        last_id = search.max_id(db.session.connection(), TaxReturn)
+        db.session.execute(insert(TaxReturn.__table__), _to_rows(records))
+        search.index_after(db.session.connection(), 'tax_return', last_id)
+        stats.adjust(db.session.connection(), {
+            'total_returns': len(records),
+            'pending_returns': int((records['status'] == 'in_progress').sum())
+        })
+        return_analytics.record_change(db.session.connection())
+        db.session.commit()
+        dashboard_cache.invalidate(records['user_id'].unique().tolist())
+        summary['inserted'] += len(records)
+
+    return summary
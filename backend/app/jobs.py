@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .document_tasks import outputs_exist, process_document
+from .models.job import Job
+
+logger = logging.getLogger(__name__)
+
+# session.info flag: a job was queued in the open transaction
+QUEUED_KEY = 'job_queued'
+
+# Task functions take the decoded payload and return a JSON-serializable
+# result. With JOB_EXECUTOR=process they run in a child process, so they must
+# be importable top-level functions that do not use the app or the database.
+TASKS = {
+    'process_document': process_document
+}
+
+# For deduplicated jobs: whether a succeeded job's result, given the new
+# payload, still holds. Kinds without a check always reuse it
+RESULT_CHECKS = {
+    'process_document': outputs_exist
+}
+
+
+class JobQueue:
+    def __init__(self):
+        self._app = None
+        self._executor = None
+        self._thread = None
+        self._pid = None
+        self._running = {}
+        self._handlers = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        if app.config['JOB_RUNNER_ENABLED']:
+            # Started from the first request rather than here so forked
+            # server workers each get their own runner thread
+            app.before_request(self.start)
+
+    def on_success(self, kind):
+        # Handlers run in the runner's app context and commit with the job's
+        # status, so follow-up writes (e.g. indexing) are never half-applied
+        def decorator(f):
+            self._handlers.setdefault(kind, []).append(f)
+            return f
+        return decorator
+
+    def _succeeded(self, job, result):
+        payload = json.loads(job.payload)
+        for handler in self._handlers.get(job.kind, ()):
+            handler(job, payload, result)
+
+    # -- producer side ---------------------------------------------------
+
+    def enqueue(self, kind, payload, owner_uid=None, dedupe_key=None, max_attempts=None):
+        # Added to the caller's session like outbox.notify; the caller commits
+        if kind not in TASKS:
+            raise ValueError(f'Unknown job kind: {kind}')
+
+        if dedupe_key:
+            previous = Job.query.filter(Job.kind == kind, Job.dedupe_key == dedupe_key, Job.status != 'failed')\
+                .order_by(Job.id.desc()).first()
+            if previous and previous.owner_uid == owner_uid and previous.status in ('queued', 'running'):
+                return previous
+            if previous and previous.status == 'succeeded' and self._reusable(kind, payload, previous):
+                # Same content already processed; record a finished job for this owner
+                now = datetime.utcnow()
+                job = Job(kind=kind, payload=json.dumps(payload), owner_uid=owner_uid, dedupe_key=dedupe_key,
+                          status='succeeded', result=previous.result, started_at=now, finished_at=now)
+                db.session.add(job)
+                db.session.flush()
+                self._succeeded(job, json.loads(previous.result))
+                return job
+
+        job = Job(kind=kind, payload=json.dumps(payload), owner_uid=owner_uid, dedupe_key=dedupe_key,
+                  max_attempts=max_attempts or self._app.config['JOB_MAX_ATTEMPTS'])
+        db.session.add(job)
+        db.session.flush()
+        # The runner is woken once the caller's transaction commits
+        db.session.info[QUEUED_KEY] = True
+        return job
+
+    def _reusable(self, kind, payload, previous):
+        check = RESULT_CHECKS.get(kind)
+        return check is None or check(payload, json.loads(previous.result))
+
+    # -- runner ----------------------------------------------------------
+
+    def _make_executor(self):
+        workers = self._app.config['JOB_WORKERS']
+        if self._app.config['JOB_EXECUTOR'] == 'process':
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._running = {}
+            self._stop.clear()
+            self._executor = self._make_executor()
+            self._thread = threading.Thread(target=self.run, name='job-runner', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        self._thread = None
+        self._executor = None
+
+    def run(self, once=False):
+        if self._executor is None:
+            self._executor = self._make_executor()
+        poll_interval = self._app.config['JOB_POLL_INTERVAL']
+        with self._app.app_context():
+            try:
+                self._recover_stale()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Job runner error")
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._app.app_context():
+                try:
+                    self._collect()
+                    self._claim()
+                except Exception:
+                    # Keep the runner alive through transient errors (locked or
+                    # not-yet-created tables); the next poll retries
+                    db.session.rollback()
+                    logger.exception("Job runner error")
+            if once and not self._running:
+                return
+            self._wake.wait(poll_interval)
+
+    def _recover_stale(self):
+        # Jobs left running by a worker that died; their tasks are idempotent
+        cutoff = datetime.utcnow() - timedelta(seconds=self._app.config['JOB_TIMEOUT'])
+        db.session.execute(
+            update(Job).where(Job.status == 'running', Job.started_at < cutoff).values(status='queued')
+        )
+        db.session.commit()
+
+    def _claim(self):
+        free = self._app.config['JOB_WORKERS'] - len(self._running)
+        if free <= 0:
+            return
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(Job.id).where(Job.status == 'queued', Job.run_after <= now).order_by(Job.id).limit(free)
+        ).scalars().all()
+
+        for job_id in candidates:
+            # Conditional update so only one runner (thread or process) wins a job
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', attempts=Job.attempts + 1, started_at=now)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+
+            job = db.session.get(Job, job_id)
+            task = TASKS.get(job.kind)
+            if task is None:
+                self._finish(job, error=f'Unknown job kind: {job.kind}', retry=False)
+                continue
+            future = self._executor.submit(task, json.loads(job.payload))
+            self._running[future] = job_id
+            future.add_done_callback(lambda _: self._wake.set())
+
+    def _collect(self):
+        for future in [future for future in self._running if future.done()]:
+            job_id = self._running.pop(future)
+            job = db.session.get(Job, job_id)
+            try:
+                result = future.result()
+            except BrokenExecutor as e:
+                # A worker process died; replace the pool and retry the job
+                self._executor = self._make_executor()
+                self._finish(job, error=repr(e), retry=True)
+            except Exception as e:
+                self._finish(job, error=repr(e), retry=True)
+            else:
+                try:
+                    self._finish(job, result=result)
+                except Exception as e:
+                    db.session.rollback()
+                    self._finish(db.session.get(Job, job_id), error=repr(e), retry=True)
+
+    def _finish(self, job, result=None, error=None, retry=False):
+        now = datetime.utcnow()
+        if error is None:
+            self._succeeded(job, result)
+            job.status = 'succeeded'
+            job.result = json.dumps(result)
+            job.error = None
+            job.finished_at = now
+        elif retry and job.attempts < job.max_attempts:
+            backoff = self._app.config['JOB_RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.error = error
+            job.run_after = now + timedelta(seconds=backoff)
+        else:
+            job.status = 'failed'
+            job.error = error
+            job.finished_at = now
+        db.session.commit()
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_runner(session):
+    # Also fired when a savepoint is released; only the outer commit counts
+    if not session.in_nested_transaction() and session.info.pop(QUEUED_KEY, None):
+        job_queue._wake.set()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _nothing_queued(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(QUEUED_KEY, None)
@@ -0,0 +1,234 @@
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from . import db, token_verifier
+
+logger = logging.getLogger('app.requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+MAX_RECORDED_QUERIES = 200
+MAX_STATEMENT_CHARS = 500
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {_format(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # Per-bucket counts (not cumulative), then sum and count
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _format(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {_format(total)}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+def token_cache_metrics():
+    stats = token_verifier.stats()
+    return [
+        ('token_cache_hits_total', 'counter', 'Firebase ID tokens served from the cache.', stats['hits']),
+        ('token_cache_misses_total', 'counter', 'Firebase ID tokens verified from scratch.', stats['misses']),
+        ('token_cache_entries', 'gauge', 'Verified tokens currently cached.', stats['size']),
+        ('token_cache_key_fetches_total', 'counter', 'Signing key downloads.', stats['key_fetches'])
+    ]
+
+
+def dashboard_cache_metrics():
+    from .dashboard_cache import dashboard_cache
+    stats = dashboard_cache.stats()
+    return [
+        ('dashboard_cache_hits_total', 'counter', 'Client dashboards served from the cache.', stats['hits']),
+        ('dashboard_cache_misses_total', 'counter', 'Client dashboards built from the database.', stats['misses']),
+        ('dashboard_cache_entries', 'gauge', 'Cached dashboards and invalidation markers.', stats['size'])
+    ]
+
+
+class RequestMetrics:
+    # Per-process: with several server workers, scrape each one or aggregate
+    # upstream
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ('blueprint', 'endpoint', 'method')
+        self.requests = Counter('http_requests_total', 'Requests handled.', route + ('status',))
+        self.latency = Histogram('http_request_duration_seconds', 'Time spent in the view and hooks.',
+                                 route, LATENCY_BUCKETS)
+        self.query_count = Histogram('http_request_db_queries', 'SQL statements executed per request.',
+                                     route, QUERY_COUNT_BUCKETS)
+        self.query_time = Histogram('http_request_db_seconds', 'Time spent in SQL per request.',
+                                    route, LATENCY_BUCKETS)
+        self.response_size = Histogram('http_response_size_bytes', 'Response body size when known up front.',
+                                       route, SIZE_BUCKETS)
+        self.slow_requests = Counter('http_slow_requests_total', 'Requests over SLOW_REQUEST_MS.', route)
+        self.collectors = [token_cache_metrics, dashboard_cache_metrics]
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_query)
+            event.listen(db.engine, 'after_cursor_execute', self._after_query)
+            event.listen(db.engine, 'handle_error', self._failed_query)
+
+    def add_collector(self, collector):
+        # collector() returns [(name, type, help, value)] rendered at scrape time
+        self.collectors.append(collector)
+
+    # -- per request -----------------------------------------------------
+
+    def _start(self):
+        g.request_metrics = {
+            'start': time.perf_counter(),
+            'queries': 0,
+            'query_time': 0.0,
+            'statements': [] if current_app.config['SLOW_REQUEST_MS'] else None
+        }
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, which a failed statement
+        # takes with it, so nothing is left behind for the next one
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        self._record(context, statement)
+
+    def _failed_query(self, exception_context):
+        if exception_context.execution_context is not None:
+            self._record(exception_context.execution_context, exception_context.statement or '')
+
+    def _record(self, context, statement):
+        start = getattr(context, '_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        context._metrics_start = None
+        # Queries outside a request (job runner, CLI) have no request state
+        state = g.get('request_metrics') if g else None
+        if state is None:
+            return
+        state['queries'] += 1
+        state['query_time'] += elapsed
+        if state['statements'] is not None and len(state['statements']) < MAX_RECORDED_QUERIES:
+            state['statements'].append((statement[:MAX_STATEMENT_CHARS], round(elapsed * 1000, 3)))
+
+    def _finish(self, response):
+        state = g.pop('request_metrics', None)
+        if state is None or request.endpoint == 'metrics':
+            return response
+        duration = time.perf_counter() - state['start']
+        endpoint = request.endpoint or 'unmatched'
+        labels = (request.blueprint or '', endpoint, request.method)
+        size = response.content_length
+
+        config = current_app.config
+        slow = bool(config['SLOW_REQUEST_MS']) and duration * 1000 >= config['SLOW_REQUEST_MS']
+        with self._lock:
+            self.requests.inc(labels + (str(response.status_code),))
+            self.latency.observe(labels, duration)
+            self.query_count.observe(labels, state['queries'])
+            self.query_time.observe(labels, state['query_time'])
+            if size is not None:
+                self.response_size.observe(labels, size)
+            if slow:
+                self.slow_requests.inc(labels)
+
+        if slow or response.status_code >= 500 or random.random() < config['REQUEST_LOG_SAMPLE_RATE']:
+            record = {
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_queries': state['queries'],
+                'db_ms': round(state['query_time'] * 1000, 2),
+                'bytes': size
+            }
+            if slow:
+                record['slow'] = True
+                record['statements'] = state['statements']
+                logger.warning(json.dumps(record))
+            else:
+                logger.info(json.dumps(record))
+        return response
+
+    # -- exposition ------------------------------------------------------
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.query_count, self.query_time,
+                           self.response_size, self.slow_requests):
+                lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, metric_type, help_text, value in collector():
+                lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}',
+                              f'{name} {_format(value)}'])
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        # Route names, latencies and row counts are not public: without a
+        # configured token the endpoint stays closed
+        token = current_app.config['METRICS_TOKEN']
+        if not token or not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                                 f'Bearer {token}'.encode()):
+            return current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+        return current_app.response_class(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+request_metrics = RequestMetrics()
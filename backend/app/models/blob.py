@@ -0,0 +1,29 @@
+from .. import db
+from datetime import datetime
+
+class Blob(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BlobReference(db.Model):
+    __table_args__ = (db.UniqueConstraint('owner_uid', 'path'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_uid = db.Column(db.String(128), nullable=False)
+    path = db.Column(db.String(255), nullable=False)  # user-visible name, e.g. 20240101_120000_1a2b3c4d_w2.pdf
+    sha256 = db.Column(db.String(64), db.ForeignKey('blob.sha256'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    blob = db.relationship('Blob')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'owner_uid': self.owner_uid,
+            'path': self.path,
+            'sha256': self.sha256,
+            'size': self.blob.size,
+            'created_at': self.created_at.isoformat()
+        }
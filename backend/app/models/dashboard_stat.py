@@ -0,0 +1,5 @@
+from .. import db
+
+class DashboardStat(db.Model):
+    key = db.Column(db.String(50), primary_key=True)  # total_users, total_documents, total_returns, pending_returns
+    value = db.Column(db.BigInteger, nullable=False, default=0)
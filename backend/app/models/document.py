@@ -11,6 +11,11 @@ class Document(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     notes = db.Column(db.Text)
     
+    __table_args__ = (
+        # client document lists and dashboard: WHERE user_id = ? ORDER BY upload_date DESC
+        db.Index('ix_document_user_id_upload_date', user_id, upload_date.desc(), id.desc()),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,7 @@
+from .. import db
+
+class FirebaseIdentity(db.Model):
+    # Links the Firebase account the frontend signs in with to a backend user;
+    # blob store uploads are owned by the Firebase uid
+    uid = db.Column(db.String(128), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
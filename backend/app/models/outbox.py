@@ -0,0 +1,26 @@
+from .. import db
+from datetime import datetime
+
+class OutboxMessage(db.Model):
+    # One notice for one recipient; the sender folds a recipient's pending
+    # notices into a single digest email
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # documents_received, return_status_changed
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    send_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # sender poll: WHERE status = 'pending' AND send_after <= now GROUP BY recipient
+        db.Index('ix_outbox_message_status_send_after', status, send_after, recipient, created_at),
+        # per-recipient rate limit and retention: WHERE status = 'sent' AND sent_at > ?
+        db.Index('ix_outbox_message_status_sent_at', status, sent_at, recipient),
+        db.Index('ix_outbox_message_claim_token', claim_token),
+    )
@@ -0,0 +1,8 @@
+from .. import db
+
+class ReturnChange(db.Model):
+    # TaxReturn ids written under an analytics version (see app/analytics.py);
+    # a NULL return_id means the writer did not list the rows it changed
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    return_id = db.Column(db.Integer)
@@ -14,6 +14,27 @@ class TaxReturn(db.Model):
     completed_at = db.Column(db.DateTime)
     notes = db.Column(db.Text)
     
+    __table_args__ = (
+        # client return lists and dashboard: WHERE user_id = ? ORDER BY created_at DESC
+        db.Index('ix_tax_return_user_id_created_at', user_id, created_at.desc(), id.desc()),
+        # admin lists filtered by status, pending counts
+        db.Index('ix_tax_return_status_created_at', status, created_at.desc(), id.desc()),
+        # admin lists filtered by tax year, or tax year and filing type
+        db.Index('ix_tax_return_tax_year_filing_type_created_at', tax_year, filing_type,
+                 created_at.desc(), id.desc()),
+        # unfiltered admin list
+        db.Index('ix_tax_return_created_at', created_at.desc(), id.desc()),
+    )
+    
+    def set_status(self, status):
+        # completed_at is stamped when a return is completed and cleared if it is reopened
+        if status == 'completed':
+            if self.status != 'completed':
+                self.completed_at = datetime.utcnow()
+        else:
+            self.completed_at = None
+        self.status = status
+    
     def to_dict(self):
         return {
             'id': self.id,
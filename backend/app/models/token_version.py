@@ -0,0 +1,6 @@
+from .. import db
+
+class TokenVersion(db.Model):
+    # Bumped to revoke every access token issued to the user; no row means version 0
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
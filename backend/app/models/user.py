@@ -1,6 +1,5 @@
-from .. import db
+from .. import db, password_hasher
 from datetime import datetime
-import bcrypt
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,12 +15,19 @@ class User(db.Model):
     documents = db.relationship('Document', backref='owner', lazy=True)
     tax_returns = db.relationship('TaxReturn', backref='client', lazy=True)
     
+    __table_args__ = (
+        # admin client list and client counts: WHERE role = ? ORDER BY created_at DESC
+        db.Index('ix_user_role_created_at', role, created_at.desc(), id.desc()),
+    )
+    
     def set_password(self, password):
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash)
+        return password_hasher.check(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
         
     def to_dict(self):
         return {
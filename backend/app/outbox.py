@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from sqlalchemy import delete, func, insert, select, update
+
+from . import db, mail
+from .models.outbox import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+SUBJECTS = {
+    'documents_received': 'We received your documents',
+    'return_status_changed': 'Your tax return status has changed'
+}
+DIGEST_SUBJECT = 'Updates on your Smythe Tax Services account'
+
+STATUS_LABELS = {
+    'not_started': 'not started',
+    'in_progress': 'in progress',
+    'review': 'in review',
+    'completed': 'completed'
+}
+
+
+def describe(kind, details):
+    if kind == 'documents_received':
+        return f"We received your document {details['filename']}."
+    status = STATUS_LABELS.get(details['status'], details['status'])
+    return f"Your {details['tax_year']} tax return is now {status}."
+
+
+def render_digest(notices):
+    # notices: [(kind, details)], oldest first
+    kinds = {kind for kind, _ in notices}
+    subject = SUBJECTS[next(iter(kinds))] if len(kinds) == 1 else DIGEST_SUBJECT
+    lines = ['Hello,', '']
+    lines.extend(f'- {describe(kind, details)}' for kind, details in notices)
+    lines.extend(['', 'Sign in to the client portal for details.', '', 'Smythe Tax Services'])
+    return subject, '\n'.join(lines)
+
+
+class Outbox:
+    def __init__(self):
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._sent_times = deque()
+        self._purged_at = 0
+
+    def init_app(self, app):
+        self._app = app
+        if app.config['MAIL_OUTBOX_ENABLED']:
+            # Like the job runner: one sender thread per server process,
+            # started from its first request
+            app.before_request(self.start)
+
+    # -- producer side ---------------------------------------------------
+
+    def notify(self, recipient, kind, **details):
+        # Added to the caller's session, so the notice commits (or rolls
+        # back) together with the change it reports
+        if kind not in SUBJECTS:
+            raise ValueError(f'Unknown notice kind: {kind}')
+        if not recipient:
+            return None
+        message = OutboxMessage(recipient=recipient, kind=kind, payload=json.dumps(details))
+        db.session.add(message)
+        return message
+
+    def notify_many(self, notices):
+        # For set-based writes: [(recipient, kind, details)] as one executemany
+        # in the caller's transaction
+        rows = []
+        for recipient, kind, details in notices:
+            if kind not in SUBJECTS:
+                raise ValueError(f'Unknown notice kind: {kind}')
+            if recipient:
+                rows.append({'recipient': recipient, 'kind': kind, 'payload': json.dumps(details)})
+        if rows:
+            db.session.execute(insert(OutboxMessage), rows)
+        return len(rows)
+
+    # -- sender ----------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._sent_times = deque()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='mail-sender', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._thread = None
+
+    def run(self, once=False):
+        poll_interval = self._app.config['MAIL_POLL_INTERVAL']
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._app.app_context():
+                try:
+                    self._recover_stale()
+                    sent = self.send_batch()
+                    self._purge()
+                except Exception:
+                    # Keep the sender alive; the next poll retries
+                    db.session.rollback()
+                    logger.exception("Mail sender error")
+                    sent = 0
+            if once and not sent:
+                return
+            if not sent:
+                self._wake.wait(poll_interval)
+
+    def send_batch(self):
+        config = self._app.config
+        now = datetime.utcnow()
+        limit = min(config['MAIL_BATCH_SIZE'], self._budget())
+        if limit <= 0:
+            return 0
+
+        # Recipients whose oldest pending notice has waited out the digest
+        # window, skipping anyone who got a digest within MAIL_MIN_INTERVAL
+        recently_sent = select(OutboxMessage.recipient).where(
+            OutboxMessage.status == 'sent',
+            OutboxMessage.sent_at > now - timedelta(seconds=config['MAIL_MIN_INTERVAL'])
+        )
+        recipients = db.session.scalars(
+            select(OutboxMessage.recipient)
+            .where(OutboxMessage.status == 'pending', OutboxMessage.send_after <= now,
+                   OutboxMessage.recipient.not_in(recently_sent))
+            .group_by(OutboxMessage.recipient)
+            .having(func.min(OutboxMessage.created_at) <= now - timedelta(seconds=config['MAIL_DIGEST_WINDOW']))
+            .order_by(func.min(OutboxMessage.created_at))
+            .limit(limit)
+        ).all()
+        if not recipients:
+            return 0
+
+        # Claim with a conditional update so concurrent senders never pick
+        # up the same notices
+        token = uuid.uuid4().hex
+        db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.status == 'pending', OutboxMessage.send_after <= now,
+                   OutboxMessage.recipient.in_(recipients))
+            .values(status='sending', claim_token=token, claimed_at=now)
+        )
+        db.session.commit()
+
+        digests = {}
+        for message in OutboxMessage.query.filter_by(claim_token=token).order_by(OutboxMessage.id):
+            digests.setdefault(message.recipient, []).append(message)
+        return self._deliver(list(digests.values()))
+
+    def _deliver(self, digests):
+        # One SMTP connection (and login) for the whole batch
+        sent = 0
+        try:
+            with mail.connect() as connection:
+                while digests:
+                    messages = digests[0]
+                    subject, body = render_digest([(m.kind, json.loads(m.payload)) for m in messages])
+                    try:
+                        connection.send(Message(subject, recipients=[messages[0].recipient], body=body))
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                        # Rejected by the server; the connection is still usable
+                        self._retry(messages, e)
+                    else:
+                        self._mark_sent(messages)
+                        sent += 1
+                    digests.pop(0)
+                    db.session.commit()
+        except Exception as e:
+            # Connection-level failure: whatever was not handled goes back
+            db.session.rollback()
+            logger.warning("Mail delivery failed, %d digests deferred: %r", len(digests), e)
+            for messages in digests:
+                self._retry(messages, e)
+            db.session.commit()
+        return sent
+
+    def _mark_sent(self, messages):
+        now = datetime.utcnow()
+        for message in messages:
+            message.status = 'sent'
+            message.sent_at = now
+            message.claim_token = None
+            message.error = None
+        self._sent_times.append(time.monotonic())
+
+    def _retry(self, messages, error):
+        config = self._app.config
+        now = datetime.utcnow()
+        for message in messages:
+            message.attempts += 1
+            message.error = repr(error)
+            message.claim_token = None
+            if message.attempts >= config['MAIL_MAX_ATTEMPTS']:
+                message.status = 'failed'
+            else:
+                message.status = 'pending'
+                message.send_after = now + timedelta(
+                    seconds=config['MAIL_RETRY_BACKOFF'] * 2 ** (message.attempts - 1))
+
+    def _budget(self):
+        # MAIL_RATE_LIMIT digests per minute from this process; 0 means no limit
+        rate = self._app.config['MAIL_RATE_LIMIT']
+        if not rate:
+            return self._app.config['MAIL_BATCH_SIZE']
+        cutoff = time.monotonic() - 60
+        while self._sent_times and self._sent_times[0] < cutoff:
+            self._sent_times.popleft()
+        return rate - len(self._sent_times)
+
+    def _recover_stale(self):
+        # Notices claimed by a sender that died mid-batch; they may go out twice
+        cutoff = datetime.utcnow() - timedelta(seconds=self._app.config['MAIL_SEND_TIMEOUT'])
+        db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.status == 'sending', OutboxMessage.claimed_at < cutoff)
+            .values(status='pending', claim_token=None)
+        )
+        db.session.commit()
+
+    def _purge(self):
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        cutoff = datetime.utcnow() - timedelta(days=self._app.config['MAIL_OUTBOX_RETENTION_DAYS'])
+        db.session.execute(delete(OutboxMessage).where(OutboxMessage.status == 'sent', OutboxMessage.sent_at < cutoff))
+        db.session.commit()
+        self._purged_at = time.monotonic()
+
+
+outbox = Outbox()
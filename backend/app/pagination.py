@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+from . import db
+from .serializers import MODEL_FIELDS, model_columns, rows_response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(sort_value, row_id):
+    payload = json.dumps([sort_value.isoformat() if sort_value else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(sort_value) if sort_value else None), int(row_id)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+
+def apply_filters(query, model, names):
+    for name in names:
+        value = request.args.get(name)
+        if value is None or value == '':
+            continue
+        if name == 'tax_year':
+            try:
+                value = int(value)
+            except ValueError:
+                raise PaginationError('Invalid tax_year')
+        query = query.filter(getattr(model, name) == value)
+    return query
+
+
+def parse_fields(model):
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    columns = model.__table__.columns
+    unknown = [field for field in fields if field not in columns or field == 'password_hash']
+    if unknown:
+        raise PaginationError('Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def page_limit():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('Invalid limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def after_cursor(stmt, model, sort_column):
+    cursor = request.args.get('cursor')
+    if cursor:
+        after_value, after_id = decode_cursor(cursor)
+        stmt = stmt.filter(or_(
+            sort_column < after_value,
+            and_(sort_column == after_value, model.id < after_id)
+        ))
+    return stmt
+
+
+def paginate(stmt, model, sort_column):
+    # Keyset pagination on (sort_column, id), newest first; rows come back as
+    # plain tuples of the requested fields followed by the sort key and id
+    limit = page_limit()
+    fields = parse_fields(model) or MODEL_FIELDS[model]
+
+    stmt = after_cursor(stmt, model, sort_column)\
+        .with_only_columns(*model_columns(model, fields), sort_column, model.id)\
+        .order_by(sort_column.desc(), model.id.desc())\
+        .limit(limit + 1)
+    rows = db.session.execute(stmt).all()
+
+    next_cursor = encode_cursor(rows[limit - 1][-2], rows[limit - 1][-1]) if len(rows) > limit else None
+    return fields, rows[:limit], next_cursor
+
+
+def paginated_response(model, fields, rows, next_cursor):
+    return with_next_link(rows_response(model, fields, rows), next_cursor)
+
+
+def with_next_link(response, next_cursor):
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+def hash_cost(hashed):
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    try:
+        return int(hashed.split(b'$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+class PasswordHasher:
+    # bcrypt releases the GIL, so a small thread pool bounds CPU use per
+    # worker while the semaphore bounds how many requests may wait on it.
+    # By default that is the pool plus a queue of the same size: a request
+    # waits for at most one hash ahead of it before getting a 503. The
+    # limit only fills with threaded workers (gunicorn --threads, see
+    # GUNICORN_THREADS); a sync worker runs one request, so one hash, at a time
+    def __init__(self, rounds=12, workers=None, max_pending=None, retry_after=2, timeout=30):
+        self.rounds = rounds
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 2
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('BCRYPT_WORKERS') or self.workers
+        self.max_pending = app.config.get('BCRYPT_MAX_PENDING') or self.workers * 2
+        self.retry_after = app.config.get('BCRYPT_RETRY_AFTER', self.retry_after)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _get_executor(self):
+        # Created on first use so each forked gunicorn worker gets its own threads
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='bcrypt')
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(self.retry_after)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password, rounds=None):
+        salt = bcrypt.gensalt(rounds or self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt)
+
+    def check(self, password, hashed):
+        if not hashed or password is None:
+            return False
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) < self.rounds
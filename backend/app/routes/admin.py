@@ -1,76 +1,212 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import click
+from sqlalchemy import select
 from ..models.user import User
 from ..models.document import Document
+from ..models.firebase_identity import FirebaseIdentity
 from ..models.tax_return import TaxReturn
-from .. import db
+from .. import db, stats
+from ..analytics import return_analytics
+from ..outbox import outbox
+from ..exporters import EXPORTS, EXPORT_FORMATS, export_statement, export_response
+from ..tax_engine import compute_tax, recompute_year
+from ..importers import import_tax_returns, detect_format, BulkImportError
+from ..bulk import update_returns, delete_documents, BulkUpdateError
+from ..authz import require_role
+from ..pagination import paginate, paginated_response, apply_filters, with_next_link, PaginationError
+from ..client_summary import client_overview
+from .documents import blob_store, send_blob
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/dashboard', methods=['GET'])
-@jwt_required()
+@require_role('admin')
 def get_dashboard():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    # Counters are maintained by model events (see app/stats.py)
+    counts = stats.read()
     
-    if not user or user.role != 'admin':
-        return jsonify({'message': 'Unauthorized'}), 403
-    
-    # Get statistics
-    total_users = User.query.filter_by(role='client').count()
-    total_documents = Document.query.count()
-    total_returns = TaxReturn.query.count()
-    pending_returns = TaxReturn.query.filter_by(status='in_progress').count()
-    
-    return jsonify({
-        'total_users': total_users,
-        'total_documents': total_documents,
-        'total_returns': total_returns,
-        'pending_returns': pending_returns
-    }), 200
+    return jsonify({key: counts[key] for key in stats.STAT_KEYS}), 200
+
+@admin_bp.route('/analytics', methods=['GET'])
+@require_role('admin')
+def get_analytics():
+    tax_year = request.args.get('tax_year', type=int)
+    return jsonify(return_analytics.rollup(tax_year)), 200
 
 @admin_bp.route('/users', methods=['GET'])
-@jwt_required()
+@require_role('admin')
 def get_users():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    try:
+        fields, rows, next_cursor = paginate(select(User).filter_by(role='client'), User, User.created_at)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     
-    if not user or user.role != 'admin':
-        return jsonify({'message': 'Unauthorized'}), 403
+    return paginated_response(User, fields, rows, next_cursor), 200
+
+@admin_bp.route('/clients', methods=['GET'])
+@require_role('admin')
+def get_clients():
+    try:
+        clients, next_cursor = client_overview()
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     
-    users = User.query.filter_by(role='client').all()
-    return jsonify([user.to_dict() for user in users]), 200
+    return with_next_link(jsonify(clients), next_cursor), 200
+
+def client_uid(user_id):
+    # Uploads are owned by the client's Firebase uid (see /api/auth/firebase)
+    return db.session.scalar(select(FirebaseIdentity.uid).where(FirebaseIdentity.user_id == user_id))
+
+@admin_bp.route('/clients/<int:user_id>/documents', methods=['GET'])
+@require_role('admin')
+def get_client_documents(user_id):
+    if not db.session.get(User, user_id):
+        return jsonify({'message': 'Client not found'}), 404
+    
+    uid = client_uid(user_id)
+    return jsonify([reference.to_dict() for reference in blob_store.list(uid)] if uid else []), 200
+
+@admin_bp.route('/clients/<int:user_id>/documents/<path:path>', methods=['GET'])
+@require_role('admin')
+def download_client_document(user_id, path):
+    uid = client_uid(user_id)
+    reference = blob_store.resolve(uid, path) if uid else None
+    if not reference:
+        return jsonify({'message': 'Document not found'}), 404
+    return send_blob(reference, path)
 
 @admin_bp.route('/tax-returns', methods=['GET'])
-@jwt_required()
+@require_role('admin')
 def get_all_returns():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.role != 'admin':
-        return jsonify({'message': 'Unauthorized'}), 403
+    try:
+        query = apply_filters(select(TaxReturn), TaxReturn, ('status', 'tax_year', 'filing_type'))
+        fields, rows, next_cursor = paginate(query, TaxReturn, TaxReturn.created_at)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     
-    tax_returns = TaxReturn.query.all()
-    return jsonify([tax_return.to_dict() for tax_return in tax_returns]), 200
+    return paginated_response(TaxReturn, fields, rows, next_cursor), 200
 
 @admin_bp.route('/tax-returns/<int:return_id>', methods=['PUT'])
-@jwt_required()
+@require_role('admin')
 def update_tax_return(return_id):
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.role != 'admin':
-        return jsonify({'message': 'Unauthorized'}), 403
-    
-    tax_return = TaxReturn.query.get(return_id)
+    tax_return = db.session.get(TaxReturn, return_id)
     if not tax_return:
         return jsonify({'message': 'Tax return not found'}), 404
     
     data = request.get_json()
-    if 'status' in data:
-        tax_return.status = data['status']
+    if 'status' in data and data['status'] != tax_return.status:
+        tax_return.set_status(data['status'])
+        outbox.notify(tax_return.client.email, 'return_status_changed',
+                      tax_year=tax_return.tax_year, status=tax_return.status)
     if 'notes' in data:
         tax_return.notes = data['notes']
     
     db.session.commit()
     return jsonify(tax_return.to_dict()), 200
+
+@admin_bp.route('/tax-returns/bulk-update', methods=['POST'])
+@require_role('admin')
+def bulk_update_returns():
+    data = request.get_json(silent=True) or {}
+    try:
+        summary = update_returns(ids=data.get('ids'), filters=data.get('filter'),
+                                 status=data.get('status'), notes=data.get('notes'))
+    except BulkUpdateError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify(summary), 200
+
+@admin_bp.route('/documents/bulk-delete', methods=['POST'])
+@require_role('admin')
+def bulk_delete_documents():
+    data = request.get_json(silent=True) or {}
+    try:
+        summary = delete_documents(data.get('ids'))
+    except BulkUpdateError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify(summary), 200
+
+@admin_bp.route('/tax-returns/import', methods=['POST'])
+@require_role('admin')
+def import_returns():
+    if 'file' not in request.files:
+        return jsonify({'message': 'No file part'}), 400
+    
+    file = request.files['file']
+    try:
+        file_format = request.form.get('format') or detect_format(file.filename)
+        summary = import_tax_returns(file.stream, file_format)
+    except BulkImportError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify(summary), 200
+
+@admin_bp.route('/tax-returns/<int:return_id>/compute-tax', methods=['POST'])
+@require_role('admin')
+def compute_return_tax(return_id):
+    tax_return = db.session.get(TaxReturn, return_id)
+    if not tax_return:
+        return jsonify({'message': 'Tax return not found'}), 404
+    
+    total_tax = compute_tax(tax_return.total_income, tax_return.total_deductions,
+                            tax_return.tax_year, tax_return.filing_type)
+    if total_tax is None:
+        return jsonify({'message': 'No income or no tax table for this year and filing type'}), 400
+    
+    tax_return.total_tax = total_tax
+    db.session.commit()
+    return jsonify(tax_return.to_dict()), 200
+
+@admin_bp.route('/tax-returns/recompute/<int:tax_year>', methods=['POST'])
+@require_role('admin')
+def recompute_tax_year(tax_year):
+    include_completed = request.args.get('include_completed', '').lower() in ('1', 'true', 'yes')
+    return jsonify(recompute_year(tax_year, include_completed=include_completed)), 200
+
+@admin_bp.route('/export/<kind>', methods=['GET'])
+@require_role('admin')
+def export_records(kind):
+    if kind not in EXPORTS:
+        return jsonify({'message': 'Unknown export'}), 404
+    
+    file_format = request.args.get('format', 'ndjson')
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({'message': 'Unsupported format'}), 400
+    
+    model, sort_column, filters = EXPORTS[kind]
+    try:
+        stmt = apply_filters(export_statement(model, sort_column), model, filters)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return export_response(kind, stmt, file_format, compress)
+
+@admin_bp.cli.command('import-returns')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'parquet']))
+@click.option('--chunk-size', default=10000, show_default=True)
+def import_returns_command(path, file_format, chunk_size):
+    try:
+        summary = import_tax_returns(path, file_format or detect_format(path), chunk_size=chunk_size)
+    except BulkImportError as e:
+        raise click.ClickException(str(e))
+    
+    print(f"Inserted {summary['inserted']} returns, {summary['failed']} rows rejected")
+    for error in summary['errors']:
+        print(f"  row {error['row']}: {error['error']}")
+
+@admin_bp.cli.command('recompute-tax')
+@click.argument('tax_year', type=int)
+@click.option('--include-completed', is_flag=True, help='Also rewrite the tax on completed returns')
+def recompute_tax_command(tax_year, include_completed):
+    result = recompute_year(tax_year, include_completed=include_completed)
+    print(f"{tax_year}: updated {result['updated']} returns, skipped {result['skipped']}")
+
+@admin_bp.cli.command('rebuild-stats')
+def rebuild_stats():
+    counts = stats.rebuild()
+    for key in stats.STAT_KEYS:
+        print(f"{key}: {counts[key]}")
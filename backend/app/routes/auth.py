@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from ..models.firebase_identity import FirebaseIdentity
 from ..models.user import User
-from .. import db
+from .. import db, token_verifier
+from ..authz import create_user_token, bump_token_version
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
@@ -12,10 +14,13 @@ def login():
     user = User.query.filter_by(email=data.get('email')).first()
     
     if user and user.check_password(data.get('password')):
+        if user.password_needs_rehash():
+            # Stored with an older BCRYPT_LOG_ROUNDS; upgrade while we have the plaintext
+            user.set_password(data.get('password'))
         user.last_login = datetime.utcnow()
         db.session.commit()
         
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         return jsonify({
             'access_token': access_token,
             'user': user.to_dict()
@@ -23,6 +28,44 @@ def login():
     
     return jsonify({'message': 'Invalid credentials'}), 401
 
+@auth_bp.route('/firebase', methods=['POST'])
+def firebase_login():
+    # The frontend signs in with Firebase and trades the ID token for an
+    # access token; the backend user, and so the role, is matched by the
+    # Firebase uid once linked, and by verified email the first time
+    data = request.get_json(silent=True) or {}
+    try:
+        claims = token_verifier.verify(data.get('id_token') or '')
+    except Exception:
+        return jsonify({'message': 'Invalid credentials'}), 401
+    
+    identity = db.session.get(FirebaseIdentity, claims['uid'])
+    user = db.session.get(User, identity.user_id) if identity else None
+    if user is None:
+        if not claims.get('email'):
+            return jsonify({'message': 'Invalid credentials'}), 401
+        if not claims.get('email_verified'):
+            # Anyone can put any address on a Firebase account; linking by
+            # email (or claiming it for a new account) needs proof of it
+            return jsonify({'message': 'Email address not verified'}), 403
+        user = User.query.filter_by(email=claims['email']).first()
+        if user is None:
+            user = User(email=claims['email'], role='client')
+            db.session.add(user)
+        db.session.flush()
+        if identity:
+            identity.user_id = user.id
+        else:
+            db.session.add(FirebaseIdentity(uid=claims['uid'], user_id=user.id))
+    
+    user.last_login = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify({
+        'access_token': create_user_token(user),
+        'user': user.to_dict()
+    }), 200
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -41,7 +84,7 @@ def register():
     db.session.add(user)
     db.session.commit()
     
-    access_token = create_access_token(identity=user.id)
+    access_token = create_user_token(user)
     return jsonify({
         'message': 'Registration successful',
         'access_token': access_token,
@@ -52,7 +95,7 @@ def register():
 @jwt_required()
 def get_profile():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user_id)
     
     if not user:
         return jsonify({'message': 'User not found'}), 404
@@ -63,7 +106,7 @@ def get_profile():
 @jwt_required()
 def update_profile():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user_id)
     
     if not user:
         return jsonify({'message': 'User not found'}), 404
@@ -76,6 +119,12 @@ def update_profile():
         user.last_name = data['last_name']
     if 'password' in data:
         user.set_password(data['password'])
+        # Revoke every token issued before the password change
+        bump_token_version(user.id)
     
     db.session.commit()
-    return jsonify({'message': 'Profile updated successfully'}), 200
+    
+    response = {'message': 'Profile updated successfully'}
+    if 'password' in data:
+        response['access_token'] = create_user_token(user)
+    return jsonify(response), 200
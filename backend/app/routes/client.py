@@ -1,9 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import select
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.user import User
 from ..models.document import Document
 from ..models.tax_return import TaxReturn
 from .. import db
+from ..dashboard_cache import dashboard_cache
+from ..pagination import paginate, paginated_response, apply_filters, PaginationError
 from datetime import datetime
 
 client_bp = Blueprint('client', __name__)
@@ -12,8 +15,14 @@ client_bp = Blueprint('client', __name__)
 @jwt_required()
 def get_documents():
     current_user_id = get_jwt_identity()
-    documents = Document.query.filter_by(user_id=current_user_id).all()
-    return jsonify([doc.to_dict() for doc in documents]), 200
+    try:
+        query = apply_filters(select(Document).filter_by(user_id=current_user_id), Document,
+                              ('status', 'tax_year', 'document_type'))
+        fields, rows, next_cursor = paginate(query, Document, Document.upload_date)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return paginated_response(Document, fields, rows, next_cursor), 200
 
 @client_bp.route('/documents', methods=['POST'])
 @jwt_required()
@@ -38,8 +47,14 @@ def upload_document():
 @jwt_required()
 def get_tax_returns():
     current_user_id = get_jwt_identity()
-    tax_returns = TaxReturn.query.filter_by(user_id=current_user_id).all()
-    return jsonify([tax_return.to_dict() for tax_return in tax_returns]), 200
+    try:
+        query = apply_filters(select(TaxReturn).filter_by(user_id=current_user_id), TaxReturn,
+                              ('status', 'tax_year', 'filing_type'))
+        fields, rows, next_cursor = paginate(query, TaxReturn, TaxReturn.created_at)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return paginated_response(TaxReturn, fields, rows, next_cursor), 200
 
 @client_bp.route('/tax-returns/<int:return_id>', methods=['GET'])
 @jwt_required()
@@ -60,19 +75,29 @@ def get_tax_return(return_id):
 def get_dashboard():
     current_user_id = get_jwt_identity()
     
-    # Get recent documents
-    recent_documents = Document.query.filter_by(user_id=current_user_id)\
-        .order_by(Document.upload_date.desc())\
-        .limit(5)\
-        .all()
-    
-    # Get recent tax returns
-    recent_returns = TaxReturn.query.filter_by(user_id=current_user_id)\
-        .order_by(TaxReturn.created_at.desc())\
-        .limit(3)\
-        .all()
+    generation, cached = dashboard_cache.get(current_user_id)
+    if cached is None:
+        # Get recent documents
+        recent_documents = Document.query.filter_by(user_id=current_user_id)\
+            .order_by(Document.upload_date.desc())\
+            .limit(5)\
+            .all()
+        
+        # Get recent tax returns
+        recent_returns = TaxReturn.query.filter_by(user_id=current_user_id)\
+            .order_by(TaxReturn.created_at.desc())\
+            .limit(3)\
+            .all()
+        
+        body = jsonify({
+            'recent_documents': [doc.to_dict() for doc in recent_documents],
+            'recent_returns': [ret.to_dict() for ret in recent_returns]
+        }).get_data()
+        cached = dashboard_cache.put(current_user_id, generation, body)
     
-    return jsonify({
-        'recent_documents': [doc.to_dict() for doc in recent_documents],
-        'recent_returns': [ret.to_dict() for ret in recent_returns]
-    }), 200
+    # An unchanged dashboard answers If-None-Match with an empty 304
+    etag, body = cached
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
@@ -1,29 +1,66 @@
-from flask import Blueprint, request, send_file, jsonify, current_app, make_response
+from flask import Blueprint, request, send_file, jsonify, current_app, make_response, redirect
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-import firebase_admin
-from firebase_admin import auth
+import logging
+import mimetypes
 import os
+import uuid
 from datetime import datetime
 from functools import wraps
 from flask_cors import cross_origin
+from .. import db, token_verifier
+from ..blob_store import BlobStore
+from ..chunked_uploads import ChunkedUploadStore, UploadError, OffsetMismatch, ChecksumMismatch
+from ..jobs import job_queue
+from ..models.job import Job
+from ..outbox import outbox
 
 documents = Blueprint('documents', __name__)
 
-# Create uploads directory if it doesn't exist
+logger = logging.getLogger(__name__)
+
+# Created by `flask init-db` or the first-request initializer; the stores
+# below create their subdirectories when they first write
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'png', 'jpg', 'jpeg'}
 
+# Resumable uploads: chunks stream into a partial file until the client finalizes
+chunked_uploads = ChunkedUploadStore(os.path.join(UPLOAD_FOLDER, '.partial'))
+
+# Text and thumbnails produced by post-upload jobs, keyed by content hash
+DERIVED_FOLDER = os.path.join(UPLOAD_FOLDER, '.derived')
+
+# Uploaded content is stored once per SHA-256; user-visible paths are references.
+# The storage backend (local or S3) is chosen from config in create_app
+blob_store = BlobStore(os.path.join(UPLOAD_FOLDER, '.blobs'), DERIVED_FOLDER)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_user_folder(user_id):
-    user_folder = os.path.join(UPLOAD_FOLDER, user_id)
-    if not os.path.exists(user_folder):
-        os.makedirs(user_folder)
-    return user_folder
+def unique_filename(filename):
+    # The random part keeps two uploads of the same name in the same second
+    # from replacing each other
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+    return f'{timestamp}{uuid.uuid4().hex[:8]}_{filename}'
+
+def upload_error_response(error):
+    body = {'error': str(error)}
+    if isinstance(error, OffsetMismatch):
+        body['offset'] = error.expected
+    elif isinstance(error, ChecksumMismatch):
+        body['sha256'] = error.actual
+    return jsonify(body), error.status_code
+
+def enqueue_processing(user_id, filename, sha256):
+    # Results depend on the content and on the claimed extension
+    extension = filename.rsplit('.', 1)[1].lower()
+    return job_queue.enqueue('process_document', {
+        'sha256': sha256,
+        'filename': filename,
+        'storage': blob_store.storage.settings(),
+        'derived_dir': DERIVED_FOLDER
+    }, owner_uid=user_id, dedupe_key=f'{sha256}:{extension}')
 
 def requires_auth(f):
     @wraps(f)
@@ -34,8 +71,9 @@ def requires_auth(f):
         
         try:
             token = auth_header.split(' ')[1]
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = token_verifier.verify(token)
             request.user_id = decoded_token['uid']
+            request.user_email = decoded_token.get('email')
             return f(*args, **kwargs)
         except Exception as e:
             return jsonify({'error': str(e)}), 401
@@ -48,61 +86,245 @@ def requires_auth(f):
              allow_headers=['Content-Type', 'Authorization', 'Accept'])
 @requires_auth
 def upload_document():
-    print("Received upload request")
-    print("Files in request:", request.files)
-    print("Headers:", dict(request.headers))
-    
     if 'file' not in request.files:
-        print("No file in request")
         return jsonify({'error': 'No file part'}), 400
     
     file = request.files['file']
-    print("File name:", file.filename)
     
     if file.filename == '':
-        print("Empty filename")
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        user_folder = get_user_folder(request.user_id)
-        print("User folder:", user_folder)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        unique_filename = timestamp + filename
-        print("Unique filename:", unique_filename)
+        stored_filename = unique_filename(filename)
         
-        file_path = os.path.join(user_folder, unique_filename)
-        print("Saving file to:", file_path)
-        file.save(file_path)
+        tmp_path, sha256, size = blob_store.save_stream(file.stream)
+        blob_store.ingest(request.user_id, stored_filename, tmp_path, sha256, size)
+        job = enqueue_processing(request.user_id, filename, sha256)
+        outbox.notify(request.user_email, 'documents_received', filename=filename)
+        db.session.commit()
         
         return jsonify({
             'message': 'File uploaded successfully',
-            'filePath': os.path.join(request.user_id, unique_filename)
+            'filePath': os.path.join(request.user_id, stored_filename),
+            'jobId': job.id
         })
     
-    print("File type not allowed:", file.filename)
     return jsonify({'error': 'File type not allowed'}), 400
 
+@documents.route('/upload/init', methods=['POST'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def init_chunked_upload():
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    
+    if not filename:
+        return jsonify({'error': 'No selected file'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or size < 0):
+        return jsonify({'error': 'Invalid size'}), 400
+    
+    chunked_uploads.purge_stale(current_app.config['UPLOAD_PARTIAL_TTL'])
+    state = chunked_uploads.create(request.user_id, filename, size)
+    
+    return jsonify({
+        'uploadId': state['upload_id'],
+        'offset': state['offset'],
+        'chunkSize': current_app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+@documents.route('/upload/<upload_id>', methods=['GET'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def get_chunked_upload(upload_id):
+    try:
+        state = chunked_uploads.get(upload_id, request.user_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify({
+        'uploadId': state['upload_id'],
+        'offset': state['offset'],
+        'size': state['size']
+    })
+
+@documents.route('/upload/<upload_id>', methods=['PUT'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def append_chunk(upload_id):
+    try:
+        offset = int(request.args.get('offset', request.headers.get('Upload-Offset')))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Missing chunk offset'}), 400
+    
+    max_bytes = current_app.config['UPLOAD_CHUNK_SIZE']
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Chunk exceeds {max_bytes} bytes'}), 413
+    
+    try:
+        state = chunked_uploads.append(upload_id, request.user_id, offset, request.stream, max_bytes)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify({
+        'uploadId': state['upload_id'],
+        'offset': state['offset']
+    })
+
+@documents.route('/upload/<upload_id>/complete', methods=['POST'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def complete_chunked_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('sha256') or '', str):
+        return jsonify({'error': 'Invalid sha256'}), 400
+    
+    try:
+        state = chunked_uploads.complete(upload_id, request.user_id, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    stored_filename = unique_filename(state['filename'])
+    try:
+        blob_store.ingest(request.user_id, stored_filename, state['path'],
+                          state['sha256'], state['offset'])
+        job = enqueue_processing(request.user_id, state['filename'], state['sha256'])
+        outbox.notify(request.user_email, 'documents_received', filename=state['filename'])
+        db.session.commit()
+    except Exception:
+        # The completed file may already have moved into the blob store, so
+        # the upload cannot resume; drop it and let the client start over
+        db.session.rollback()
+        raise
+    finally:
+        chunked_uploads.discard(upload_id)
+    
+    return jsonify({
+        'message': 'File uploaded successfully',
+        'filePath': os.path.join(request.user_id, stored_filename),
+        'sha256': state['sha256'],
+        'jobId': job.id
+    })
+
+@documents.route('/upload/<upload_id>', methods=['DELETE'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def abort_chunked_upload(upload_id):
+    try:
+        chunked_uploads.get(upload_id, request.user_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    chunked_uploads.discard(upload_id)
+    return jsonify({'message': 'Upload cancelled'})
+
+@documents.route('/jobs/<int:job_id>', methods=['GET'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.owner_uid != request.user_id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@documents.route('/', methods=['GET'])
+@cross_origin(origins=['http://localhost:3000'])
+@requires_auth
+def list_documents():
+    return jsonify([reference.to_dict() for reference in blob_store.list(request.user_id)])
+
 @documents.route('/<path:document_id>', methods=['GET'])
 @cross_origin(origins=['http://localhost:3000'])
 @requires_auth
 def download_document(document_id):
     try:
-        file_path = os.path.join(UPLOAD_FOLDER, request.user_id, document_id)
-        return send_file(file_path)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 404
+        reference = blob_store.resolve(request.user_id, document_id)
+        if reference:
+            return send_blob(reference, document_id)
+        
+        # Files uploaded before the blob store was introduced
+        file_path = safe_join(UPLOAD_FOLDER, request.user_id, document_id)
+        if file_path is None or not os.path.isfile(file_path):
+            return jsonify({'error': 'File not found'}), 404
+        return send_file(file_path, conditional=True)
+    except Exception:
+        # The message may carry server paths; keep it in the log
+        logger.exception("Download of %r failed", document_id)
+        return jsonify({'error': 'File not found'}), 404
+
+def send_blob(reference, download_name):
+    blob_path = blob_store.blob_path(reference.sha256)
+    if blob_path is None:
+        # Remote storage serves the bytes, ranges and conditionals itself
+        response = redirect(blob_store.storage.download_url(reference.sha256, download_name))
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+        return response
+    
+    offload = current_app.config['DOCUMENT_OFFLOAD']
+    
+    if offload == 'nginx':
+        # nginx serves the bytes (including ranges) from an internal location
+        mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        response = current_app.response_class(mimetype=mimetype)
+        response.set_etag(reference.sha256)
+        response.last_modified = reference.created_at
+        response.cache_control.private = True
+        response.make_conditional(request)
+        if response.status_code == 200:
+            relative_path = os.path.relpath(blob_path, UPLOAD_FOLDER).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = current_app.config['DOCUMENT_OFFLOAD_PREFIX'] + relative_path
+        return response
+    
+    # Handles If-None-Match/If-Modified-Since (304) and Range (206); with
+    # USE_X_SENDFILE set, the bytes go out through the X-Sendfile header
+    response = send_file(
+        blob_path,
+        download_name=download_name,
+        etag=reference.sha256,
+        last_modified=reference.created_at,
+        conditional=True
+    )
+    response.cache_control.private = True
+    return response
 
 @documents.route('/<path:document_id>', methods=['DELETE'])
 @cross_origin(origins=['http://localhost:3000'])
 @requires_auth
 def delete_document(document_id):
     try:
-        file_path = os.path.join(UPLOAD_FOLDER, request.user_id, document_id)
-        if os.path.exists(file_path):
+        if blob_store.remove(request.user_id, document_id):
+            return jsonify({'message': 'File deleted successfully'})
+        
+        file_path = safe_join(UPLOAD_FOLDER, request.user_id, document_id)
+        if file_path is not None and os.path.isfile(file_path):
             os.remove(file_path)
             return jsonify({'message': 'File deleted successfully'})
         return jsonify({'error': 'File not found'}), 404
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    except Exception:
+        logger.exception("Delete of %r failed", document_id)
+        return jsonify({'error': 'Could not delete file'}), 500
+
+@documents.cli.command('import-legacy')
+def import_legacy_files():
+    # Move timestamp-prefixed files from uploads/<uid>/ into the blob store
+    imported = 0
+    for user_id in os.listdir(UPLOAD_FOLDER) if os.path.isdir(UPLOAD_FOLDER) else ():
+        user_folder = os.path.join(UPLOAD_FOLDER, user_id)
+        if user_id.startswith('.') or not os.path.isdir(user_folder):
+            continue
+        for name in os.listdir(user_folder):
+            file_path = os.path.join(user_folder, name)
+            if not os.path.isfile(file_path) or blob_store.resolve(user_id, name):
+                continue
+            with open(file_path, 'rb') as f:
+                tmp_path, sha256, size = blob_store.save_stream(f)
+            blob_store.ingest(user_id, name, tmp_path, sha256, size)
+            db.session.commit()
+            os.remove(file_path)
+            imported += 1
+    print(f"Imported {imported} files into the blob store")
@@ -0,0 +1,37 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from .. import search as search_index
+from ..search import SearchError, user_scope
+
+search_bp = Blueprint('search', __name__)
+
+STAFF_ROLES = ('admin', 'staff')
+
+@search_bp.route('', methods=['GET'])
+@jwt_required()
+def search():
+    kinds = [kind.strip() for kind in request.args.get('kind', '').split(',') if kind.strip()]
+    try:
+        limit = int(request.args.get('limit', search_index.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'Invalid limit'}), 400
+    
+    # Staff search across all clients; clients only see their own records
+    scope = None if get_jwt().get('role') in STAFF_ROLES else user_scope(get_jwt_identity())
+    if scope and 'upload' in kinds:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if scope and not kinds:
+        kinds = ['document', 'tax_return']
+    
+    try:
+        results = search_index.search(request.args.get('q', ''), scope=scope, kinds=kinds, limit=limit)
+    except SearchError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify({'results': results}), 200
+
+@search_bp.cli.command('rebuild')
+def rebuild_index():
+    counts = search_index.rebuild()
+    for kind, count in counts.items():
+        print(f"Indexed {count} {kind} records")
@@ -0,0 +1,154 @@
+import hashlib
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class S3Sink:
+    # Local stand-in for an S3-compatible endpoint: path-style object PUT,
+    # GET (with Range), HEAD and DELETE, kept in memory. Signatures are not
+    # checked and buckets are created on first write. Point
+    # STORAGE_S3_ENDPOINT_URL at it with any credentials.
+    def __init__(self, host='127.0.0.1', port=0):
+        self.objects = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args):
+                pass
+
+            def _target(self):
+                path = unquote(urlsplit(self.path).path).lstrip('/')
+                bucket, _, key = path.partition('/')
+                with sink._lock:
+                    sink.requests += 1
+                return bucket, key
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _error(self, status, code):
+                body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code></Error>'.encode()
+                self._send(status, body, {'Content-Type': 'application/xml'})
+
+            def _read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    data = self._read_chunks()
+                else:
+                    data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+                    data = self._decode_aws_chunked(data)
+                return data
+
+            def _read_chunks(self):
+                parts = []
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0], 16)
+                    if not size:
+                        # Trailers up to the blank line
+                        while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                            pass
+                        return b''.join(parts)
+                    parts.append(self.rfile.read(size))
+                    self.rfile.readline()
+
+            def _decode_aws_chunked(self, data):
+                # <hex size>[;chunk-signature=...]\r\n<bytes>\r\n ... 0\r\n<trailers>
+                parts, position = [], 0
+                while True:
+                    end = data.index(b'\r\n', position)
+                    size = int(data[position:end].split(b';')[0], 16)
+                    if not size:
+                        return b''.join(parts)
+                    parts.append(data[end + 2:end + 2 + size])
+                    position = end + 2 + size + 2
+
+            def do_PUT(self):
+                bucket, key = self._target()
+                data = self._read_body()
+                if not key:
+                    return self._send(200)
+                etag = '"' + hashlib.md5(data).hexdigest() + '"'
+                with sink._lock:
+                    sink.objects[(bucket, key)] = (data, etag, formatdate(usegmt=True))
+                self._send(200, headers={'ETag': etag})
+
+            def do_GET(self):
+                bucket, key = self._target()
+                with sink._lock:
+                    stored = sink.objects.get((bucket, key))
+                if stored is None:
+                    return self._error(404, 'NoSuchKey')
+                data, etag, modified = stored
+                headers = {'ETag': etag, 'Last-Modified': modified, 'Accept-Ranges': 'bytes',
+                           'Content-Type': 'application/octet-stream'}
+                disposition = parse_qs(urlsplit(self.path).query).get('response-content-disposition')
+                if disposition:
+                    headers['Content-Disposition'] = disposition[0]
+                match = RANGE.match(self.headers.get('Range', ''))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+                    else:
+                        start, end = max(len(data) - int(match.group(2)), 0), len(data) - 1
+                    if start >= len(data):
+                        return self._error(416, 'InvalidRange')
+                    headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                    return self._send(206, data[start:end + 1], headers)
+                self._send(200, data, headers)
+
+            do_HEAD = do_GET
+
+            def do_DELETE(self):
+                bucket, key = self._target()
+                with sink._lock:
+                    sink.objects.pop((bucket, key), None)
+                self._send(204)
+
+            def do_POST(self):
+                # Multi-object delete and multipart uploads are not supported
+                self._read_body()
+                self._error(501, 'NotImplemented')
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self.endpoint_url = f'http://{self.host}:{self.port}'
+        self._thread = None
+
+    def keys(self, bucket):
+        with self._lock:
+            return sorted(key for stored_bucket, key in self.objects if stored_bucket == bucket)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='s3-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
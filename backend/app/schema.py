@@ -0,0 +1,59 @@
+import os
+import threading
+
+from sqlalchemy import inspect
+
+from . import analytics, db, stats
+
+
+def upgrade():
+    # create_all() only creates missing tables; indexes added to existing
+    # tables have to be created one by one
+    db.create_all()
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    
+    # The full-text index is dialect-specific DDL outside the metadata
+    from . import search
+    if not inspector.has_table('search_index'):
+        with db.engine.begin() as connection:
+            search.index_backend(connection).create(connection)
+        created.append('search_index')
+        # Writers keep the index current from here on; rows that predate it
+        # are indexed now (`flask search rebuild` does the same on demand)
+        search.rebuild()
+
+    # Counter rows are updated in place by writers and must exist first
+    stats.seed()
+    analytics.seed()
+    return created
+
+
+def initialize(app):
+    created = upgrade()
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return created
+
+
+def first_request_initializer(app):
+    # A before_request hook that initializes once per process; later requests
+    # pay a single attribute check
+    lock = threading.Lock()
+    done = False
+
+    def initialize_once():
+        nonlocal done
+        if done:
+            return
+        with lock:
+            if not done:
+                initialize(app)
+                done = True
+
+    return initialize_once
@@ -0,0 +1,372 @@
+import hashlib
+import os
+import re
+
+from sqlalchemy import event, func, inspect, select, text
+
+from . import db
+from .jobs import job_queue
+from .models.blob import BlobReference
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .models.user import User
+
+# One index row per searchable record. The rowid encodes the record kind in
+# its low bits so updates and deletes address a single row without a lookup.
+KIND_CODES = {'document': 0, 'tax_return': 1, 'upload': 2}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+
+# bm25 / setweight priorities: filename or title first, then the client's name
+TITLE_WEIGHT, OWNER_WEIGHT, YEAR_WEIGHT, BODY_WEIGHT = 10.0, 5.0, 2.0, 1.0
+
+INDEX_BATCH_SIZE = 5000
+MAX_QUERY_TERMS = 8
+MAX_BODY_CHARS = 200000
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+QUERY_TOKEN = re.compile(r'\w[\w\-]*')
+STOP_WORDS = {'a', 'an', 'and', 'the', 'for', 'from', 'of', 'in', 'on', 'to', 'that', 'this', 'with',
+              'my', 'our', 'their', 'his', 'her', 'its', 'is', 'by', 'at'}
+
+INDEXED_ATTRS = {
+    Document: ('user_id', 'filename', 'document_type', 'tax_year', 'notes'),
+    TaxReturn: ('user_id', 'filing_type', 'tax_year', 'notes'),
+    User: ('first_name', 'last_name', 'email')
+}
+
+
+class SearchError(ValueError):
+    pass
+
+
+def entry_rowid(kind, ref_id):
+    return ref_id * 4 + KIND_CODES[kind]
+
+
+def user_scope(user_id):
+    return f'u{user_id}'
+
+
+def upload_scope(owner_uid):
+    # Firebase uids are case-sensitive; the tokenizer is not
+    return 'o' + hashlib.sha1(owner_uid.encode('utf-8')).hexdigest()[:20]
+
+
+def query_terms(query):
+    # All terms must match; backends treat the last one as a prefix so
+    # results can follow the user's typing
+    terms = [term for term in QUERY_TOKEN.findall(query.lower()) if term not in STOP_WORDS]
+    return terms[:MAX_QUERY_TERMS]
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+# -- index backends ------------------------------------------------------
+
+class SQLiteIndex:
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "scope, user_ref UNINDEXED, tax_year, title, owner, body, "
+            "tokenize = \"porter unicode61 remove_diacritics 2 tokenchars '-'\", prefix = '2 3 4')"
+        ))
+
+    def upsert(self, connection, entries):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                           [{'rowid': entry['rowid']} for entry in entries])
+        connection.execute(text(
+            'INSERT INTO search_index (rowid, scope, user_ref, tax_year, title, owner, body) '
+            'VALUES (:rowid, :scope, :user_ref, :tax_year, :title, :owner, :body)'
+        ), entries)
+
+    def delete(self, connection, rowids):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                           [{'rowid': rowid} for rowid in rowids])
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def search(self, connection, terms, scope, kinds, limit):
+        # Scope is an indexed token, so per-user queries intersect posting
+        # lists instead of filtering every match
+        match = ' AND '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        if scope:
+            match = f'scope : "{scope}" AND {match}'
+        kind_filter = ''
+        if kinds:
+            kind_filter = ' AND rowid % 4 IN (' + ', '.join(str(KIND_CODES[kind]) for kind in kinds) + ')'
+        return connection.execute(text(
+            'SELECT rowid, user_ref, tax_year, title, '
+            f'bm25(search_index, 0, 0, {YEAR_WEIGHT}, {TITLE_WEIGHT}, {OWNER_WEIGHT}, {BODY_WEIGHT}) AS score, '
+            "snippet(search_index, 5, '[', ']', '...', 12) AS snippet "
+            f'FROM search_index WHERE search_index MATCH :match{kind_filter} '
+            'ORDER BY score LIMIT :limit'
+        ), {'match': match, 'limit': limit}).all()
+
+
+class PostgresIndex:
+    def create(self, connection):
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS search_index ('
+            'rowid BIGINT PRIMARY KEY, scope TEXT NOT NULL, user_ref TEXT, tax_year TEXT, '
+            'title TEXT, owner TEXT, body TEXT, '
+            'document TSVECTOR GENERATED ALWAYS AS ('
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(owner, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(tax_year, '')), 'C') || "
+            "setweight(to_tsvector('english', coalesce(body, '')), 'D')) STORED)"
+        ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)'
+        ))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_search_index_scope ON search_index (scope)'))
+
+    def upsert(self, connection, entries):
+        connection.execute(text(
+            'INSERT INTO search_index (rowid, scope, user_ref, tax_year, title, owner, body) '
+            'VALUES (:rowid, :scope, :user_ref, :tax_year, :title, :owner, :body) '
+            'ON CONFLICT (rowid) DO UPDATE SET scope = excluded.scope, user_ref = excluded.user_ref, '
+            'tax_year = excluded.tax_year, title = excluded.title, owner = excluded.owner, body = excluded.body'
+        ), entries)
+
+    def delete(self, connection, rowids):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = ANY(:rowids)'), {'rowids': list(rowids)})
+
+    def clear(self, connection):
+        connection.execute(text('TRUNCATE search_index'))
+
+    def search(self, connection, terms, scope, kinds, limit):
+        query = ' & '.join([f"'{term}'" for term in terms[:-1]] + [f"'{terms[-1]}':*"])
+        weights = '{%s,%s,%s,%s}' % (BODY_WEIGHT / TITLE_WEIGHT, YEAR_WEIGHT / TITLE_WEIGHT,
+                                     OWNER_WEIGHT / TITLE_WEIGHT, 1.0)
+        conditions = 'document @@ q'
+        params = {'query': query, 'limit': limit}
+        if scope:
+            conditions += ' AND scope = :scope'
+            params['scope'] = scope
+        if kinds:
+            conditions += ' AND rowid % 4 = ANY(:kinds)'
+            params['kinds'] = [KIND_CODES[kind] for kind in kinds]
+        # Headlines are built only for the page of results
+        return connection.execute(text(
+            'SELECT rowid, user_ref, tax_year, title, score, '
+            "ts_headline('english', coalesce(body, ''), q, 'StartSel=[, StopSel=], MaxFragments=1') AS snippet "
+            f"FROM (SELECT rowid, user_ref, tax_year, title, body, q, -ts_rank_cd('{weights}', document, q) AS score "
+            f"FROM search_index, to_tsquery('english', :query) AS q WHERE {conditions} "
+            'ORDER BY score LIMIT :limit) AS hits ORDER BY score'
+        ), params).all()
+
+
+def index_backend(connection):
+    return PostgresIndex() if connection.dialect.name == 'postgresql' else SQLiteIndex()
+
+
+# -- building entries ----------------------------------------------------
+
+def _document_entries(connection, condition):
+    rows = connection.execute(
+        select(Document.id, Document.user_id, Document.tax_year, Document.filename, Document.document_type,
+               Document.notes, User.first_name, User.last_name, User.email)
+        .outerjoin(User, User.id == Document.user_id)
+        .where(condition)
+    )
+    return [{
+        'rowid': entry_rowid('document', row.id),
+        'scope': user_scope(row.user_id),
+        'user_ref': str(row.user_id),
+        'tax_year': str(row.tax_year) if row.tax_year else None,
+        'title': row.filename,
+        'owner': _join(row.first_name, row.last_name, row.email),
+        'body': _join(row.document_type, row.notes)
+    } for row in rows]
+
+
+def _return_entries(connection, condition):
+    rows = connection.execute(
+        select(TaxReturn.id, TaxReturn.user_id, TaxReturn.tax_year, TaxReturn.filing_type, TaxReturn.notes,
+               User.first_name, User.last_name, User.email)
+        .outerjoin(User, User.id == TaxReturn.user_id)
+        .where(condition)
+    )
+    return [{
+        'rowid': entry_rowid('tax_return', row.id),
+        'scope': user_scope(row.user_id),
+        'user_ref': str(row.user_id),
+        'tax_year': str(row.tax_year),
+        'title': _join(row.tax_year, row.filing_type, 'tax return'),
+        'owner': _join(row.first_name, row.last_name, row.email),
+        'body': row.notes
+    } for row in rows]
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read(MAX_BODY_CHARS)
+    except OSError:
+        return None
+
+
+def _upload_entries(connection, condition, text_by_sha):
+    rows = connection.execute(
+        select(BlobReference.id, BlobReference.owner_uid, BlobReference.path, BlobReference.sha256).where(condition)
+    )
+    return [{
+        'rowid': entry_rowid('upload', row.id),
+        'scope': upload_scope(row.owner_uid),
+        'user_ref': row.owner_uid,
+        'tax_year': None,
+        'title': row.path,
+        'owner': None,
+        'body': text_by_sha.get(row.sha256)
+    } for row in rows]
+
+
+ENTRY_BUILDERS = {
+    'document': (Document, _document_entries),
+    'tax_return': (TaxReturn, _return_entries)
+}
+
+
+def index_records(connection, kind, ids):
+    model, build = ENTRY_BUILDERS[kind]
+    entries = build(connection, model.id.in_(ids))
+    found = {entry['rowid'] for entry in entries}
+    missing = [entry_rowid(kind, ref_id) for ref_id in ids if entry_rowid(kind, ref_id) not in found]
+    backend = index_backend(connection)
+    if entries:
+        backend.upsert(connection, entries)
+    if missing:
+        backend.delete(connection, missing)
+
+
+def index_after(connection, kind, after_id):
+    # For Core bulk inserts, which skip mapper events: everything past the
+    # highest id seen before the insert
+    model, build = ENTRY_BUILDERS[kind]
+    entries = build(connection, model.id > (after_id or 0))
+    if entries:
+        index_backend(connection).upsert(connection, entries)
+
+
+def max_id(connection, model):
+    return connection.execute(select(func.max(model.id))).scalar()
+
+
+def remove_records(connection, kind, ids):
+    index_backend(connection).delete(connection, [entry_rowid(kind, ref_id) for ref_id in ids])
+
+
+def rebuild():
+    connection = db.session.connection()
+    backend = index_backend(connection)
+    backend.create(connection)
+    backend.clear(connection)
+    counts = {}
+    for kind, (model, build) in ENTRY_BUILDERS.items():
+        counts[kind] = 0
+        last_id = 0
+        while True:
+            ids = connection.execute(
+                select(model.id).where(model.id > last_id).order_by(model.id).limit(INDEX_BATCH_SIZE)
+            ).scalars().all()
+            if not ids:
+                break
+            entries = build(connection, model.id.in_(ids))
+            backend.upsert(connection, entries)
+            counts[kind] += len(entries)
+            last_id = ids[-1]
+    db.session.commit()
+    return counts
+
+
+def search(query, scope=None, kinds=None, limit=DEFAULT_LIMIT):
+    terms = query_terms(query or '')
+    if not terms:
+        raise SearchError('Query has no searchable terms')
+    unknown = [kind for kind in kinds or () if kind not in KIND_CODES]
+    if unknown:
+        raise SearchError('Unknown kinds: ' + ', '.join(unknown))
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    connection = db.session.connection()
+    rows = index_backend(connection).search(connection, terms, scope, kinds, limit)
+    return [{
+        'kind': KIND_NAMES[row.rowid % 4],
+        'id': row.rowid // 4,
+        'user_id': int(row.user_ref) if row.user_ref and row.user_ref.isdigit() else row.user_ref,
+        'tax_year': int(row.tax_year) if row.tax_year else None,
+        'title': row.title,
+        'snippet': row.snippet or None,
+        'score': round(-row.score, 6)
+    } for row in rows]
+
+
+# -- incremental maintenance ---------------------------------------------
+
+def _indexed_change(target, model):
+    state = inspect(target)
+    return any(state.attrs[attr].history.has_changes() for attr in INDEXED_ATTRS[model])
+
+
+@event.listens_for(Document, 'after_insert')
+def _document_inserted(mapper, connection, target):
+    index_records(connection, 'document', [target.id])
+
+
+@event.listens_for(Document, 'after_update')
+def _document_updated(mapper, connection, target):
+    if _indexed_change(target, Document):
+        index_records(connection, 'document', [target.id])
+
+
+@event.listens_for(Document, 'after_delete')
+def _document_deleted(mapper, connection, target):
+    remove_records(connection, 'document', [target.id])
+
+
+@event.listens_for(TaxReturn, 'after_insert')
+def _return_inserted(mapper, connection, target):
+    index_records(connection, 'tax_return', [target.id])
+
+
+@event.listens_for(TaxReturn, 'after_update')
+def _return_updated(mapper, connection, target):
+    if _indexed_change(target, TaxReturn):
+        index_records(connection, 'tax_return', [target.id])
+
+
+@event.listens_for(TaxReturn, 'after_delete')
+def _return_deleted(mapper, connection, target):
+    remove_records(connection, 'tax_return', [target.id])
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    # The client's name is indexed with each of their records
+    if _indexed_change(target, User):
+        backend = index_backend(connection)
+        for kind, (model, build) in ENTRY_BUILDERS.items():
+            entries = build(connection, model.user_id == target.id)
+            if entries:
+                backend.upsert(connection, entries)
+
+
+@event.listens_for(BlobReference, 'after_delete')
+def _upload_deleted(mapper, connection, target):
+    remove_records(connection, 'upload', [target.id])
+
+
+@job_queue.on_success('process_document')
+def _upload_processed(job, payload, result):
+    # Extracted text is indexed against every path the owner stored it under
+    text_path = result.get('text_path')
+    body = _read_text(os.path.join(payload['derived_dir'], text_path)) if text_path else None
+    connection = db.session.connection()
+    entries = _upload_entries(connection, (BlobReference.owner_uid == job.owner_uid)
+                              & (BlobReference.sha256 == result['sha256']), {result['sha256']: body})
+    if entries:
+        index_backend(connection).upsert(connection, entries)
@@ -0,0 +1,89 @@
+import json
+from operator import itemgetter
+
+from flask import current_app
+
+from . import db
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .models.user import User
+
+# Keys emitted by each model's to_dict(), in the same order
+MODEL_FIELDS = {
+    User: ('id', 'email', 'first_name', 'last_name', 'role', 'created_at', 'last_login'),
+    Document: ('id', 'user_id', 'filename', 'document_type', 'upload_date', 'tax_year', 'status', 'notes'),
+    TaxReturn: ('id', 'user_id', 'tax_year', 'status', 'filing_type', 'total_income',
+                'total_deductions', 'total_tax', 'created_at', 'completed_at', 'notes')
+}
+
+BATCH_SIZE = 1000
+
+
+def model_columns(model, fields=None):
+    return [getattr(model, field) for field in (fields or MODEL_FIELDS[model])]
+
+
+class RowEncoder:
+    # Turns plain row tuples into the JSON jsonify() would produce for the
+    # equivalent to_dict() list: keys sorted, compact separators, ASCII only
+    def __init__(self, fields, datetime_fields=(), sort_keys=True, ensure_ascii=True):
+        order = sorted(range(len(fields)), key=lambda i: fields[i]) if sort_keys else list(range(len(fields)))
+        self.keys = [fields[i] for i in order]
+        self._reorder = itemgetter(*order) if len(order) > 1 else (lambda row: (row[order[0]],))
+        self._datetime_positions = [i for i, key in enumerate(self.keys) if key in datetime_fields]
+        self._encoder = json.JSONEncoder(ensure_ascii=ensure_ascii, separators=(',', ':'))
+
+    def to_dicts(self, rows):
+        keys = self.keys
+        reorder = self._reorder
+        datetime_positions = self._datetime_positions
+        dicts = []
+        for row in rows:
+            values = reorder(row)
+            if datetime_positions:
+                values = list(values)
+                for i in datetime_positions:
+                    if values[i] is not None:
+                        values[i] = values[i].isoformat()
+            dicts.append(dict(zip(keys, values)))
+        return dicts
+
+    def encode_batch(self, rows):
+        # One C-encoder call per batch instead of one per row
+        return self._encoder.encode(self.to_dicts(rows))[1:-1]
+
+    def encode_lines(self, rows):
+        encode = self._encoder.encode
+        return ''.join(encode(item) + '\n' for item in self.to_dicts(rows))
+
+    def iter_array(self, rows, batch_size=BATCH_SIZE):
+        yield '['
+        first = True
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield ('' if first else ',') + self.encode_batch(batch)
+                first = False
+                batch = []
+        if batch:
+            yield ('' if first else ',') + self.encode_batch(batch)
+        yield ']'
+
+
+def encoder_for(model, fields=None):
+    fields = fields or MODEL_FIELDS[model]
+    columns = model.__table__.columns
+    datetime_fields = {field for field in fields if isinstance(columns[field].type, db.DateTime)}
+    provider = current_app.json
+    return RowEncoder(fields, datetime_fields, sort_keys=provider.sort_keys, ensure_ascii=provider.ensure_ascii)
+
+
+def rows_response(model, fields, rows):
+    encoder = encoder_for(model, fields)
+    provider = current_app.json
+    if provider.compact is False or (provider.compact is None and current_app.debug):
+        # Pretty-printed output is a debugging aid; let jsonify handle it
+        return provider.response(encoder.to_dicts(rows))
+    body = ''.join(encoder.iter_array(rows)) + '\n'
+    return current_app.response_class(body, mimetype=provider.mimetype)
@@ -0,0 +1,116 @@
+import socketserver
+import threading
+from email import message_from_bytes
+from email.policy import default as default_policy
+
+
+def _address(command):
+    # MAIL FROM:<addr> SIZE=... / RCPT TO:<addr>, without ESMTP parameters
+    argument = command.split(':', 1)[1].strip()
+    if argument.startswith('<'):
+        return argument[1:].split('>', 1)[0]
+    return argument.split(' ', 1)[0]
+
+
+class SMTPSink:
+    # Local stand-in for an SMTP server: accepts any login and every message
+    # (no TLS) and keeps them in memory. Point MAIL_SERVER/MAIL_PORT at it
+    # with MAIL_USE_TLS=false.
+    def __init__(self, host='127.0.0.1', port=0, on_message=None):
+        self.messages = []
+        self.connections = 0
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with sink._lock:
+                    sink.connections += 1
+                self._reply('220 localhost SMTP sink ready')
+                mail_from, rcpt_to = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self._reply('250-localhost', '250-AUTH PLAIN LOGIN', '250 SIZE 52428800')
+                    elif verb == 'HELO':
+                        self._reply('250 localhost')
+                    elif verb == 'AUTH':
+                        # Credentials are not checked; read whatever the client sends
+                        parts = command.split()
+                        if parts[1].upper() == 'LOGIN':
+                            for prompt in ('VXNlcm5hbWU6', 'UGFzc3dvcmQ6')[len(parts) - 2:]:
+                                self._reply(f'334 {prompt}')
+                                self.rfile.readline()
+                        elif len(parts) == 2:
+                            self._reply('334 ')
+                            self.rfile.readline()
+                        self._reply('235 Authentication successful')
+                    elif verb == 'MAIL':
+                        mail_from, rcpt_to = _address(command), []
+                        self._reply('250 OK')
+                    elif verb == 'RCPT':
+                        rcpt_to.append(_address(command))
+                        self._reply('250 OK')
+                    elif verb == 'DATA':
+                        self._reply('354 End data with <CR><LF>.<CR><LF>')
+                        sink._store(mail_from, rcpt_to, self._read_data())
+                        mail_from, rcpt_to = None, []
+                        self._reply('250 OK')
+                    elif verb == 'RSET':
+                        mail_from, rcpt_to = None, []
+                        self._reply('250 OK')
+                    elif verb == 'NOOP':
+                        self._reply('250 OK')
+                    elif verb == 'QUIT':
+                        self._reply('221 Bye')
+                        return
+                    else:
+                        self._reply('502 Command not implemented')
+
+            def _read_data(self):
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(line[1:] if line.startswith(b'..') else line)
+                return b''.join(lines)
+
+            def _reply(self, *lines):
+                self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode('utf-8'))
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self._thread = None
+
+    def _store(self, mail_from, rcpt_to, data):
+        message = message_from_bytes(data, policy=default_policy)
+        with self._lock:
+            self.messages.append({'from': mail_from, 'to': rcpt_to, 'message': message})
+        if self.on_message:
+            self.on_message(mail_from, rcpt_to, message)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,130 @@
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models.dashboard_stat import DashboardStat
+from .models.document import Document
+from .models.tax_return import TaxReturn
+from .models.user import User
+
+STAT_KEYS = ('total_users', 'total_documents', 'total_returns', 'pending_returns')
+
+stat_table = DashboardStat.__table__
+
+
+def count_queries():
+    return {
+        'total_users': select(func.count()).select_from(User).where(User.role == 'client'),
+        'total_documents': select(func.count()).select_from(Document),
+        'total_returns': select(func.count()).select_from(TaxReturn),
+        'pending_returns': select(func.count()).select_from(TaxReturn).where(TaxReturn.status == 'in_progress')
+    }
+
+
+def adjust(connection, deltas):
+    # Applied in the writer's transaction, so the counters commit or roll back with the rows
+    for key, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(stat_table).where(stat_table.c.key == key).values(value=stat_table.c.value + delta)
+            )
+
+
+def rebuild():
+    # A no-op UPDATE takes the counter row locks (the SQLite write lock)
+    # before counting, so writers adjusting concurrently wait and then apply
+    # their deltas on top of the new values instead of being overwritten
+    db.session.execute(
+        update(stat_table).where(stat_table.c.key.in_(STAT_KEYS)).values(value=stat_table.c.value)
+    )
+    counts = {key: db.session.execute(query).scalar() for key, query in count_queries().items()}
+    for key, value in counts.items():
+        db.session.merge(DashboardStat(key=key, value=value))
+    db.session.commit()
+    return counts
+
+
+def seed():
+    # Run by schema.upgrade() so adjust() always has rows to update
+    existing = set(db.session.scalars(select(DashboardStat.key).where(DashboardStat.key.in_(STAT_KEYS))))
+    if len(existing) == len(STAT_KEYS):
+        return
+    try:
+        rebuild()
+    except IntegrityError:
+        # Another process seeded them first
+        db.session.rollback()
+
+
+def _stored():
+    # The table also holds counters kept by other modules (app/analytics.py)
+    return {stat.key: stat.value for stat in DashboardStat.query.filter(DashboardStat.key.in_(STAT_KEYS))}
+
+
+def read():
+    values = _stored()
+    if any(key not in values for key in STAT_KEYS):
+        try:
+            return rebuild()
+        except IntegrityError:
+            # Another request seeded the counters first; use its rows
+            db.session.rollback()
+            return _stored()
+    return values
+
+
+def _changed(target, attr, matches):
+    history = inspect(target).attrs[attr].history
+    if not history.has_changes():
+        return 0
+    old = history.deleted[0] if history.deleted else None
+    new = getattr(target, attr)
+    return int(matches(new)) - int(matches(old))
+
+
+def _is_client(role):
+    return role == 'client'
+
+
+def _is_pending(status):
+    return status == 'in_progress'
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    adjust(connection, {'total_users': int(_is_client(target.role))})
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    adjust(connection, {'total_users': _changed(target, 'role', _is_client)})
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    adjust(connection, {'total_users': -int(_is_client(target.role))})
+
+
+@event.listens_for(Document, 'after_insert')
+def _document_inserted(mapper, connection, target):
+    adjust(connection, {'total_documents': 1})
+
+
+@event.listens_for(Document, 'after_delete')
+def _document_deleted(mapper, connection, target):
+    adjust(connection, {'total_documents': -1})
+
+
+@event.listens_for(TaxReturn, 'after_insert')
+def _return_inserted(mapper, connection, target):
+    adjust(connection, {'total_returns': 1, 'pending_returns': int(_is_pending(target.status))})
+
+
+@event.listens_for(TaxReturn, 'after_update')
+def _return_updated(mapper, connection, target):
+    adjust(connection, {'pending_returns': _changed(target, 'status', _is_pending)})
+
+
+@event.listens_for(TaxReturn, 'after_delete')
+def _return_deleted(mapper, connection, target):
+    adjust(connection, {'total_returns': -1, 'pending_returns': -int(_is_pending(target.status))})
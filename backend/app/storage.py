@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class StorageError(Exception):
+    pass
+
+
+def shard(key):
+    # Two levels of hash prefix keep directories (and S3 key prefixes) small
+    return f'{key[:2]}/{key[2:4]}/{key}'
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+
+    def settings(self):
+        return {'backend': 'local', 'root': self.root}
+
+    def local_path(self, key):
+        return os.path.join(self.root, *shard(key).split('/'))
+
+    def save(self, key, tmp_path):
+        # tmp_path must be on the same filesystem; the rename is atomic, so
+        # readers see either the old file or the complete new one
+        path = self.local_path(key)
+        try:
+            os.replace(tmp_path, path)
+        except FileNotFoundError:
+            # First blob in this shard; existing shards cost no extra syscalls
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except OSError:
+            pass
+
+    @contextmanager
+    def local_copy(self, key):
+        yield self.local_path(key)
+
+
+class S3Storage:
+    # Any S3-compatible service; endpoint_url points at MinIO, Ceph, or the
+    # local stand-in in app/s3_sink.py
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, url_ttl=300):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.url_ttl = url_ttl
+        self._client = None
+        self._lock = threading.Lock()
+
+    def settings(self):
+        return {'backend': 's3', 'bucket': self.bucket, 'prefix': self.prefix,
+                'endpoint_url': self.endpoint_url, 'region': self.region, 'url_ttl': self.url_ttl}
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        import boto3
+                        from botocore.config import Config
+                    except ImportError:
+                        raise StorageError('S3 storage requires boto3')
+                    # Path-style addressing works with every S3-compatible endpoint
+                    config = Config(s3={'addressing_style': 'path'}) if self.endpoint_url else None
+                    self._client = boto3.client('s3', endpoint_url=self.endpoint_url,
+                                                region_name=self.region, config=config)
+        return self._client
+
+    def object_key(self, key):
+        return self.prefix + shard(key)
+
+    def local_path(self, key):
+        return None
+
+    def save(self, key, tmp_path):
+        # A single PUT is atomic: the object appears complete or not at all
+        with open(tmp_path, 'rb') as f:
+            self.client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=f)
+        os.remove(tmp_path)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def download_url(self, key, filename):
+        return self.client.generate_presigned_url('get_object', Params={
+            'Bucket': self.bucket,
+            'Key': self.object_key(key),
+            'ResponseContentDisposition': f'attachment; filename="{filename}"'
+        }, ExpiresIn=self.url_ttl)
+
+    @contextmanager
+    def local_copy(self, key):
+        # For code that needs a real file (text extraction, thumbnails)
+        body = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))['Body']
+        fd, path = tempfile.mkstemp(prefix='blob-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in iter(lambda: body.read(READ_BLOCK_SIZE), b''):
+                    f.write(block)
+            yield path
+        finally:
+            body.close()
+            os.remove(path)
+
+
+def create_storage(settings):
+    # settings as returned by .settings(), so job workers in other processes
+    # can open the same storage
+    settings = dict(settings)
+    backend = settings.pop('backend')
+    if backend == 'local':
+        return LocalStorage(**settings)
+    if backend == 's3':
+        if not settings.get('bucket'):
+            raise StorageError('STORAGE_S3_BUCKET is required for S3 storage')
+        return S3Storage(**settings)
+    raise StorageError(f'Unknown storage backend: {backend}')
+
+
+def storage_from_config(config, local_root):
+    if config['STORAGE_BACKEND'] == 'local':
+        return LocalStorage(local_root)
+    return create_storage({
+        'backend': config['STORAGE_BACKEND'],
+        'bucket': config['STORAGE_S3_BUCKET'],
+        'prefix': config['STORAGE_S3_PREFIX'],
+        'endpoint_url': config['STORAGE_S3_ENDPOINT_URL'],
+        'region': config['STORAGE_S3_REGION'],
+        'url_ttl': config['STORAGE_S3_URL_TTL']
+    })
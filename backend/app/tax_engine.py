@@ -0,0 +1,131 @@
+import json
+import os
+from functools import lru_cache
+
+from sqlalchemy import bindparam, select, update
+
+from . import db
+from .analytics import return_analytics
+from .dashboard_cache import dashboard_cache
+from .models.tax_return import TaxReturn
+
+BRACKETS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'tax_brackets.json')
+
+BATCH_SIZE = 10000
+
+# numpy is imported where it is used so loading the admin routes stays cheap
+
+
+class BracketTable:
+    # Bracket lower bounds and marginal rates, plus the tax owed at each lower
+    # bound so a liability is one lookup and one multiply-add
+    def __init__(self, brackets):
+        import numpy as np
+        self.lowers = np.array([lower for lower, _ in brackets], dtype='float64')
+        self.rates = np.array([rate for _, rate in brackets], dtype='float64')
+        widths = np.diff(self.lowers)
+        self.base = np.concatenate([[0.0], np.cumsum(widths * self.rates[:-1])])
+
+    def liability(self, taxable):
+        import numpy as np
+        taxable = np.maximum(taxable, 0.0)
+        index = np.searchsorted(self.lowers, taxable, side='right') - 1
+        return np.round(self.base[index] + (taxable - self.lowers[index]) * self.rates[index], 2)
+
+
+@lru_cache(maxsize=1)
+def _load_brackets():
+    with open(BRACKETS_PATH) as f:
+        return json.load(f)
+
+
+def normalize_filing_type(filing_type):
+    filing_type = (filing_type or 'single').strip().lower()
+    return _load_brackets()['aliases'].get(filing_type, filing_type)
+
+
+@lru_cache(maxsize=None)
+def bracket_table(tax_year, filing_type):
+    brackets = _load_brackets()['years'].get(str(tax_year), {}).get(normalize_filing_type(filing_type))
+    return BracketTable(brackets) if brackets else None
+
+
+def compute_tax(total_income, total_deductions, tax_year, filing_type):
+    import numpy as np
+    table = bracket_table(tax_year, filing_type)
+    if table is None or total_income is None:
+        return None
+    return float(table.liability(np.float64(total_income - (total_deductions or 0.0))))
+
+
+def compute_many(incomes, deductions, tax_years, filing_types):
+    # NaN where there is no income or no bracket table for the year/filing type
+    import numpy as np
+    incomes = np.asarray(incomes, dtype='float64')
+    taxable = incomes - np.nan_to_num(np.asarray(deductions, dtype='float64'))
+    filing_types = np.asarray(filing_types, dtype=object)
+    filing_types = np.where(filing_types == None, '', filing_types).astype(str)  # noqa: E711
+    result = np.full(len(incomes), np.nan)
+
+    # One masked pass per (year, filing type) present; the loop is over
+    # distinct groups, not rows
+    year_values, year_index = np.unique(np.asarray(tax_years), return_inverse=True)
+    type_values, type_index = np.unique(filing_types, return_inverse=True)
+    for y, tax_year in enumerate(year_values.tolist()):
+        in_year = year_index == y
+        for t, filing_type in enumerate(type_values.tolist()):
+            table = bracket_table(tax_year, filing_type)
+            if table is None:
+                continue
+            mask = in_year & (type_index == t)
+            if mask.any():
+                result[mask] = table.liability(taxable[mask])
+
+    result[np.isnan(incomes)] = np.nan
+    return result
+
+
+def recompute_year(tax_year, include_completed=False, batch_size=BATCH_SIZE):
+    import numpy as np
+    table = TaxReturn.__table__
+    # Completed returns have been filed; their tax is only rewritten on request.
+    # The UPDATE repeats the condition for returns completed mid-run
+    condition = table.c.tax_year == tax_year
+    if not include_completed:
+        condition = condition & table.c.status.is_distinct_from('completed')
+
+    # Keyset batches over id keep memory bounded and each transaction short
+    stmt = update(table)\
+        .where(table.c.id == bindparam('_id'), condition)\
+        .values(total_tax=bindparam('total_tax'))
+    updated = skipped = 0
+    owners = set()
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.user_id, table.c.total_income, table.c.total_deductions, table.c.filing_type)
+            .where(condition, table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids, user_ids, incomes, deductions, filing_types = zip(*rows)
+        last_id = ids[-1]
+        taxes = compute_many(incomes, deductions, np.full(len(ids), tax_year), filing_types)
+
+        computed = ~np.isnan(taxes)
+        params = [{'_id': row_id, 'total_tax': tax}
+                  for row_id, tax in zip(np.asarray(ids)[computed].tolist(), taxes[computed].tolist())]
+        if params:
+            # Core executemany skips mapper events; record the change for analytics
+            db.session.execute(stmt, params)
+            return_analytics.record_change(db.session.connection(), [param['_id'] for param in params])
+        db.session.commit()
+        updated += len(params)
+        skipped += int((~computed).sum())
+        owners.update(user_ids)
+
+    # Nor does it drop the owners' cached dashboards
+    dashboard_cache.invalidate(owners)
+    return {'tax_year': tax_year, 'updated': updated, 'skipped': skipped}
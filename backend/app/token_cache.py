@@ -0,0 +1,161 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+
+GOOGLE_CERTS_URL = ('https://www.googleapis.com/robot/v1/metadata/x509/'
+                    'securetoken@system.gserviceaccount.com')
+
+
+def _load_public_key(key):
+    if isinstance(key, RSAPublicKey):
+        return key
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    if b'BEGIN CERTIFICATE' in key:
+        from cryptography import x509
+        return x509.load_pem_x509_certificate(key).public_key()
+    return key
+
+
+class StaticKeySet:
+    # Local stand-in for Google's certificate endpoint: {kid: PEM certificate or public key}
+    def __init__(self, keys):
+        self._keys = {kid: _load_public_key(key) for kid, key in keys.items()}
+        self.fetches = 0
+
+    def get(self, kid):
+        return self._keys.get(kid)
+
+
+class SigningKeySet:
+    def __init__(self, url=GOOGLE_CERTS_URL, default_ttl=3600, min_refresh_interval=60, timeout=10):
+        self.url = url
+        self.default_ttl = default_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.fetches = 0
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, kid):
+        now = time.time()
+        if now >= self._expires_at:
+            self._refresh(now)
+        elif kid not in self._keys and now - self._fetched_at >= self.min_refresh_interval:
+            # Unknown kid usually means Google rotated keys; refetch, but not on every forged header
+            self._refresh(now)
+        return self._keys.get(kid)
+
+    def _refresh(self, now):
+        with self._lock:
+            if self._fetched_at > now - 1 and self._keys:
+                return
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                certs = json.loads(response.read().decode('utf-8'))
+                cache_control = response.headers.get('Cache-Control', '')
+            match = re.search(r'max-age=(\d+)', cache_control)
+            ttl = int(match.group(1)) if match else self.default_ttl
+            self._keys = {kid: _load_public_key(pem) for kid, pem in certs.items()}
+            self._fetched_at = time.time()
+            self._expires_at = self._fetched_at + ttl
+            self.fetches += 1
+
+
+class TokenVerifier:
+    def __init__(self, maxsize=1024, max_ttl=300, key_set=None, project_id=None):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.key_set = key_set
+        self.project_id = project_id
+        self.project_loader = None
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, project_loader=None):
+        self.maxsize = app.config.get('TOKEN_CACHE_SIZE', self.maxsize)
+        self.max_ttl = app.config.get('TOKEN_CACHE_TTL', self.max_ttl)
+        self.project_id = app.config.get('FIREBASE_PROJECT_ID') or self.project_id
+        # Called on the first verification when no project id is configured
+        self.project_loader = project_loader
+
+    def _resolve_project(self):
+        if self.project_id is None and self.project_loader is not None:
+            self.project_id = self.project_loader()
+            self.project_loader = None
+        if self.key_set is None and self.project_id:
+            self.key_set = SigningKeySet()
+
+    def verify(self, token):
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+
+        with self._lock:
+            entry = self._cache.get(digest)
+            if entry is not None:
+                if entry[0] > now:
+                    self._cache.move_to_end(digest)
+                    self.hits += 1
+                    return entry[1]
+                del self._cache[digest]
+            self.misses += 1
+
+        claims = self._verify(token)
+        expires_at = min(claims['exp'], now + self.max_ttl)
+
+        with self._lock:
+            self._cache[digest] = (expires_at, claims)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return claims
+
+    def _verify(self, token):
+        self._resolve_project()
+        if self.key_set is None or not self.project_id:
+            from firebase_admin import auth
+            from .firebase import firebase_app
+            firebase_app()
+            return auth.verify_id_token(token)
+
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = self.key_set.get(kid) if kid else None
+        if key is None:
+            raise jwt.InvalidTokenError('Token signed with an unknown key')
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=['RS256'],
+            audience=self.project_id,
+            issuer=f'https://securetoken.google.com/{self.project_id}',
+            options={'require': ['exp', 'iat', 'sub']}
+        )
+        if not claims['sub']:
+            raise jwt.InvalidTokenError('Token has an empty subject')
+        claims['uid'] = claims['sub']
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'maxsize': self.maxsize,
+                'key_fetches': self.key_set.fetches if self.key_set is not None else 0
+            }
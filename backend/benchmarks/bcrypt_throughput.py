@@ -0,0 +1,57 @@
+# Measures bcrypt hashes/sec inline and through the PasswordHasher pool.
+# Run from backend/: python -m benchmarks.bcrypt_throughput --costs 8 10 12
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def inline_rate(cost, count):
+    salt = bcrypt.gensalt(cost)
+    start = time.perf_counter()
+    for _ in range(count):
+        bcrypt.hashpw(b'correct horse battery staple', salt)
+    return count / (time.perf_counter() - start)
+
+
+def pool_rate(cost, count, workers, clients):
+    hasher = PasswordHasher(rounds=cost, workers=workers, max_pending=clients)
+    rejected = 0
+
+    def one(_):
+        nonlocal rejected
+        try:
+            hasher.hash('correct horse battery staple')
+        except PasswordHasherBusy:
+            rejected += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as request_threads:
+        list(request_threads.map(one, range(count)))
+    return (count - rejected) / (time.perf_counter() - start), rejected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--costs', type=int, nargs='+', default=[4, 8, 10, 12])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'cost':>4} {'inline/s':>10} {'pool/s':>10} {'rejected':>8}")
+    for cost in args.costs:
+        # Size each run from a single-hash probe so every cost takes roughly --seconds
+        start = time.perf_counter()
+        bcrypt.hashpw(b'probe', bcrypt.gensalt(cost))
+        count = max(args.workers, int(args.seconds / (time.perf_counter() - start)))
+        inline = inline_rate(cost, max(1, count // args.workers))
+        pooled, rejected = pool_rate(cost, count, args.workers, args.clients)
+        print(f"{cost:>4} {inline:>10.1f} {pooled:>10.1f} {rejected:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Closes out a batch of returns one PUT /api/admin/tax-returns/<id> at a time
+# and then with a single bulk-update call, and deletes documents row by row
+# and with a single bulk-delete, against a file SQLite database. Reports wall
+# time, SQL statements and commits for each.
+# Run from backend/: python -m benchmarks.bulk_updates --rows 500
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def seed(db, rows, clients=50):
+    from app.models.user import User
+    from app.models.document import Document
+    from app.models.tax_return import TaxReturn
+    from app import stats
+
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'client{i}@example.com', 'password_hash': '', 'role': 'client', 'created_at': now}
+        for i in range(clients)
+    ] + [{'email': 'admin@example.com', 'password_hash': '', 'role': 'admin', 'created_at': now}])
+    # Two rounds of each: one for the per-row loop, one for the bulk call
+    db.session.execute(TaxReturn.__table__.insert(), [
+        {'user_id': 1 + i % clients, 'tax_year': 2023, 'filing_type': 'individual',
+         'status': 'review', 'created_at': now}
+        for i in range(rows * 2)
+    ])
+    db.session.execute(Document.__table__.insert(), [
+        {'user_id': 1 + i % clients, 'filename': f'w2-{i}.pdf', 'document_type': 'W2',
+         'tax_year': 2023, 'upload_date': now}
+        for i in range(rows * 2)
+    ])
+    db.session.commit()
+    stats.rebuild()
+    return User.query.filter_by(role='admin').one()
+
+
+class Counter:
+    def __init__(self, db):
+        from sqlalchemy import event
+        self.statements = 0
+        self.commits = 0
+        event.listen(db.engine, 'before_cursor_execute', self._statement)
+        event.listen(db.engine, 'commit', self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def measure(self, fn):
+        statements, commits = self.statements, self.commits
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start, self.statements - statements, self.commits - commits
+
+
+def report(label, per_row, bulk):
+    print(f"{label}")
+    for name, (seconds, statements, commits) in (('per-row', per_row), ('bulk', bulk)):
+        print(f"  {name:8} {seconds * 1000:9.1f} ms  {statements:6} statements  {commits:5} commits")
+    print(f"  speedup  {per_row[0] / bulk[0]:9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bulk.db')
+    os.environ['JOB_RUNNER_ENABLED'] = 'false'
+    os.environ['MAIL_OUTBOX_ENABLED'] = 'false'
+    os.environ['SLOW_REQUEST_MS'] = '0'
+    os.environ['REQUEST_LOG_SAMPLE_RATE'] = '0'
+
+    from app import create_app, db, stats
+    from app.authz import create_user_token
+    from app.models.document import Document
+    from app.schema import initialize
+
+    app = create_app()
+    rows = args.rows
+    failures = 0
+    with app.app_context():
+        initialize(app)
+        admin = seed(db, rows)
+        headers = {'Authorization': f'Bearer {create_user_token(admin)}'}
+        counter = Counter(db)
+        test_client = app.test_client()
+
+        def put_loop():
+            nonlocal failures
+            for return_id in range(1, rows + 1):
+                response = test_client.put(f'/api/admin/tax-returns/{return_id}', headers=headers,
+                                           json={'status': 'completed', 'notes': 'Filed'})
+                failures += response.status_code != 200
+
+        def bulk_update():
+            nonlocal failures
+            response = test_client.post('/api/admin/tax-returns/bulk-update', headers=headers, json={
+                'ids': list(range(rows + 1, rows * 2 + 1)), 'status': 'completed', 'notes': 'Filed'})
+            failures += response.status_code != 200 or response.get_json()['updated'] != rows
+
+        report(f"status update, {rows} returns", counter.measure(put_loop), counter.measure(bulk_update))
+
+        # Same work as DELETE /api/document/documents/<id>: load, delete, commit
+        def delete_loop():
+            for document_id in range(1, rows + 1):
+                db.session.delete(db.session.get(Document, document_id))
+                db.session.commit()
+
+        def bulk_delete():
+            nonlocal failures
+            response = test_client.post('/api/admin/documents/bulk-delete', headers=headers, json={
+                'ids': list(range(rows + 1, rows * 2 + 1))})
+            failures += response.status_code != 200 or response.get_json()['deleted'] != rows
+
+        report(f"document delete, {rows} documents", counter.measure(delete_loop), counter.measure(bulk_delete))
+
+        # The hand-maintained counters must agree with a recount
+        counts = stats.read()
+        recount = stats.rebuild()
+        if counts != recount:
+            print(f"counter drift: {counts} != {recount}")
+            failures += 1
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
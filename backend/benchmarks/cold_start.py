@@ -0,0 +1,75 @@
+# Cold start: import, create_app and the first request, each measured in a
+# fresh interpreter. Fails when the median exceeds the budget or when a
+# deferred dependency is imported during startup.
+# Run from backend/: python -m benchmarks.cold_start --runs 7 --budget-ms 400
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEFERRED_MODULES = ('pandas', 'numpy', 'firebase_admin', 'pyarrow')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+loaded = [name for name in %r if name in sys.modules]
+response = flask_app.test_client().get('/')
+first_request = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first_request - created) * 1000,
+    'deferred_loaded': loaded
+}))
+''' % (DEFERRED_MODULES,)
+
+
+def probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=400.0,
+                        help='Budget for the median import + create_app time')
+    parser.add_argument('--auto-init', action='store_true',
+                        help='Include the first-request schema initialization against a fresh database')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ, JOB_RUNNER_ENABLED='false', MAIL_OUTBOX_ENABLED='false', AUTO_INIT_DB='true' if args.auto_init else 'false')
+    results = []
+    for run in range(args.runs):
+        # A fresh database per run when measuring initialization
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, f'cold{run if args.auto_init else 0}.db')
+        results.append(probe(env))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    medians = {key: statistics.median(result[key] for result in results)
+               for key in ('import_ms', 'create_app_ms', 'first_request_ms')}
+    startup = medians['import_ms'] + medians['create_app_ms']
+    for key, value in medians.items():
+        print(f"{key:>17}: {value:7.1f} ms")
+    print(f"{'startup':>17}: {startup:7.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    loaded = sorted({name for result in results for name in result['deferred_loaded']})
+    if loaded:
+        print("Deferred modules imported during startup: " + ', '.join(loaded))
+    if loaded or startup > args.budget_ms:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
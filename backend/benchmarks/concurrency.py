@@ -0,0 +1,157 @@
+# Drives a mix of client and admin routes from many threads against a file
+# SQLite database and reports throughput and "database is locked" errors,
+# with the old defaults (rollback journal, FULL sync, default pool) and with
+# the tuned engine settings.
+# Run from backend/: python -m benchmarks.concurrency --threads 16 --seconds 10
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+MODES = {
+    'before': {'SQLITE_WAL': 'false', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '5000',
+               'DB_POOL_SIZE': '5', 'DB_MAX_OVERFLOW': '10', 'DB_POOL_PRE_PING': 'false'},
+    'after': {}
+}
+
+
+def seed(db, clients, returns_per_client=5):
+    from app.models.user import User
+    from app.models.tax_return import TaxReturn
+
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'client{i}@example.com', 'password_hash': '', 'role': 'client', 'created_at': now}
+        for i in range(clients)
+    ] + [{'email': 'admin@example.com', 'password_hash': '', 'role': 'admin', 'created_at': now}])
+    db.session.execute(TaxReturn.__table__.insert(), [
+        {'user_id': 1 + i % clients, 'tax_year': 2023, 'status': 'not_started', 'created_at': now}
+        for i in range(clients * returns_per_client)
+    ])
+    db.session.commit()
+    return User.query.filter_by(role='client').all(), User.query.filter_by(role='admin').one()
+
+
+def run(threads, seconds, clients):
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+    os.environ['JOB_RUNNER_ENABLED'] = 'false'
+    os.environ['MAIL_OUTBOX_ENABLED'] = 'false'
+
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.authz import create_user_token
+    from app.schema import initialize
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        client_users, admin = seed(db, clients)
+        client_tokens = [create_user_token(user) for user in client_users]
+        admin_token = create_user_token(admin)
+        return_count = clients * 5
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+    lock_errors = 0
+    counts_lock = threading.Lock()
+
+    def count_lock_errors(context):
+        nonlocal lock_errors
+        if 'database is locked' in str(context.original_exception):
+            with counts_lock:
+                lock_errors += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'handle_error', count_lock_errors)
+
+    statuses = ['not_started', 'in_progress', 'review', 'completed']
+
+    def requests(test_client, rng):
+        client_headers = {'Authorization': f'Bearer {rng.choice(client_tokens)}'}
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        roll = rng.random()
+        if roll < 0.3:
+            return test_client.get('/api/client/documents?limit=20', headers=client_headers)
+        if roll < 0.5:
+            return test_client.get('/api/client/dashboard', headers=client_headers)
+        if roll < 0.6:
+            return test_client.get('/api/admin/dashboard', headers=admin_headers)
+        if roll < 0.8:
+            return test_client.post('/api/client/documents', headers=client_headers, json={
+                'filename': f'upload{rng.randint(0, 10 ** 9)}.pdf', 'document_type': 'W2', 'tax_year': 2023})
+        return test_client.put(f'/api/admin/tax-returns/{rng.randint(1, return_count)}', headers=admin_headers,
+                               json={'status': rng.choice(statuses), 'notes': 'updated'})
+
+    results = {'ok': 0, 'failed': 0}
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        test_client = app.test_client()
+        ok = failed = 0
+        while time.perf_counter() < deadline:
+            try:
+                response = requests(test_client, rng)
+                if response.status_code < 400:
+                    ok += 1
+                else:
+                    failed += 1
+            except Exception:
+                failed += 1
+        with counts_lock:
+            results['ok'] += ok
+            results['failed'] += failed
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {
+        'journal_mode': journal_mode,
+        'requests_per_second': round(results['ok'] / elapsed, 1),
+        'ok': results['ok'],
+        'failed': results['failed'],
+        'lock_errors': lock_errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--mode', choices=['before', 'after', 'both'], default='both')
+    args = parser.parse_args()
+
+    if args.mode != 'both':
+        # Engine settings are read at create_app, so each mode runs in its own process
+        os.environ.update(MODES[args.mode])
+        print(json.dumps(run(args.threads, args.seconds, args.clients)))
+        return
+
+    print(f"{'mode':>6} {'journal':>8} {'req/s':>8} {'ok':>7} {'failed':>7} {'locked':>7}")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.concurrency', '--mode', mode, '--threads', str(args.threads),
+             '--seconds', str(args.seconds), '--clients', str(args.clients)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>6} {result['journal_mode']:>8} {result['requests_per_second']:>8} {result['ok']:>7} "
+              f"{result['failed']:>7} {result['lock_errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Compares the COUNT(*) dashboard queries with the materialized counters.
+# Run from backend/: python -m benchmarks.dashboard_stats --rows 1000000
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+
+def seed(db, rows, batch_size=50000):
+    from app.models.user import User
+    from app.models.document import Document
+    from app.models.tax_return import TaxReturn
+
+    users = max(rows // 20, 1)
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'client{i}@example.com', 'role': 'client' if i % 50 else 'staff', 'created_at': now}
+        for i in range(users)
+    ])
+    statuses = ['not_started', 'in_progress', 'review', 'completed']
+    for start in range(0, rows, batch_size):
+        count = min(batch_size, rows - start)
+        db.session.execute(TaxReturn.__table__.insert(), [
+            {'user_id': random.randint(1, users), 'tax_year': 2020 + i % 4,
+             'status': random.choice(statuses), 'created_at': now}
+            for i in range(count)
+        ])
+        db.session.execute(Document.__table__.insert(), [
+            {'user_id': random.randint(1, users), 'filename': f'doc{start + i}.pdf', 'upload_date': now}
+            for i in range(count)
+        ])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+    from app import create_app, db, stats
+    from app.schema import initialize
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        start = time.perf_counter()
+        seed(db, args.rows)
+        print(f"seeded {args.rows} returns/documents in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        stats.rebuild()
+        print(f"rebuild-stats: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        def count_path():
+            return {key: db.session.execute(query).scalar() for key, query in stats.count_queries().items()}
+
+        count_ms = timed(count_path, args.repeat)
+        stats_ms = timed(stats.read, args.repeat)
+        assert count_path() == {key: stats.read()[key] for key in stats.STAT_KEYS}
+
+    print(f"COUNT(*) queries: {count_ms:.3f} ms (median of {args.repeat})")
+    print(f"stats table:      {stats_ms:.3f} ms (median of {args.repeat})")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+# Endpoint load suite: seeds a database (benchmarks/seed.py), then drives
+# each endpoint of every blueprint from concurrent threads, either through
+# the Flask test client or over HTTP against an in-process threaded server,
+# and reports p50/p95/p99 latency, requests/s and peak RSS per endpoint.
+# Results can be saved as a baseline and later runs compared against it;
+# the run exits non-zero when an endpoint regresses past the threshold.
+# Run from backend/:
+#   python -m benchmarks.load --transport http --save-baseline benchmarks/load_baseline.json
+#   python -m benchmarks.load --transport http --baseline benchmarks/load_baseline.json --threshold 0.25
+# Set DATABASE_URL to load-test PostgreSQL (seeded into, and left in place);
+# by default a temporary SQLite file is used and removed with its uploads.
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+PROJECT_ID = 'benchmark-project'
+KEY_ID = 'benchmark-key'
+
+
+class Request:
+    def __init__(self, method, path, headers=None, json_body=None, body=None, content_type=None):
+        self.method = method
+        self.path = path
+        self.headers = dict(headers or {})
+        self.body = body
+        if json_body is not None:
+            self.body = json.dumps(json_body).encode('utf-8')
+            content_type = 'application/json'
+        if content_type:
+            self.headers['Content-Type'] = content_type
+
+
+class TestClientTransport:
+    name = 'test'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, req):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(req.path, method=req.method, headers=req.headers, data=req.body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    name = 'http'
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class RequestHandler(WSGIRequestHandler):
+            # HTTP/1.1 keeps each load thread on one connection
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=RequestHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+
+    def send(self, req):
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                connection.request(req.method, req.path, body=req.body, headers=req.headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def close(self):
+        self.server.shutdown()
+
+
+class RssSampler:
+    # Peak resident set size while a phase runs; /proc where available,
+    # otherwise the process high-water mark
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+class Scenario:
+    def __init__(self, app, seeded):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from app import db, token_verifier
+        from app.authz import create_user_token
+        from app.models.user import User
+        from app.token_cache import StaticKeySet
+
+        self.seeded = seeded
+        with app.app_context():
+            admin = User.query.filter_by(email=seeded['admin_email']).one()
+            self.admin_headers = {'Authorization': f'Bearer {create_user_token(admin)}'}
+            # A few hundred signed-in clients is plenty to spread the load
+            self.client_headers = {
+                user_id: {'Authorization': f'Bearer {create_user_token(db.session.get(User, user_id))}'}
+                for user_id in seeded['client_ids'][:200]
+            }
+        self.return_owners = [user_id for user_id in self.client_headers if user_id in seeded['returns_by_user']]
+        self.return_ids = [return_id for ids in seeded['returns_by_user'].values() for return_id in ids]
+
+        # Firebase ID tokens for the documents blueprint, signed by a local key
+        self._firebase_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        token_verifier.key_set = StaticKeySet({KEY_ID: self._firebase_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)})
+        token_verifier.project_id = PROJECT_ID
+        owners = sorted({owner for owner, _ in seeded['uploads']}) or ['bench-uid-0']
+        self.firebase_headers = {owner: {'Authorization': f'Bearer {self._firebase_token(owner)}'} for owner in owners}
+        self.upload_body = b'%PDF-1.4\n' + os.urandom(32 * 1024)
+
+    def _firebase_token(self, uid):
+        import jwt
+
+        now = int(time.time())
+        return jwt.encode({'sub': uid, 'aud': PROJECT_ID, 'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+                           'iat': now, 'exp': now + 3600, 'auth_time': now},
+                          self._firebase_key, algorithm='RS256', headers={'kid': KEY_ID})
+
+    def _client(self, rng):
+        user_id = rng.choice(list(self.client_headers))
+        return user_id, self.client_headers[user_id]
+
+    def _multipart(self, filename, content):
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n').encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode()
+        return body, f'multipart/form-data; boundary={boundary}'
+
+    def endpoints(self):
+        seeded = self.seeded
+
+        def login(rng):
+            return Request('POST', '/api/auth/login', json_body={
+                'email': f'client{rng.randrange(len(seeded["client_ids"]))}@bench.example.com',
+                'password': seeded['password']})
+
+        def profile(rng):
+            return Request('GET', '/api/auth/profile', self._client(rng)[1])
+
+        def client_documents(rng):
+            return Request('GET', '/api/client/documents?limit=20', self._client(rng)[1])
+
+        def client_create_document(rng):
+            return Request('POST', '/api/client/documents', self._client(rng)[1], json_body={
+                'filename': f'load_{rng.randrange(10 ** 9)}.pdf', 'document_type': 'W2', 'tax_year': 2024})
+
+        def client_tax_returns(rng):
+            return Request('GET', '/api/client/tax-returns?limit=20', self._client(rng)[1])
+
+        def client_tax_return(rng):
+            user_id = rng.choice(self.return_owners)
+            return Request('GET', f'/api/client/tax-returns/{rng.choice(seeded["returns_by_user"][user_id])}',
+                           self.client_headers[user_id])
+
+        def client_dashboard(rng):
+            return Request('GET', '/api/client/dashboard', self._client(rng)[1])
+
+        def admin_dashboard(rng):
+            return Request('GET', '/api/admin/dashboard', self.admin_headers)
+
+        def admin_analytics(rng):
+            return Request('GET', f'/api/admin/analytics?tax_year={rng.choice([2022, 2023, 2024])}', self.admin_headers)
+
+        def admin_users(rng):
+            return Request('GET', '/api/admin/users?limit=50', self.admin_headers)
+
+        def admin_tax_returns(rng):
+            return Request('GET', '/api/admin/tax-returns?status=in_progress&limit=50', self.admin_headers)
+
+        def admin_update_tax_return(rng):
+            return Request('PUT', f'/api/admin/tax-returns/{rng.choice(self.return_ids)}', self.admin_headers,
+                           json_body={'status': rng.choice(['in_progress', 'review']), 'notes': 'load test'})
+
+        def admin_export(rng):
+            return Request('GET', '/api/admin/export/tax-returns?tax_year=2024&status=completed', self.admin_headers)
+
+        def search_staff(rng):
+            query = urlencode({'q': rng.choice(['w2', '1099-b 2023', 'smith', 'k-1'])})
+            return Request('GET', f'/api/search?{query}', self.admin_headers)
+
+        def search_client(rng):
+            return Request('GET', '/api/search?q=w2', self._client(rng)[1])
+
+        def documents_upload(rng):
+            owner = rng.choice(list(self.firebase_headers))
+            body, content_type = self._multipart(f'load_{rng.randrange(10 ** 9)}.pdf', self.upload_body)
+            return Request('POST', '/api/documents/upload', self.firebase_headers[owner], body=body,
+                           content_type=content_type)
+
+        def documents_download(rng):
+            owner, path = rng.choice(seeded['uploads'])
+            return Request('GET', f'/api/documents/{path}', self.firebase_headers[owner])
+
+        endpoints = {
+            'auth.login': login,
+            'auth.profile': profile,
+            'client.documents': client_documents,
+            'client.create_document': client_create_document,
+            'client.tax_returns': client_tax_returns,
+            'client.tax_return': client_tax_return,
+            'client.dashboard': client_dashboard,
+            'admin.dashboard': admin_dashboard,
+            'admin.analytics': admin_analytics,
+            'admin.users': admin_users,
+            'admin.tax_returns': admin_tax_returns,
+            'admin.update_tax_return': admin_update_tax_return,
+            'admin.export': admin_export,
+            'search.staff': search_staff,
+            'search.client': search_client,
+            'documents.upload': documents_upload,
+            'documents.download': documents_download
+        }
+        if not self.return_owners:
+            del endpoints['client.tax_return']
+        if not self.return_ids:
+            del endpoints['admin.update_tax_return']
+        if not seeded['uploads']:
+            del endpoints['documents.download']
+        return endpoints
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def run_endpoint(transport, build, threads, seconds, seed_value):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(seed_value * 1000 + index)
+        samples = []
+        failed = 0
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            req = build(rng)
+            started = time.perf_counter()
+            try:
+                status = transport.send(req)
+            except Exception:
+                status = None
+            samples.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(samples)
+            errors += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    with RssSampler() as rss:
+        deadline[0] = time.perf_counter() + seconds
+        started = time.perf_counter()
+        start_barrier.wait()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1)
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if result['requests_per_second'] < base['requests_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {base['requests_per_second']} -> "
+                               f"{result['requests_per_second']} req/s")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{name}: peak RSS {base['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+        if result['errors'] and not base['errors']:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    print(f"{'endpoint':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7} "
+          f"{'errors':>6}" + (f" {'p95 vs base':>11}" if baseline else ''))
+    for name, result in results.items():
+        line = (f"{name:<26} {result['requests_per_second']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                f"{result['p99_ms']:>8} {result['peak_rss_mb']:>7} {result['errors']:>6}")
+        base = (baseline or {}).get('results', {}).get(name)
+        if base and base['p95_ms']:
+            line += f" {(result['p95_ms'] / base['p95_ms'] - 1) * 100:>+10.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transport', choices=['test', 'http'], default='http')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--returns', type=int, default=10000)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--endpoint', action='append', help='Only run these endpoints (repeatable)')
+    parser.add_argument('--baseline', help='Compare against this baseline and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative regression')
+    parser.add_argument('--save-baseline', help='Write the results to this file')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if 'DATABASE_URL' not in os.environ:
+        tmp_dir = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+    os.environ['JOB_RUNNER_ENABLED'] = 'false'
+    os.environ['MAIL_OUTBOX_ENABLED'] = 'false'
+    os.environ['REQUEST_LOG_SAMPLE_RATE'] = '0'
+    os.environ['SLOW_REQUEST_MS'] = '0'
+
+    from benchmarks.seed import remove_uploads, seed
+    from app import create_app
+    from app.schema import initialize
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+    seeded = seed(app, args.users, args.documents, args.returns, args.files)
+    scenario = Scenario(app, seeded)
+    endpoints = scenario.endpoints()
+    if args.endpoint:
+        endpoints = {name: build for name, build in endpoints.items() if name in args.endpoint}
+
+    transport = TestClientTransport(app) if args.transport == 'test' else HttpTransport(app)
+    results = {}
+    try:
+        for index, (name, build) in enumerate(endpoints.items()):
+            transport.send(build(random.Random(index)))  # warm up
+            results[name] = run_endpoint(transport, build, args.threads, args.seconds, index)
+    finally:
+        transport.close()
+        if tmp_dir:
+            # Blobs live under the app's upload folder, not the temp directory
+            from app.models.blob import BlobReference
+            with app.app_context():
+                uploads = [(reference.owner_uid, reference.path) for reference in BlobReference.query.all()]
+            remove_uploads(app, uploads)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    params = {key: getattr(args, key) for key in ('transport', 'threads', 'seconds', 'users', 'documents',
+                                                    'returns', 'files')}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'params': params, 'results': results}, f, indent=2)
+            f.write('\n')
+        print(f"baseline written to {args.save_baseline}")
+
+    if baseline:
+        if baseline.get('params') != params:
+            print(f"warning: baseline was recorded with {baseline.get('params')}")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Drives the read routes through the Flask test client, captures every SELECT
+# they issue and fails if any plan falls back to a full table scan.
+# Run from backend/:
+#   python -m benchmarks.query_plans                      (temporary SQLite db)
+#   python -m benchmarks.query_plans --database-url postgresql://.../scratch
+# The target database receives sample rows, so point it at a scratch database.
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Tables that are meant to be read whole; client_page is the materialized
+# page of /api/admin/clients, at most one page of ids
+ALLOWED_SCANS = {'dashboard_stat', 'client_page'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+WHERE_CLAUSE = re.compile(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', re.S | re.I)
+
+
+def seed(db):
+    from app.models.user import User
+    from app.models.document import Document
+    from app.models.tax_return import TaxReturn
+
+    admin = User(email='plans-admin@example.com', role='admin')
+    client = User(email='plans-client@example.com', role='client')
+    db.session.add_all([admin, client])
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(20):
+        db.session.add(Document(user_id=client.id, filename=f'w2-{i}.pdf', document_type='W2',
+                                tax_year=2023, upload_date=start + timedelta(days=i)))
+        db.session.add(TaxReturn(user_id=client.id, tax_year=2020 + i % 4, filing_type='individual',
+                                 status=['not_started', 'in_progress', 'review', 'completed'][i % 4],
+                                 created_at=start + timedelta(days=i)))
+    db.session.commit()
+    return admin, client
+
+
+def route_requests(client_id):
+    return [
+        ('client', '/api/client/documents'),
+        ('client', '/api/client/documents?limit=5&status=pending'),
+        ('client', '/api/client/tax-returns'),
+        ('client', '/api/client/tax-returns?limit=5&tax_year=2023'),
+        ('client', '/api/client/tax-returns/1'),
+        ('client', '/api/client/dashboard'),
+        ('client', '/api/auth/profile'),
+        ('admin', '/api/admin/dashboard'),
+        ('admin', '/api/admin/users'),
+        ('admin', '/api/admin/users?limit=1'),
+        ('admin', '/api/admin/clients'),
+        ('admin', '/api/admin/clients?limit=1'),
+        ('admin', '/api/admin/tax-returns'),
+        ('admin', '/api/admin/tax-returns?limit=5'),
+        ('admin', '/api/admin/tax-returns?status=in_progress'),
+        ('admin', '/api/admin/tax-returns?tax_year=2023&filing_type=individual'),
+    ]
+
+
+def sqlite_plan(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    details = [row[-1] for row in rows]
+    scans = []
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if not match or match.group(1) in ALLOWED_SCANS:
+            pass
+        elif 'USING' not in detail:
+            scans.append(match.group(1))
+        elif not covers_filters(connection, statement, *match.groups()):
+            # Walks the whole index (for its order) and filters every row
+            scans.append(f'{match.group(1)} via {match.group(2)}')
+        elif detail == 'USE TEMP B-TREE FOR ORDER BY':
+            # Every matching row is read and sorted before LIMIT applies
+            scans.append('sort')
+    return details, scans
+
+
+def covers_filters(connection, statement, table, index):
+    # An index scan is only bounded if the index holds the columns the WHERE
+    # clause tests on that table; primary key lookups show up as SEARCH
+    filtered = set()
+    for where in WHERE_CLAUSE.findall(statement):
+        filtered.update(re.findall(rf'\b{table}\.(\w+)', where))
+    if not filtered or index is None:
+        return not filtered
+    indexed = {row[2] for row in connection.exec_driver_sql(f'PRAGMA index_info("{index}")')}
+    return filtered <= indexed
+
+
+def postgresql_plan(connection, statement, parameters):
+    # With sequential scans discouraged, a Seq Scan in the plan means no index applies
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    details, scans = [], []
+
+    def walk(node):
+        details.append(f"{node['Node Type']} {node.get('Relation Name', '')}".strip())
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') not in ALLOWED_SCANS:
+            scans.append(node['Relation Name'])
+        elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Filter' in node \
+                and 'Index Cond' not in node:
+            # Walks the whole index (for its order) and filters every row
+            scans.append(f"{node['Relation Name']} via {node['Index Name']}")
+        elif node['Node Type'] == 'Sort' and node.get('Parent Relationship') != 'InitPlan':
+            scans.append('sort')
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return details, scans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'plans.db')
+    # Background threads would mix their polling queries into the capture
+    os.environ['JOB_RUNNER_ENABLED'] = 'false'
+    os.environ['MAIL_OUTBOX_ENABLED'] = 'false'
+
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.authz import create_user_token
+    from app.schema import initialize
+
+    app = create_app()
+    captured = []
+
+    with app.app_context():
+        initialize(app)
+        admin, client = seed(db)
+        tokens = {
+            'admin': create_user_token(admin),
+            'client': create_user_token(client)
+        }
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                captured.append((route, statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        test_client = app.test_client()
+        for role, route in route_requests(client.id):
+            response = test_client.get(route, headers={'Authorization': f'Bearer {tokens[role]}'})
+            if response.status_code != 200:
+                print(f"{route}: HTTP {response.status_code}")
+                return 1
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+        explain = postgresql_plan if db.engine.dialect.name == 'postgresql' else sqlite_plan
+        failures = 0
+        seen = set()
+        with db.engine.connect() as connection:
+            for route, statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                with connection.begin():
+                    details, scans = explain(connection, statement, parameters)
+                status = 'FULL SCAN ' + ', '.join(scans) if scans else 'ok'
+                failures += bool(scans)
+                print(f"[{status}] {route}\n    {' '.join(statement.split())}")
+                for detail in details:
+                    print(f"      {detail}")
+
+    if tmp_dir:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"{len(seen)} distinct queries, {failures} full scans")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
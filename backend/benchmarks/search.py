@@ -0,0 +1,80 @@
+# Search latency against a large synthetic document set, for staff (all
+# clients) and for a single client's scope.
+# Run from backend/: python -m benchmarks.search --documents 1000000
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+QUERIES = ['1099-B smith 2023', 'w2 2022', 'brokerage statement', 'mortgage interest johnson',
+           'k-1 partnership', 'charitable receipt 2024']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+    from app import create_app, db, search
+    from app.models.document import Document
+    from app.models.user import User
+    from app.schema import initialize
+
+    rng = np.random.default_rng(11)
+    surnames = np.array(['smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis'])
+    types = np.array(['W2', '1099-B', '1099-INT', '1099-DIV', 'K-1', '1098', 'receipt'])
+    words = np.array(['brokerage', 'statement', 'mortgage', 'interest', 'charitable', 'partnership',
+                      'corrected', 'employer', 'scan', 'copy', 'signed', 'final'])
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'client{i}@example.com', 'password_hash': '', 'role': 'client',
+             'first_name': 'Client', 'last_name': str(surnames[i % len(surnames)]).title()}
+            for i in range(1, args.users + 1)
+        ])
+        db.session.commit()
+
+        for start in range(0, args.documents, 100000):
+            count = min(100000, args.documents - start)
+            user_ids = rng.integers(1, args.users + 1, count)
+            doc_types = rng.choice(types, count)
+            years = rng.choice([2021, 2022, 2023, 2024], count)
+            notes = [' '.join(rng.choice(words, 3)) for _ in range(count)]
+            db.session.execute(Document.__table__.insert(), [
+                {'user_id': int(user_ids[i]), 'filename': f'{doc_types[i].lower()}_{start + i}.pdf',
+                 'document_type': str(doc_types[i]), 'tax_year': int(years[i]), 'notes': notes[i]}
+                for i in range(count)
+            ])
+            db.session.commit()
+
+        start = time.perf_counter()
+        counts = search.rebuild()
+        print(f"rebuild: {counts['document']} documents in {time.perf_counter() - start:.1f} s")
+
+        for label, scope in (('staff', None), ('client', search.user_scope(1))):
+            timings = []
+            for _ in range(args.repeat):
+                for query in QUERIES:
+                    start = time.perf_counter()
+                    search.search(query, scope=scope)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"{label}: median {statistics.median(timings):.2f} ms, "
+                  f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms over {len(timings)} queries")
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# Seeds the database named by DATABASE_URL (SQLite or PostgreSQL) with
+# synthetic clients, documents, tax returns and uploaded files for the load
+# suite. Rows go in through Core executemany, so the dashboard counters and
+# the search index are rebuilt at the end.
+# Run from backend/: DATABASE_URL=postgresql://... python -m benchmarks.seed --users 5000 --documents 50000
+import argparse
+import io
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+PASSWORD = 'benchmark-password'
+ADMIN_EMAIL = 'admin@bench.example.com'
+BATCH_SIZE = 20000
+
+DOCUMENT_TYPES = ['W2', '1099-B', '1099-INT', '1099-DIV', 'K-1', '1098', 'receipt']
+STATUSES = ['not_started', 'in_progress', 'review', 'completed']
+FILING_TYPES = ['individual', 'joint', 'business']
+SURNAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis']
+
+
+def firebase_uid(index):
+    return f'bench-uid-{index}'
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(app, users=1000, documents=10000, returns=5000, files=100, file_size=64 * 1024, seed_value=7):
+    from app import db, password_hasher, search, stats
+    from app.analytics import return_analytics
+    from app.models.document import Document
+    from app.models.tax_return import TaxReturn
+    from app.models.user import User
+    from app.routes.documents import blob_store
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        # One hash shared by every seeded account keeps seeding fast at any cost
+        password_hash = password_hasher.hash(PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'email': ADMIN_EMAIL, 'password_hash': password_hash, 'role': 'admin',
+             'first_name': 'Bench', 'last_name': 'Admin', 'created_at': now}
+        ])
+        for batch in _batches(
+            {'email': f'client{i}@bench.example.com', 'password_hash': password_hash, 'role': 'client',
+             'first_name': 'Client', 'last_name': SURNAMES[i % len(SURNAMES)],
+             'created_at': now - timedelta(minutes=i)}
+            for i in range(users)
+        ):
+            db.session.execute(User.__table__.insert(), batch)
+        db.session.commit()
+
+        client_ids = db.session.scalars(select(User.id).where(User.role == 'client').order_by(User.id)).all()
+        for batch in _batches(
+            {'user_id': rng.choice(client_ids), 'filename': f'{rng.choice(DOCUMENT_TYPES).lower()}_{i}.pdf',
+             'document_type': rng.choice(DOCUMENT_TYPES), 'tax_year': rng.choice([2022, 2023, 2024]),
+             'status': rng.choice(['pending', 'reviewed']), 'notes': 'seeded',
+             'upload_date': now - timedelta(seconds=i)}
+            for i in range(documents)
+        ):
+            db.session.execute(Document.__table__.insert(), batch)
+        for batch in _batches(_return_rows(rng, client_ids, returns, now)):
+            db.session.execute(TaxReturn.__table__.insert(), batch)
+        return_analytics.record_change(db.session.connection())
+        db.session.commit()
+
+        stats.rebuild()
+        search.rebuild()
+
+        # Uploaded files go through the blob store like the upload route does
+        uploads = []
+        for i in range(files):
+            owner = firebase_uid(i % max(users, 1))
+            path = f'statement_{i}.pdf'
+            content = b'%PDF-1.4\n' + rng.randbytes(file_size)
+            tmp_path, sha256, size = blob_store.save_stream(io.BytesIO(content))
+            blob_store.ingest(owner, path, tmp_path, sha256, size)
+            uploads.append((owner, path))
+        db.session.commit()
+
+        returns_by_user = {}
+        for return_id, user_id in db.session.execute(select(TaxReturn.id, TaxReturn.user_id)):
+            returns_by_user.setdefault(user_id, []).append(return_id)
+
+    return {
+        'client_ids': client_ids,
+        'returns_by_user': returns_by_user,
+        'uploads': uploads,
+        'admin_email': ADMIN_EMAIL,
+        'password': PASSWORD
+    }
+
+
+def _return_rows(rng, client_ids, count, now):
+    for i in range(count):
+        status = rng.choice(STATUSES)
+        income = round(rng.uniform(20000, 400000), 2)
+        created_at = now - timedelta(hours=i)
+        yield {
+            'user_id': rng.choice(client_ids), 'tax_year': rng.choice([2022, 2023, 2024]), 'status': status,
+            'filing_type': rng.choice(FILING_TYPES), 'total_income': income,
+            'total_deductions': round(income * rng.uniform(0.05, 0.3), 2), 'created_at': created_at,
+            'completed_at': created_at + timedelta(days=rng.randint(1, 60)) if status == 'completed' else None,
+            'notes': 'seeded'
+        }
+
+
+def remove_uploads(app, uploads):
+    from app.routes.documents import blob_store
+
+    with app.app_context():
+        for owner, path in uploads:
+            blob_store.remove(owner, path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--documents', type=int, default=10000)
+    parser.add_argument('--returns', type=int, default=5000)
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    os.environ.setdefault('JOB_RUNNER_ENABLED', 'false')
+    from app import create_app
+    from app.schema import initialize
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+    start = time.perf_counter()
+    seeded = seed(app, args.users, args.documents, args.returns, args.files, args.file_size)
+    print(f"seeded {len(seeded['client_ids'])} clients, {args.documents} documents, {args.returns} returns "
+          f"and {len(seeded['uploads'])} files in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
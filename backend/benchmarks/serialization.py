@@ -0,0 +1,67 @@
+# Compares ORM hydration + to_dict() + jsonify with the Core row serializer.
+# Run from backend/: python -m benchmarks.serialization --rows 100000
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+    from flask import jsonify
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.models.tax_return import TaxReturn
+    from app.schema import initialize
+    from app.serializers import MODEL_FIELDS, model_columns, rows_response
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        start = datetime(2023, 1, 1)
+        db.session.execute(TaxReturn.__table__.insert(), [
+            {'user_id': 1 + i % 500, 'tax_year': 2020 + i % 4, 'status': 'completed',
+             'filing_type': 'individual', 'total_income': random.uniform(20000, 400000),
+             'total_deductions': random.uniform(0, 30000), 'total_tax': random.uniform(0, 90000),
+             'created_at': start + timedelta(minutes=i), 'completed_at': start + timedelta(minutes=i, days=9),
+             'notes': 'Prior-year carryover' if i % 7 == 0 else None}
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+
+        def orm_path():
+            returns = TaxReturn.query.all()
+            return jsonify([tax_return.to_dict() for tax_return in returns]).get_data()
+
+        def core_path():
+            fields = MODEL_FIELDS[TaxReturn]
+            rows = db.session.execute(select(*model_columns(TaxReturn, fields))).all()
+            return rows_response(TaxReturn, fields, rows).get_data()
+
+        with app.test_request_context():
+            assert orm_path() == core_path(), 'serializer output differs from jsonify'
+            for name, fn in (('orm + to_dict + jsonify', orm_path), ('core rows + RowEncoder', core_path)):
+                samples = []
+                for _ in range(args.repeat):
+                    db.session.expunge_all()
+                    begin = time.perf_counter()
+                    fn()
+                    samples.append(time.perf_counter() - begin)
+                best = min(samples)
+                print(f"{name:<26} {best * 1000:9.1f} ms  {best / args.rows * 1e6:6.2f} us/row")
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Per-return cost of the vectorized tax engine, in memory and end to end.
+# Run from backend/: python -m benchmarks.tax_engine --rows 1000000
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db-rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+    from app import create_app, db
+    from app.models.tax_return import TaxReturn
+    from app.schema import initialize
+    from app.tax_engine import compute_many, compute_tax, recompute_year
+
+    rng = np.random.default_rng(7)
+    filing_types = np.array(['individual', 'married_filing_jointly', 'head_of_household', 'business'])
+    incomes = rng.uniform(10000, 600000, args.rows)
+    deductions = rng.uniform(0, 40000, args.rows)
+    years = rng.choice([2022, 2023, 2024], args.rows)
+    types = rng.choice(filing_types, args.rows).astype(object)
+
+    start = time.perf_counter()
+    taxes = compute_many(incomes, deductions, years, types)
+    elapsed = time.perf_counter() - start
+    print(f"compute_many: {args.rows} returns in {elapsed * 1000:.1f} ms "
+          f"({elapsed / args.rows * 1e6:.3f} us/return)")
+
+    sample = rng.integers(0, args.rows, 1000)
+    for i in sample:
+        assert abs(compute_tax(incomes[i], deductions[i], int(years[i]), types[i]) - taxes[i]) < 0.01
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        db.session.execute(TaxReturn.__table__.insert(), [
+            {'user_id': 1, 'tax_year': 2023, 'filing_type': types[i],
+             'total_income': float(incomes[i]), 'total_deductions': float(deductions[i])}
+            for i in range(args.db_rows)
+        ])
+        db.session.commit()
+
+        start = time.perf_counter()
+        result = recompute_year(2023)
+        elapsed = time.perf_counter() - start
+        print(f"recompute_year: {result['updated']} returns in {elapsed * 1000:.1f} ms "
+              f"({elapsed / max(result['updated'], 1) * 1e6:.2f} us/return including the bulk UPDATE)")
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
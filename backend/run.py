@@ -1,15 +1,12 @@
-from app import create_app, db
+from app import create_app
 import logging
+import os
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger('flask_cors')
-logger.level = logging.DEBUG
+# Request logs go to the 'app.requests' logger as one JSON object per line
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s %(message)s')
 
+# Tables are created on the first request (AUTO_INIT_DB) or by `flask init-db`
 app = create_app()
 
-with app.app_context():
-    db.create_all()
-
 if __name__ == '__main__':
     app.run(debug=True)
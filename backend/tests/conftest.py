@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+# Importing the app package loads .env; keep tests off the tracked database
+# and the background threads
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['JOB_RUNNER_ENABLED'] = 'false'
+os.environ['MAIL_OUTBOX_ENABLED'] = 'false'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'test.db'))
+    from app import create_app
+    from app.schema import initialize
+
+    app = create_app()
+    with app.app_context():
+        initialize(app)
+        yield app
@@ -0,0 +1,128 @@
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import analytics, db
+from app.analytics import ReturnAnalytics, return_analytics
+from app.models.return_change import ReturnChange
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+
+
+@pytest.fixture
+def tax_return(app, monkeypatch):
+    # Start every test from an empty frame cache
+    monkeypatch.setattr(return_analytics, '__dict__', ReturnAnalytics().__dict__)
+    user = User(email='client@example.com', role='client')
+    db.session.add(user)
+    db.session.flush()
+    tax_return = TaxReturn(user_id=user.id, tax_year=2023, filing_type='individual', total_income=100.0)
+    db.session.add(tax_return)
+    db.session.commit()
+    return_analytics.frame()
+    return tax_return
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    load = ReturnAnalytics._load
+
+    def counted(self, ids=None):
+        calls.append(ids)
+        return load(self, ids)
+    monkeypatch.setattr(ReturnAnalytics, '_load', counted)
+    return calls
+
+
+def test_committed_change_is_patched(tax_return, loads):
+    tax_return.total_income = 250.0
+    db.session.commit()
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 250.0
+    assert loads == [[tax_return.id]]
+
+
+def test_other_worker_change_is_patched(tax_return, loads):
+    # A frame built in another process, behind the write made here
+    worker = ReturnAnalytics()
+    worker.frame()
+    loads.clear()
+    tax_return.total_income = 250.0
+    db.session.commit()
+
+    assert worker.frame().loc[tax_return.id, 'total_income'] == 250.0
+    assert loads == [[tax_return.id]]
+
+
+def test_rolled_back_change_is_dropped(tax_return, loads):
+    tax_return.total_income = 250.0
+    db.session.flush()
+    db.session.rollback()
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 100.0
+    assert loads == []
+
+
+def test_unlisted_change_reloads(tax_return, loads):
+    # Core writes that do not name their rows, like the bulk importer
+    db.session.execute(TaxReturn.__table__.update().values(total_income=300.0))
+    return_analytics.record_change(db.session.connection())
+    db.session.commit()
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 300.0
+    assert loads == [None]
+
+
+def test_pruned_log_reloads(tax_return, loads, monkeypatch):
+    monkeypatch.setattr(analytics, 'PRUNE_INTERVAL', 1)
+    monkeypatch.setattr(analytics, 'RETAINED_VERSIONS', 2)
+    for income in (200.0, 300.0, 400.0):
+        tax_return.total_income = income
+        db.session.commit()
+
+    assert db.session.scalar(select(func.count()).select_from(ReturnChange)) == 2
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 400.0
+    assert loads == [None]
+
+
+def test_reads_do_not_write(tax_return):
+    commits = []
+
+    def counted(connection):
+        commits.append(connection)
+    event.listen(db.engine, 'commit', counted)
+    try:
+        tax_return.total_income = 250.0
+        db.session.commit()
+        commits.clear()
+        assert return_analytics.rollup(2023)['total_returns'] == 1
+    finally:
+        event.remove(db.engine, 'commit', counted)
+    assert commits == []
+
+
+def test_rollup_cached_per_version(tax_return):
+    first = return_analytics.rollup()
+    assert return_analytics.rollup() is first
+    tax_return.total_income = 250.0
+    db.session.commit()
+    assert return_analytics.rollup() is not first
+
+
+def test_savepoint_rollback_keeps_pending_changes(tax_return, loads):
+    tax_return.total_income = 250.0
+    db.session.flush()
+    # A duplicate email rolls back only its savepoint
+    with pytest.raises(IntegrityError):
+        with db.session.begin_nested():
+            db.session.add(User(email='client@example.com', role='client'))
+    db.session.commit()
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 250.0
+    assert loads == [[tax_return.id]]
+
+
+def test_savepoint_release_is_not_a_commit(tax_return, loads):
+    tax_return.total_income = 250.0
+    with db.session.begin_nested():
+        pass
+    db.session.rollback()
+    assert return_analytics.frame().loc[tax_return.id, 'total_income'] == 100.0
+    assert loads == []
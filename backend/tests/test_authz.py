@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app import authz, db
+from app.models.user import User
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def sign_in(client, role='client'):
+    user = User(email=f'{role}@example.com', role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'email': user.email, 'password': 'password'})
+    return user, {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+
+
+def test_login_keeps_token_valid(client):
+    user, headers = sign_in(client)
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+    user.first_name = 'Pat'
+    db.session.commit()
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+
+
+def test_role_change_revokes_tokens(client):
+    user, headers = sign_in(client, role='admin')
+    assert client.get('/api/admin/dashboard', headers=headers).status_code == 200
+    user.role = 'client'
+    db.session.commit()
+    assert client.get('/api/admin/dashboard', headers=headers).status_code == 401
+
+
+def test_deleted_user_tokens_are_revoked(client):
+    user, headers = sign_in(client)
+    db.session.delete(user)
+    db.session.commit()
+    assert client.get('/api/auth/profile', headers=headers).status_code == 401
+
+
+def test_version_cached_before_commit_is_dropped(client):
+    user, headers = sign_in(client, role='admin')
+    old_version = authz.current_token_version(user.id)
+    user.role = 'client'
+    db.session.flush()
+    # Another request reads the committed (old) version and caches it
+    # between the flush and the commit
+    authz._versions[user.id] = (old_version, time.monotonic() + 60)
+    db.session.commit()
+    assert client.get('/api/admin/dashboard', headers=headers).status_code == 401
+
+
+def test_lookup_overlapping_a_revocation_is_not_cached(app, monkeypatch):
+    user = User(email='client@example.com', role='client')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    # Entries are per process and outlive each test's database
+    monkeypatch.setattr(authz, '_versions', {})
+
+    def revoke(*args):
+        authz._forget([user_id])
+    event.listen(db.engine, 'before_cursor_execute', revoke)
+    try:
+        assert authz.current_token_version(user_id) == 0
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', revoke)
+    assert user_id not in authz._versions
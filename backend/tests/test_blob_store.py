@@ -0,0 +1,95 @@
+import io
+import os
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.blob_store import BlobStore
+from app.document_tasks import derived_paths
+from app.models.blob import Blob
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    return BlobStore(str(tmp_path / 'blobs'), str(tmp_path / 'derived'))
+
+
+def add(store, owner_uid, path, content):
+    tmp_path, sha256, size = store.save_stream(io.BytesIO(content))
+    store.ingest(owner_uid, path, tmp_path, sha256, size)
+    db.session.commit()
+    return sha256
+
+
+def test_bytes_shared_until_last_reference_goes(store):
+    sha256 = add(store, 'uid-1', 'a.pdf', b'same bytes')
+    assert add(store, 'uid-2', 'b.pdf', b'same bytes') == sha256
+    assert db.session.get(Blob, sha256).ref_count == 2
+
+    store.remove('uid-1', 'a.pdf')
+    db.session.commit()
+    assert os.path.exists(store.blob_path(sha256))
+
+    store.remove('uid-2', 'b.pdf')
+    db.session.commit()
+    assert not os.path.exists(store.blob_path(sha256))
+    assert db.session.get(Blob, sha256) is None
+
+
+def test_failed_commit_keeps_bytes(store):
+    sha256 = add(store, 'uid-1', 'a.pdf', b'keep me')
+
+    def fail(session):
+        raise RuntimeError('commit failed')
+
+    event.listen(db.session, 'before_commit', fail)
+    try:
+        with pytest.raises(RuntimeError):
+            store.remove('uid-1', 'a.pdf')
+    finally:
+        event.remove(db.session, 'before_commit', fail)
+    db.session.rollback()
+
+    assert os.path.exists(store.blob_path(sha256))
+    assert store.resolve('uid-1', 'a.pdf') is not None
+
+
+def test_derived_files_go_with_the_blob(store):
+    sha256 = add(store, 'uid-1', 'a.pdf', b'with text')
+    os.makedirs(store.derived_dir)
+    for path in derived_paths(store.derived_dir, sha256):
+        open(path, 'w').close()
+
+    store.remove('uid-1', 'a.pdf')
+    assert not any(os.path.exists(path) for path in derived_paths(store.derived_dir, sha256))
+
+
+def test_release_survives_a_savepoint_rollback(store):
+    sha256 = add(store, 'uid-1', 'a.pdf', b'released')
+    other = add(store, 'uid-1', 'b.pdf', b'kept')
+
+    db.session.delete(store.resolve('uid-1', 'a.pdf'))
+    db.session.flush()
+    store._release(sha256)
+    # As in _acquire when another request stored the content first
+    with pytest.raises(IntegrityError):
+        with db.session.begin_nested():
+            db.session.add(Blob(sha256=other, size=4, ref_count=1))
+    db.session.commit()
+
+    assert not os.path.exists(store.blob_path(sha256))
+
+
+def test_release_waits_for_the_outer_commit(store):
+    sha256 = add(store, 'uid-1', 'a.pdf', b'released')
+
+    db.session.delete(store.resolve('uid-1', 'a.pdf'))
+    db.session.flush()
+    store._release(sha256)
+    with db.session.begin_nested():
+        pass
+    assert os.path.exists(store.blob_path(sha256))
+    db.session.rollback()
+    assert os.path.exists(store.blob_path(sha256))
@@ -0,0 +1,94 @@
+import pytest
+
+from app import db, search, stats
+from app.models.document import Document
+from app.models.outbox import OutboxMessage
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    user = User(email='admin@example.com', role='admin')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    token = client.post('/api/auth/login', json={'email': user.email, 'password': 'password'}).get_json()['access_token']
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + token
+    return client
+
+
+@pytest.fixture
+def owner(app):
+    owner = User(email='client@example.com', role='client')
+    db.session.add(owner)
+    db.session.flush()
+    db.session.add_all([
+        TaxReturn(user_id=owner.id, tax_year=2023, filing_type='individual', status='in_progress'),
+        TaxReturn(user_id=owner.id, tax_year=2023, filing_type='business', status='review'),
+        TaxReturn(user_id=owner.id, tax_year=2022, filing_type='individual', status='in_progress'),
+        Document(user_id=owner.id, filename='w2.pdf', notes='employer copy'),
+        Document(user_id=owner.id, filename='1099.pdf')
+    ])
+    db.session.commit()
+    return owner
+
+
+def ids(model):
+    return [row.id for row in model.query.order_by(model.id)]
+
+
+def test_update_by_ids_reports_each_row(admin, owner):
+    first, second, _ = ids(TaxReturn)
+    response = admin.post('/api/admin/tax-returns/bulk-update',
+                          json={'ids': [first, second, 999], 'status': 'completed'})
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['updated'], summary['not_found']) == (2, 1)
+    assert summary['results'] == [{'id': first, 'result': 'updated'}, {'id': second, 'result': 'updated'},
+                                  {'id': 999, 'result': 'not_found'}]
+
+    db.session.expire_all()
+    assert all(db.session.get(TaxReturn, i).completed_at for i in (first, second))
+    # Core UPDATE: counters and notices are kept by the bulk path itself
+    assert stats.read()['pending_returns'] == 1 == stats.rebuild()['pending_returns']
+    assert OutboxMessage.query.filter_by(kind='return_status_changed').count() == 2
+
+
+def test_update_by_filter(admin, owner):
+    response = admin.post('/api/admin/tax-returns/bulk-update',
+                          json={'filter': {'tax_year': '2023', 'filing_type': 'individual'}, 'notes': 'crypto'})
+    assert response.get_json()['updated'] == 1
+    assert [db.session.get(TaxReturn, result['id']).tax_year for result in search.search('crypto')] == [2023]
+    assert stats.read()['pending_returns'] == 2
+
+
+@pytest.mark.parametrize('body', [
+    {'status': 'completed'},
+    {'ids': [1], 'filter': {'status': 'review'}, 'status': 'completed'},
+    {'ids': [], 'status': 'completed'},
+    {'ids': ['1'], 'status': 'completed'},
+    {'ids': [1]},
+    {'ids': [1], 'status': 'filed'},
+    {'filter': {'owner': 'x'}, 'status': 'completed'},
+    {'filter': {'tax_year': 'soon'}, 'status': 'completed'},
+])
+def test_invalid_update_is_rejected(admin, owner, body):
+    response = admin.post('/api/admin/tax-returns/bulk-update', json=body)
+    assert response.status_code == 400 and 'message' in response.get_json()
+    db.session.expire_all()
+    assert [r.status for r in TaxReturn.query.order_by(TaxReturn.id)] == ['in_progress', 'review', 'in_progress']
+
+
+def test_delete_documents(admin, owner):
+    first, second = ids(Document)
+    response = admin.post('/api/admin/documents/bulk-delete', json={'ids': [first, 999]})
+    assert response.status_code == 200
+    assert response.get_json() == {'deleted': 1, 'not_found': 1, 'results': [
+        {'id': first, 'result': 'deleted'}, {'id': 999, 'result': 'not_found'}]}
+    assert ids(Document) == [second]
+    assert stats.read()['total_documents'] == 1 == stats.rebuild()['total_documents']
+    assert search.search('employer') == []
+
+    assert admin.post('/api/admin/documents/bulk-delete', json={'ids': 'all'}).status_code == 400
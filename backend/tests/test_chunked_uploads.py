@@ -0,0 +1,65 @@
+import hashlib
+import io
+
+import pytest
+
+from app.chunked_uploads import ChecksumMismatch, ChunkedUploadStore, OffsetMismatch, UploadNotFound
+
+
+def test_digest_rebuilt_after_another_worker_writes(tmp_path):
+    # Two stores on one directory stand in for two gunicorn workers
+    worker_a = ChunkedUploadStore(str(tmp_path))
+    worker_b = ChunkedUploadStore(str(tmp_path))
+    state = worker_a.create('uid-1', 'w2.pdf')
+    upload_id = state['upload_id']
+
+    worker_a.append(upload_id, 'uid-1', 0, io.BytesIO(b'first-'), 1024)
+    worker_b.append(upload_id, 'uid-1', 6, io.BytesIO(b'second-'), 1024)
+    worker_a.append(upload_id, 'uid-1', 13, io.BytesIO(b'third'), 1024)
+
+    state = worker_a.complete(upload_id, 'uid-1')
+    with open(state['path'], 'rb') as f:
+        content = f.read()
+    assert content == b'first-second-third'
+    assert state['sha256'] == hashlib.sha256(content).hexdigest()
+
+
+def test_stale_offset_is_rejected(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path))
+    upload_id = store.create('uid-1', 'w2.pdf')['upload_id']
+    store.append(upload_id, 'uid-1', 0, io.BytesIO(b'abc'), 1024)
+    with pytest.raises(OffsetMismatch) as error:
+        store.append(upload_id, 'uid-1', 0, io.BytesIO(b'xyz'), 1024)
+    assert error.value.expected == 3
+
+
+def test_no_writes_after_complete(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path))
+    upload_id = store.create('uid-1', 'w2.pdf')['upload_id']
+    store.append(upload_id, 'uid-1', 0, io.BytesIO(b'abc'), 1024)
+    state = store.complete(upload_id, 'uid-1')
+
+    with pytest.raises(UploadNotFound):
+        store.append(upload_id, 'uid-1', 3, io.BytesIO(b'more'), 1024)
+    with open(state['path'], 'rb') as f:
+        assert f.read() == b'abc'
+
+    store.discard(upload_id)
+    with pytest.raises(UploadNotFound):
+        store.get(upload_id, 'uid-1')
+
+
+def test_checksum_mismatch_leaves_upload_open(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path))
+    upload_id = store.create('uid-1', 'w2.pdf')['upload_id']
+    store.append(upload_id, 'uid-1', 0, io.BytesIO(b'abc'), 1024)
+
+    with pytest.raises(ChecksumMismatch) as error:
+        store.complete(upload_id, 'uid-1', 'ab' * 32)
+    assert error.value.actual == hashlib.sha256(b'abc').hexdigest()
+
+    # Still resumable and completes once the content is right
+    store.append(upload_id, 'uid-1', 3, io.BytesIO(b'def'), 1024)
+    state = store.complete(upload_id, 'uid-1', hashlib.sha256(b'abcdef').hexdigest().upper())
+    with open(state['path'], 'rb') as f:
+        assert f.read() == b'abcdef'
@@ -0,0 +1,38 @@
+import pytest
+
+from app import create_app, db
+from app.dashboard_cache import MemoryBackend, SQLiteBackend, dashboard_cache
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+
+
+@pytest.mark.parametrize('workers, backend, ttl', [(None, MemoryBackend, 30), ('1', MemoryBackend, 30),
+                                                   ('4', SQLiteBackend, 300)])
+def test_default_backend_follows_worker_count(monkeypatch, tmp_path, workers, backend, ttl):
+    monkeypatch.delenv('DASHBOARD_CACHE', raising=False)
+    monkeypatch.delenv('DASHBOARD_CACHE_TTL', raising=False)
+    monkeypatch.setenv('DASHBOARD_CACHE_PATH', str(tmp_path / 'cache.db'))
+    if workers is None:
+        monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    else:
+        monkeypatch.setenv('WEB_CONCURRENCY', workers)
+    create_app()
+    assert isinstance(dashboard_cache.backend, backend)
+    assert dashboard_cache.backend.ttl == ttl
+
+
+def test_invalidated_on_the_outer_commit_only(app):
+    user = User(email='client@example.com', role='client')
+    db.session.add(user)
+    db.session.commit()
+    generation, _ = dashboard_cache.get(user.id)
+    dashboard_cache.put(user.id, generation, b'{}')
+
+    db.session.add(TaxReturn(user_id=user.id, tax_year=2023))
+    db.session.flush()
+    with db.session.begin_nested():
+        pass
+    # Still cached: a request could otherwise re-cache the pre-commit rows
+    assert dashboard_cache.get(user.id)[1] is not None
+    db.session.commit()
+    assert dashboard_cache.get(user.id)[1] is None
@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import db, token_verifier
+from app.blob_store import BlobStore
+from app.chunked_uploads import ChunkedUploadStore
+from app.models.blob import Blob, BlobReference
+from app.models.job import Job
+from app.models.outbox import OutboxMessage
+from app.outbox import outbox
+from app.routes import documents
+
+
+@pytest.fixture
+def client(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(token_verifier, 'verify', lambda token: {'uid': 'uid-1', 'email': 'client@example.com'})
+    monkeypatch.setattr(documents, 'blob_store', BlobStore(str(tmp_path / 'blobs'), str(tmp_path / 'derived')))
+    monkeypatch.setattr(documents, 'chunked_uploads', ChunkedUploadStore(str(tmp_path / 'partial')))
+    client = app.test_client()
+    client.get('/')
+    return client
+
+
+def upload(client, content=b'%PDF-1.4 statement'):
+    return client.post('/api/documents/upload', headers={'Authorization': 'Bearer token'},
+                       data={'file': (io.BytesIO(content), 'w2.pdf')})
+
+
+def test_upload_commits_once(client):
+    commits = []
+
+    def counted(connection):
+        commits.append(connection)
+    event.listen(db.engine, 'commit', counted)
+    try:
+        response = upload(client)
+    finally:
+        event.remove(db.engine, 'commit', counted)
+    assert response.status_code == 200
+    assert len(commits) == 1
+    assert db.session.get(Job, response.get_json()['jobId']) is not None
+    assert OutboxMessage.query.filter_by(kind='documents_received').count() == 1
+
+
+def test_failed_upload_leaves_nothing(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('outbox unavailable')
+    monkeypatch.setattr(outbox, 'notify', fail)
+
+    assert upload(client).status_code != 200
+    # Flask-SQLAlchemy's teardown; the app fixture's context outlives the request
+    db.session.rollback()
+    assert BlobReference.query.count() == 0 and Job.query.count() == 0 and Blob.query.count() == 0
+    assert not any(files for _, _, files in os.walk(documents.blob_store.root))
+
+
+def chunked_upload(client, content):
+    headers = {'Authorization': 'Bearer token'}
+    upload_id = client.post('/api/documents/upload/init', headers=headers,
+                            json={'filename': 'w2.pdf', 'size': len(content)}).get_json()['uploadId']
+    client.put(f'/api/documents/upload/{upload_id}?offset=0', headers=headers, data=content)
+    return upload_id
+
+
+def test_chunked_checksum_mismatch_can_retry(client):
+    headers = {'Authorization': 'Bearer token'}
+    upload_id = chunked_upload(client, b'%PDF-1.4 chunked')
+
+    response = client.post(f'/api/documents/upload/{upload_id}/complete', headers=headers,
+                           json={'sha256': '0' * 64})
+    assert response.status_code == 422
+    assert response.get_json()['sha256'] == hashlib.sha256(b'%PDF-1.4 chunked').hexdigest()
+
+    response = client.post(f'/api/documents/upload/{upload_id}/complete', headers=headers, json={})
+    assert response.status_code == 200
+
+
+def test_failed_chunked_complete_removes_the_upload(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('outbox unavailable')
+    monkeypatch.setattr(outbox, 'notify', fail)
+    headers = {'Authorization': 'Bearer token'}
+    upload_id = chunked_upload(client, b'%PDF-1.4 chunked')
+
+    assert client.post(f'/api/documents/upload/{upload_id}/complete', headers=headers,
+                       json={}).status_code != 200
+    db.session.rollback()
+    assert os.listdir(documents.chunked_uploads.root) == []
+    assert Blob.query.count() == 0
+    assert not any(files for _, _, files in os.walk(documents.blob_store.root))
@@ -0,0 +1,23 @@
+import csv
+import io
+from datetime import datetime
+
+import pytest
+
+from app.exporters import csv_chunks
+from app.models.document import Document
+
+
+def export_rows(*rows):
+    return list(csv.reader(io.StringIO(''.join(csv_chunks(Document, [list(rows)])))))[1:]
+
+
+@pytest.mark.parametrize('filename', ['=HYPERLINK("x")', '+1', '-2+3', '@SUM(A1)', '\tcmd', '\rcmd'])
+def test_formula_cells_are_quoted(filename):
+    [row] = export_rows((1, 2, filename, 'W2', datetime(2024, 1, 2), 2023, 'uploaded', None))
+    assert row[2] == "'" + filename
+
+
+def test_other_cells_unchanged():
+    [row] = export_rows((1, 2, 'w2.pdf', 'W2', datetime(2024, 1, 2), 2023, 'uploaded', 'a=b'))
+    assert row == ['1', '2', 'w2.pdf', 'W2', '2024-01-02T00:00:00', '2023', 'uploaded', 'a=b']
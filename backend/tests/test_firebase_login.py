@@ -0,0 +1,88 @@
+import io
+
+import pytest
+
+from app import db, token_verifier
+from app.blob_store import BlobStore
+from app.models.firebase_identity import FirebaseIdentity
+from app.models.user import User
+from app.routes import admin, documents
+
+
+@pytest.fixture
+def client(app, tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    monkeypatch.setattr(documents, 'blob_store', store)
+    monkeypatch.setattr(admin, 'blob_store', store)
+    return app.test_client()
+
+
+@pytest.fixture
+def claims(monkeypatch):
+    claims = {}
+    monkeypatch.setattr(token_verifier, 'verify', lambda token: dict(claims[token]))
+    return claims
+
+
+def sign_in(client, claims, uid, email, verified=True):
+    claims[uid] = {'uid': uid, 'email': email, 'email_verified': verified}
+    return client.post('/api/auth/firebase', json={'id_token': uid})
+
+
+def bearer(response):
+    return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+
+
+def test_new_account_becomes_a_client(client, claims):
+    response = sign_in(client, claims, 'uid-1', 'client@example.com')
+    assert response.status_code == 200
+    assert response.get_json()['user']['role'] == 'client'
+    assert client.get('/api/auth/profile', headers=bearer(response)).status_code == 200
+
+    again = sign_in(client, claims, 'uid-1', 'client@example.com')
+    assert again.get_json()['user']['id'] == response.get_json()['user']['id']
+    assert User.query.count() == 1
+
+
+def test_invalid_token_is_rejected(client, claims):
+    assert client.post('/api/auth/firebase', json={'id_token': 'unknown'}).status_code == 401
+
+
+def test_unverified_address_is_not_linked(client, claims):
+    db.session.add_all([User(email='admin@example.com', role='admin'), User(email='client@example.com', role='client')])
+    db.session.commit()
+    for email in ('admin@example.com', 'client@example.com', 'new@example.com'):
+        assert sign_in(client, claims, 'uid-x', email, verified=False).status_code == 403
+    assert FirebaseIdentity.query.count() == 0 and User.query.count() == 2
+
+    response = sign_in(client, claims, 'uid-a', 'admin@example.com')
+    assert response.get_json()['user']['role'] == 'admin'
+
+
+def test_linked_account_signs_in_by_uid(client, claims):
+    user_id = sign_in(client, claims, 'uid-1', 'client@example.com').get_json()['user']['id']
+    # Verification is only needed to link; the uid is the proof afterwards
+    response = sign_in(client, claims, 'uid-1', 'client@example.com', verified=False)
+    assert response.get_json()['user']['id'] == user_id
+
+
+def test_admin_lists_and_downloads_client_uploads(client, claims):
+    db.session.add(User(email='admin@example.com', role='admin'))
+    db.session.commit()
+    staff = bearer(sign_in(client, claims, 'uid-a', 'admin@example.com'))
+    client_id = sign_in(client, claims, 'uid-1', 'client@example.com').get_json()['user']['id']
+
+    store = documents.blob_store
+    tmp_path, sha256, size = store.save_stream(io.BytesIO(b'%PDF-1.4 w2'))
+    store.ingest('uid-1', 'w2.pdf', tmp_path, sha256, size)
+    db.session.commit()
+
+    listing = client.get(f'/api/admin/clients/{client_id}/documents', headers=staff)
+    assert [document['path'] for document in listing.get_json()] == ['w2.pdf']
+    download = client.get(f'/api/admin/clients/{client_id}/documents/w2.pdf', headers=staff)
+    assert download.status_code == 200 and download.data == b'%PDF-1.4 w2'
+    download.close()
+    assert client.get(f'/api/admin/clients/{client_id}/documents/other.pdf', headers=staff).status_code == 404
+
+    own = bearer(sign_in(client, claims, 'uid-1', 'client@example.com'))
+    assert client.get(f'/api/admin/clients/{client_id}/documents', headers=own).status_code == 403
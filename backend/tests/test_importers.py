@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from app import db, search, stats
+from app.importers import BulkImportError, import_tax_returns
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+
+
+@pytest.fixture
+def user(app):
+    user = User(email='client@example.com', role='client', first_name='Robin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def csv_source(*lines):
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def test_bad_rows_are_reported_and_the_rest_imported(user):
+    source = csv_source(
+        'user_id,tax_year,status,total_income,created_at,notes',
+        f'{user.id},2023,in_progress,1000,2024-02-01,rental income',
+        f'{user.id},20x3,,,,',
+        f'{user.id + 99},2023,,,,',
+        f'{user.id},2022,filed,,,',
+        f'{user.id},2022,review,lots,,',
+        f'{user.id},2021,,,not a date,',
+        f'{user.id},2021,,500.5,,'
+    )
+    # Chunks of two rows: row numbers carry across chunks
+    summary = import_tax_returns(source, 'csv', chunk_size=2)
+
+    assert summary['inserted'] == 2 and summary['failed'] == 5
+    assert summary['errors'] == [
+        {'row': 2, 'error': 'invalid tax_year'},
+        {'row': 3, 'error': 'unknown user_id'},
+        {'row': 4, 'error': 'invalid status'},
+        {'row': 5, 'error': 'invalid total_income'},
+        {'row': 6, 'error': 'invalid created_at'}
+    ]
+    assert sorted(r.tax_year for r in TaxReturn.query) == [2021, 2023]
+    assert stats.read()['total_returns'] == 2 and stats.read()['pending_returns'] == 1
+    # Core inserts skip mapper events; the importer indexes each chunk itself
+    assert [result['tax_year'] for result in search.search('rental')] == [2023]
+
+
+def test_reported_errors_are_capped(user):
+    source = csv_source('user_id,tax_year', *[f'{user.id},bad' for _ in range(5)])
+    summary = import_tax_returns(source, 'csv', max_reported_errors=3)
+    assert summary['failed'] == 5 and len(summary['errors']) == 3
+
+
+def test_missing_required_column_is_rejected(user):
+    with pytest.raises(BulkImportError, match='tax_year'):
+        import_tax_returns(csv_source('user_id,status', f'{user.id},review'), 'csv')
@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, jobs
+from app.jobs import JobQueue
+from app.models.job import Job
+
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    app.config.update(JOB_POLL_INTERVAL=0.01, JOB_RETRY_BACKOFF=10, JOB_MAX_ATTEMPTS=3)
+    queue = JobQueue()
+    queue.init_app(app)
+    yield queue
+    queue.stop()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Stands in for the document task; fails while the payload asks it to
+    calls = []
+
+    def task(payload):
+        calls.append(payload)
+        if payload.get('fail'):
+            raise RuntimeError('task failed')
+        return {'echo': payload['n']}
+    monkeypatch.setitem(jobs.TASKS, 'process_document', task)
+    return calls
+
+
+def enqueue(queue, **payload):
+    job = queue.enqueue('process_document', payload, owner_uid='uid-1')
+    db.session.commit()
+    return job.id
+
+
+def reload(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def test_queued_jobs_are_claimed_and_finished(queue, calls):
+    job_ids = [enqueue(queue, n=n) for n in range(3)]
+    queue.run(once=True)
+
+    assert sorted(payload['n'] for payload in calls) == [0, 1, 2]
+    for n, job_id in enumerate(job_ids):
+        job = reload(job_id)
+        assert (job.status, job.attempts, json.loads(job.result)) == ('succeeded', 1, {'echo': n})
+
+
+def test_a_claimed_job_is_not_claimed_again(queue, app, calls):
+    job_id = enqueue(queue, n=1)
+    other = JobQueue()
+    other.init_app(app)
+    other._executor = queue._executor = queue._make_executor()
+    try:
+        queue._claim()
+        other._claim()
+        assert list(queue._running.values()) == [job_id] and other._running == {}
+    finally:
+        other._executor = None
+        queue.run(once=True)
+    assert reload(job_id).attempts == 1
+
+
+def test_failures_back_off_then_fail(queue, calls):
+    job_id = enqueue(queue, n=1, fail=True)
+    for attempt, backoff in ((1, 10), (2, 20)):
+        before = datetime.utcnow()
+        queue.run(once=True)
+        job = reload(job_id)
+        assert (job.status, job.attempts) == ('queued', attempt)
+        assert 'task failed' in job.error
+        assert before + timedelta(seconds=backoff) <= job.run_after <= datetime.utcnow() + timedelta(seconds=backoff)
+
+        # Not retried before run_after
+        queue.run(once=True)
+        assert len(calls) == attempt
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+
+    queue.run(once=True)
+    job = reload(job_id)
+    assert (job.status, job.attempts, len(calls)) == ('failed', 3, 3)
+
+
+def test_stale_claims_are_recovered(queue, app, calls):
+    stale, fresh = enqueue(queue, n=1), enqueue(queue, n=2)
+    timeout = timedelta(seconds=app.config['JOB_TIMEOUT'])
+    for job_id, started_at in ((stale, datetime.utcnow() - timeout - timedelta(minutes=1)),
+                               (fresh, datetime.utcnow())):
+        job = db.session.get(Job, job_id)
+        job.status, job.attempts, job.started_at = 'running', 1, started_at
+    db.session.commit()
+
+    queue.run(once=True)
+    assert (reload(stale).status, reload(stale).attempts) == ('succeeded', 2)
+    assert reload(fresh).status == 'running'
+    assert [payload['n'] for payload in calls] == [1]
+
+
+def test_duplicate_reuses_result_while_outputs_exist(queue, tmp_path):
+    payload = {'sha256': 'ab' * 32, 'filename': 'w2.pdf', 'derived_dir': str(tmp_path)}
+    text_path = tmp_path / ('ab' * 32 + '.txt')
+    text_path.write_text('wages')
+    db.session.add(Job(kind='process_document', payload=json.dumps(payload), dedupe_key='ab:pdf',
+                       status='succeeded', result=json.dumps({'text_path': text_path.name})))
+    db.session.commit()
+
+    reused = queue.enqueue('process_document', payload, owner_uid='uid-2', dedupe_key='ab:pdf')
+    assert reused.status == 'succeeded'
+    db.session.commit()
+
+    # The blob and its text went with the last reference; upload again
+    text_path.unlink()
+    job = queue.enqueue('process_document', payload, owner_uid='uid-3', dedupe_key='ab:pdf')
+    assert job.status == 'queued'
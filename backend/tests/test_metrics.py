@@ -0,0 +1,37 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.metrics import request_metrics
+
+
+def test_metrics_closed_without_a_token(app):
+    app.config['METRICS_TOKEN'] = None
+    assert app.test_client().get('/metrics').status_code == 401
+
+
+def test_metrics_need_the_token(app):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    client = app.test_client()
+    client.get('/')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    # Counters are per process and include earlier tests' requests
+    assert 'http_requests_total{blueprint="",endpoint="index",method="GET",status="200"}' in response.text
+
+
+def test_failed_statement_is_timed_on_its_own(app):
+    with app.test_request_context('/'):
+        request_metrics._start()
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+
+        state = g.request_metrics
+        assert state['queries'] == 2
+        assert [statement for statement, _ in state['statements']] == ['SELECT * FROM no_such_table', 'SELECT 1']
+        assert all(0 <= elapsed < 1000 for _, elapsed in state['statements'])
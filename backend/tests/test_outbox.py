@@ -0,0 +1,135 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.outbox import OutboxMessage
+from app.outbox import DIGEST_SUBJECT, Outbox
+from app.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def sink(app):
+    app.config.update(MAIL_DIGEST_WINDOW=0, MAIL_MIN_INTERVAL=300, MAIL_RATE_LIMIT=0, MAIL_BATCH_SIZE=50,
+                      MAIL_RETRY_BACKOFF=60, MAIL_MAX_ATTEMPTS=2, MAIL_SEND_TIMEOUT=600)
+    with SMTPSink() as sink:
+        state = app.extensions['mail']
+        state.server, state.port, state.use_tls, state.use_ssl = sink.host, sink.port, False, False
+        state.username, state.password, state.suppress = 'outbox', 'secret', False
+        yield sink
+
+
+@pytest.fixture
+def outbox(app):
+    outbox = Outbox()
+    outbox.init_app(app)
+    return outbox
+
+
+def notify(outbox, recipient, **details):
+    details = details or {'filename': 'w2.pdf'}
+    kind = 'return_status_changed' if 'status' in details else 'documents_received'
+    message = outbox.notify(recipient, kind, **details)
+    db.session.commit()
+    return message
+
+
+def age(minutes, **filters):
+    # Moves matching notices' timestamps into the past
+    then = datetime.utcnow() - timedelta(minutes=minutes)
+    for message in OutboxMessage.query.filter_by(**filters):
+        for column in ('created_at', 'send_after', 'sent_at', 'claimed_at'):
+            if getattr(message, column) is not None:
+                setattr(message, column, then)
+    db.session.commit()
+
+
+def received(sink):
+    return sorted((entry['to'][0], entry['message']['Subject']) for entry in sink.messages)
+
+
+def test_notices_coalesce_into_one_digest_per_recipient(sink, outbox):
+    notify(outbox, 'a@example.com', filename='w2.pdf')
+    notify(outbox, 'a@example.com', filename='1099.pdf')
+    notify(outbox, 'a@example.com', tax_year=2023, status='review')
+    notify(outbox, 'b@example.com', filename='w2.pdf')
+
+    assert outbox.send_batch() == 2
+    assert sink.connections == 1
+    assert received(sink) == [('a@example.com', DIGEST_SUBJECT), ('b@example.com', 'We received your documents')]
+    body = next(e['message'] for e in sink.messages if e['to'] == ['a@example.com']).get_content()
+    assert 'w2.pdf' in body and '1099.pdf' in body and 'now in review' in body
+    assert {m.status for m in OutboxMessage.query} == {'sent'}
+
+
+def test_digest_window_holds_fresh_notices(sink, outbox, app):
+    app.config['MAIL_DIGEST_WINDOW'] = 60
+    notify(outbox, 'a@example.com')
+    assert outbox.send_batch() == 0
+
+    age(2)
+    assert outbox.send_batch() == 1
+
+
+def test_min_interval_between_digests(sink, outbox):
+    notify(outbox, 'a@example.com')
+    assert outbox.send_batch() == 1
+
+    notify(outbox, 'a@example.com', filename='1099.pdf')
+    notify(outbox, 'b@example.com')
+    assert outbox.send_batch() == 1
+    assert received(sink)[-1][0] == 'b@example.com'
+
+    # Once MAIL_MIN_INTERVAL has passed since the last digest
+    age(10, recipient='a@example.com', status='sent')
+    assert outbox.send_batch() == 1
+    assert len(sink.messages) == 3
+
+
+def test_rate_budget(sink, outbox, app):
+    app.config['MAIL_RATE_LIMIT'] = 2
+    for recipient in ('a@example.com', 'b@example.com', 'c@example.com'):
+        notify(outbox, recipient)
+
+    assert outbox.send_batch() == 2
+    assert outbox.send_batch() == 0
+    # A minute later the budget is back
+    outbox._sent_times = type(outbox._sent_times)(t - 61 for t in outbox._sent_times)
+    assert outbox.send_batch() == 1
+
+
+def test_connection_failure_backs_off_then_fails(sink, outbox, app):
+    # Nothing listens on the port once the socket is closed
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        app.extensions['mail'].port = closed.getsockname()[1]
+    message_id = notify(outbox, 'a@example.com').id
+
+    before = datetime.utcnow()
+    assert outbox.send_batch() == 0
+    message = db.session.get(OutboxMessage, message_id)
+    assert (message.status, message.attempts, message.claim_token) == ('pending', 1, None)
+    assert message.send_after >= before + timedelta(seconds=60)
+    # Not retried before send_after
+    assert outbox.send_batch() == 0 and message.attempts == 1
+
+    age(5)
+    outbox.send_batch()
+    db.session.refresh(message)
+    assert (message.status, message.attempts) == ('failed', 2)
+    assert sink.messages == []
+
+
+def test_stale_claims_are_sent_again(sink, outbox):
+    stale = notify(outbox, 'a@example.com')
+    fresh = notify(outbox, 'b@example.com')
+    for message in (stale, fresh):
+        message.status, message.claim_token, message.claimed_at = 'sending', 'dead-sender', datetime.utcnow()
+    db.session.commit()
+    age(15, recipient='a@example.com')
+
+    outbox.run(once=True)
+    assert received(sink) == [('a@example.com', 'We received your documents')]
+    db.session.refresh(fresh)
+    assert fresh.status == 'sending'
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+from app.pagination import decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    user = User(email='admin@example.com', role='admin')
+    user.set_password('password')
+    owner = User(email='client@example.com', role='client')
+    db.session.add_all([user, owner])
+    db.session.flush()
+    # Shared timestamps: ties are broken by id
+    created_at = [datetime(2024, 1, 1 + i // 2) for i in range(7)]
+    db.session.add_all([TaxReturn(user_id=owner.id, tax_year=2023 if i % 3 else 2022,
+                                  filing_type='individual', created_at=created_at[i]) for i in range(7)])
+    db.session.commit()
+    token = client.post('/api/auth/login', json={'email': user.email, 'password': 'password'}).get_json()['access_token']
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + token
+    return client
+
+
+def pages(client, url):
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(row['id'] for row in response.get_json())
+        link = response.headers.get('Link')
+        assert (link is None) == (response.headers.get('X-Next-Cursor') is None)
+        url = link[1:link.index('>')] if link else None
+    return ids
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(datetime(2024, 1, 2, 3, 4, 5), 42)) == (datetime(2024, 1, 2, 3, 4, 5), 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+def test_link_walks_every_row_once(admin):
+    expected = [row.id for row in TaxReturn.query.order_by(TaxReturn.created_at.desc(), TaxReturn.id.desc())]
+    assert pages(admin, '/api/admin/tax-returns?limit=2') == expected
+
+
+def test_link_keeps_filters_and_fields(admin):
+    response = admin.get('/api/admin/tax-returns?limit=1&tax_year=2023&fields=id,tax_year')
+    assert set(response.get_json()[0]) == {'id', 'tax_year'}
+    assert 'tax_year=2023' in response.headers['Link'] and 'fields=id' in response.headers['Link']
+
+    ids = pages(admin, '/api/admin/tax-returns?limit=1&tax_year=2023&fields=id,tax_year')
+    assert ids == [row.id for row in TaxReturn.query.filter_by(tax_year=2023)
+                   .order_by(TaxReturn.created_at.desc(), TaxReturn.id.desc())]
+
+
+@pytest.mark.parametrize('query', ['cursor=not-a-cursor', 'cursor=' + encode_cursor(None, 1)[:-2] + '!!',
+                                   'limit=many', 'tax_year=soon', 'fields=password_hash'])
+def test_bad_arguments_are_rejected(admin, query):
+    response = admin.get('/api/admin/tax-returns?' + query)
+    assert response.status_code == 400
+    assert 'message' in response.get_json()
@@ -0,0 +1,34 @@
+import threading
+
+import pytest
+
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def test_default_limit_is_pool_plus_queue():
+    assert PasswordHasher(workers=3).max_pending == 6
+
+
+def test_rejects_once_pool_and_queue_are_full():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    release = threading.Event()
+    started = threading.Barrier(3)
+
+    def held():
+        started.wait()
+        hasher._run(release.wait)
+
+    # One call running and one queued fill the default limit of two
+    callers = [threading.Thread(target=held) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    started.wait()
+    while hasher._slots._value:
+        threading.Event().wait(0.01)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('password')
+
+    release.set()
+    for caller in callers:
+        caller.join()
+    assert hasher.check('password', hasher.hash('password'))
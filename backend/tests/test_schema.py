@@ -0,0 +1,22 @@
+from sqlalchemy import insert, text
+
+from app import db, search
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+from app.schema import upgrade
+
+
+def test_upgrade_indexes_existing_rows(app):
+    user = User(email='client@example.com', role='client', first_name='Robin')
+    db.session.add(user)
+    db.session.commit()
+    # A database from before the search index: rows written without it
+    db.session.execute(text('DROP TABLE search_index'))
+    db.session.execute(insert(TaxReturn.__table__).values(
+        user_id=user.id, tax_year=2023, status='review', notes='crypto gains'))
+    db.session.commit()
+
+    assert 'search_index' in upgrade()
+    [result] = search.search('crypto')
+    assert (result['kind'], result['user_id']) == ('tax_return', user.id)
+    assert [row['id'] for row in search.search('robin', kinds=['tax_return'])] == [result['id']]
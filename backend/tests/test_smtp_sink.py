@@ -0,0 +1,35 @@
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from app.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink() as sink:
+        yield sink
+
+
+def test_message_is_kept(sink):
+    received = []
+    sink.on_message = lambda mail_from, rcpt_to, message: received.append(rcpt_to)
+
+    message = EmailMessage()
+    message['Subject'] = 'Documents received'
+    message['From'] = 'no-reply@localhost'
+    message['To'] = 'client@example.com'
+    message.set_content('We received return.pdf\n.\n..leading dots survive\n')
+
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        smtp.login('user', 'secret')
+        smtp.send_message(message)
+
+    assert sink.connections == 1
+    assert received == [['client@example.com']]
+    [stored] = sink.messages
+    assert stored['from'] == 'no-reply@localhost'
+    assert stored['message']['Subject'] == 'Documents received'
+    # Lines arrive as sent on the wire, with dot-stuffing undone
+    assert stored['message'].get_content().replace('\r\n', '\n') == 'We received return.pdf\n.\n..leading dots survive\n'
@@ -0,0 +1,17 @@
+from app import db, stats
+from app.analytics import CHANGE_KEY
+from app.models.dashboard_stat import DashboardStat
+from app.models.user import User
+
+
+def test_upgrade_seeds_counter_rows(app):
+    rows = {row.key: row.value for row in DashboardStat.query.all()}
+    assert rows == {key: 0 for key in (*stats.STAT_KEYS, CHANGE_KEY)}
+
+
+def test_first_writes_are_counted(app):
+    # Without seeded rows the adjust() UPDATEs would match nothing
+    db.session.add(User(email='client@example.com', password_hash='', role='client'))
+    db.session.commit()
+    assert stats.read()['total_users'] == 1
+    assert stats.rebuild() == stats.read()
@@ -0,0 +1,74 @@
+import io
+import os
+import urllib.request
+
+import pytest
+
+from app import db
+from app.blob_store import BlobStore
+from app.s3_sink import S3Sink
+from app.storage import S3Storage
+
+pytest.importorskip('boto3')
+
+CONTENT = b'0123456789 stored in s3'
+
+
+@pytest.fixture
+def sink():
+    with S3Sink() as sink:
+        yield sink
+
+
+@pytest.fixture
+def storage(sink, monkeypatch):
+    # The sink does not check signatures, but botocore needs credentials
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    return S3Storage('documents', 'blobs/', endpoint_url=sink.endpoint_url, region='us-east-1')
+
+
+def staged(tmp_path, content=CONTENT):
+    path = tmp_path / 'upload'
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_save_download_and_delete(storage, sink, tmp_path):
+    storage.save('abc123', staged(tmp_path))
+    assert storage.exists('abc123')
+    assert sink.keys('documents') == [storage.object_key('abc123')]
+
+    request = urllib.request.Request(storage.download_url('abc123', 'return.pdf'),
+                                     headers={'Range': 'bytes=2-5'})
+    with urllib.request.urlopen(request) as response:
+        assert response.status == 206
+        assert response.headers['Content-Range'] == f'bytes 2-5/{len(CONTENT)}'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="return.pdf"'
+        assert response.read() == CONTENT[2:6]
+
+    with storage.local_copy('abc123') as path:
+        with open(path, 'rb') as f:
+            assert f.read() == CONTENT
+
+    storage.delete('abc123')
+    assert not storage.exists('abc123')
+    assert sink.keys('documents') == []
+
+
+def test_duplicate_content_is_put_once(app, storage, tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    store.storage = storage
+    puts = []
+    save = storage.save
+    monkeypatch.setattr(storage, 'save', lambda key, path: puts.append(key) or save(key, path))
+
+    for owner_uid in ('uid-1', 'uid-2'):
+        tmp, sha256, size = store.save_stream(io.BytesIO(CONTENT))
+        store.ingest(owner_uid, 'a.pdf', tmp, sha256, size)
+        db.session.commit()
+
+    assert puts == [sha256]
+    assert store.resolve('uid-2', 'a.pdf') is not None
+    # The duplicate's staged copy is not left behind
+    assert os.listdir(store.tmp_dir) == []
@@ -0,0 +1,37 @@
+import pytest
+
+from app import db
+from app.models.tax_return import TaxReturn
+from app.models.user import User
+from app.tax_engine import compute_tax, recompute_year
+
+
+@pytest.fixture
+def returns(app):
+    user = User(email='client@example.com', role='client')
+    db.session.add(user)
+    db.session.flush()
+    returns = [TaxReturn(user_id=user.id, tax_year=2023, filing_type='individual', status=status,
+                         total_income=50000.0 + i * 1000, total_deductions=5000.0, total_tax=1.0)
+               for i, status in enumerate(['in_progress'] * 4 + ['completed'])]
+    db.session.add_all(returns)
+    db.session.commit()
+    return returns
+
+
+def expected(tax_return):
+    return compute_tax(tax_return.total_income, tax_return.total_deductions, 2023, 'individual')
+
+
+def test_completed_returns_are_kept(returns):
+    result = recompute_year(2023, batch_size=3)
+    assert result == {'tax_year': 2023, 'updated': 4, 'skipped': 0}
+    db.session.expire_all()
+    assert [r.total_tax for r in returns[:4]] == [expected(r) for r in returns[:4]]
+    assert returns[4].total_tax == 1.0
+
+
+def test_include_completed(returns):
+    assert recompute_year(2023, include_completed=True, batch_size=2)['updated'] == 5
+    db.session.expire_all()
+    assert returns[4].total_tax == expected(returns[4])
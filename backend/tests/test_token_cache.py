@@ -0,0 +1,94 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app import token_cache
+from app.token_cache import StaticKeySet, TokenVerifier
+
+PROJECT = 'test-project'
+
+
+@pytest.fixture(scope='module')
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def verifier(private_key):
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return TokenVerifier(max_ttl=300, key_set=StaticKeySet({'k1': public_pem}), project_id=PROJECT)
+
+
+def make_token(private_key, kid='k1', lifetime=3600, **overrides):
+    now = int(time.time())
+    claims = {
+        'sub': 'uid-1',
+        'email': 'client@example.com',
+        'aud': PROJECT,
+        'iss': f'https://securetoken.google.com/{PROJECT}',
+        'iat': now,
+        'exp': now + lifetime
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+def test_verify_caches_claims(verifier, private_key):
+    token = make_token(private_key)
+    claims = verifier.verify(token)
+    assert claims['uid'] == 'uid-1'
+    assert verifier.verify(token) == claims
+    assert (verifier.hits, verifier.misses) == (1, 1)
+
+
+def test_different_tokens_miss(verifier, private_key):
+    verifier.verify(make_token(private_key, sub='uid-1'))
+    verifier.verify(make_token(private_key, sub='uid-2'))
+    assert (verifier.hits, verifier.misses) == (0, 2)
+
+
+def test_cache_entry_expires_with_token(verifier, private_key, monkeypatch):
+    # exp is 60s away, well inside max_ttl, so the entry must not outlive it
+    token = make_token(private_key, lifetime=60)
+    start = time.time()
+    verifier.verify(token)
+
+    monkeypatch.setattr(token_cache.time, 'time', lambda: start + 59)
+    verifier.verify(token)
+    assert verifier.hits == 1
+
+    # Past exp the cached claims are dropped and the token is checked again
+    monkeypatch.setattr(token_cache.time, 'time', lambda: start + 61)
+    verifier.verify(token)
+    assert (verifier.hits, verifier.misses) == (1, 2)
+
+
+def test_cache_entry_capped_at_max_ttl(verifier, private_key, monkeypatch):
+    token = make_token(private_key, lifetime=3600)
+    start = time.time()
+    verifier.verify(token)
+    monkeypatch.setattr(token_cache.time, 'time', lambda: start + 301)
+    verifier.verify(token)
+    assert (verifier.hits, verifier.misses) == (0, 2)
+
+
+@pytest.mark.parametrize('overrides, error', [
+    ({'aud': 'other-project'}, jwt.InvalidAudienceError),
+    ({'iss': 'https://securetoken.google.com/other-project'}, jwt.InvalidIssuerError),
+    ({'kid': 'unknown'}, jwt.InvalidTokenError),
+])
+def test_rejects_wrong_audience_issuer_or_key(verifier, private_key, overrides, error):
+    kid = overrides.pop('kid', 'k1')
+    with pytest.raises(error):
+        verifier.verify(make_token(private_key, kid=kid, **overrides))
+    assert verifier.stats()['size'] == 0
+
+
+def test_rejects_token_signed_by_another_key(verifier):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(make_token(other_key))
@@ -4,6 +4,7 @@ export const API_ENDPOINTS = {
     // Auth endpoints
     LOGIN: `${API_BASE_URL}/auth/login`,
     REGISTER: `${API_BASE_URL}/auth/register`,
+    FIREBASE_LOGIN: `${API_BASE_URL}/auth/firebase`,
     
     // Document endpoints
     DOCUMENTS: `${API_BASE_URL}/documents`,
@@ -6,6 +6,7 @@ import {
   browserLocalPersistence,
   signOut as firebaseSignOut
 } from 'firebase/auth';
+import { signInToApi } from '../services/api';
 
 const AuthContext = createContext();
 
@@ -28,8 +29,18 @@ export function AuthProvider({ children }) {
       });
 
     // Then set up the auth state listener
-    const unsubscribe = onAuthStateChanged(auth, (user) => {
+    const unsubscribe = onAuthStateChanged(auth, async (user) => {
       console.log('Auth state changed:', user ? `User logged in: ${user.email}` : 'No user');
+      if (user) {
+        // Before rendering, so pages calling the API already hold its token
+        try {
+          await signInToApi(user);
+        } catch (error) {
+          console.error('Error signing in to the API:', error);
+        }
+      } else {
+        localStorage.removeItem('token');
+      }
       setCurrentUser(user);
       setLoading(false);
     });
@@ -40,6 +51,7 @@ export function AuthProvider({ children }) {
   const signOut = async () => {
     try {
       await firebaseSignOut(auth);
+      localStorage.removeItem('token');
     } catch (error) {
       console.error('Error signing out:', error);
       throw error;
@@ -28,74 +28,71 @@ import {
   Visibility as ViewIcon,
   Download as DownloadIcon,
 } from '@mui/icons-material';
-import { collection, query, getDocs, doc, getDoc } from 'firebase/firestore';
-import { ref, getDownloadURL } from 'firebase/storage';
-import { db, storage } from '../firebase';
-import { useAuth } from '../contexts/AuthContext';
+import api from '../services/api';
+
+const formatDate = (value) => (value ? new Date(value).toLocaleDateString() : '—');
 
 const ClientManagement = () => {
-  const { currentUser } = useAuth();
   const [clients, setClients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [selectedClient, setSelectedClient] = useState(null);
   const [documents, setDocuments] = useState([]);
+  const [documentsLoading, setDocumentsLoading] = useState(false);
   const [error, setError] = useState('');
   const [openDialog, setOpenDialog] = useState(false);
   const [loading, setLoading] = useState(true);
 
-  // Fetch clients and their documents
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const clientsQuery = query(collection(db, 'users'));
-        const clientSnapshot = await getDocs(clientsQuery);
-        const clientList = clientSnapshot.docs
-          .map(doc => ({
-            id: doc.id,
-            ...doc.data()
-          }))
-          .filter(user => user.role === 'client'); // Only get clients
-
-        // Get documents for each client
-        const clientsWithDocs = await Promise.all(
-          clientList.map(async (client) => {
-            const docsQuery = query(collection(db, 'documents'));
-            const docsSnapshot = await getDocs(docsQuery);
-            const clientDocs = docsSnapshot.docs
-              .filter(doc => doc.data().userId === client.id)
-              .map(doc => ({
-                id: doc.id,
-                ...doc.data()
-              }));
-            return {
-              ...client,
-              documents: clientDocs
-            };
-          })
-        );
-
-        setClients(clientsWithDocs);
-        setLoading(false);
-      } catch (error) {
-        console.error('Error fetching clients:', error);
-        setError('Failed to load clients');
-        setLoading(false);
-      }
-    };
+  // One page of clients with their document counts and latest return,
+  // aggregated on the server
+  const fetchClients = async (cursor) => {
+    try {
+      const response = await api.get('/admin/clients', {
+        params: cursor ? { cursor } : {},
+      });
+      setClients((previous) => (cursor ? [...previous, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching clients:', error);
+      setError('Failed to load clients');
+    } finally {
+      setLoading(false);
+    }
+  };
 
-    fetchData();
+  useEffect(() => {
+    fetchClients();
   }, []);
 
+  // The overview only carries counts; the files are fetched per client
   const handleViewDocuments = async (client) => {
     setSelectedClient(client);
-    setDocuments(client.documents || []);
+    setDocuments([]);
     setOpenDialog(true);
+    setDocumentsLoading(true);
+    try {
+      const response = await api.get(`/admin/clients/${client.id}/documents`);
+      setDocuments(response.data);
+    } catch (error) {
+      console.error('Error fetching documents:', error);
+      setError('Failed to load documents');
+    } finally {
+      setDocumentsLoading(false);
+    }
   };
 
-  const handleDownload = async (document) => {
+  // Through the API client so the request carries the access token
+  const handleDownload = async (doc) => {
     try {
-      const fileRef = ref(storage, `documents/${document.fileName}`);
-      const url = await getDownloadURL(fileRef);
-      window.open(url, '_blank');
+      const response = await api.get(
+        `/admin/clients/${selectedClient.id}/documents/${encodeURIComponent(doc.path)}`,
+        { responseType: 'blob' }
+      );
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = doc.path;
+      link.click();
+      window.URL.revokeObjectURL(url);
     } catch (error) {
       console.error('Error downloading document:', error);
       setError('Failed to download document');
@@ -137,22 +134,30 @@ const ClientManagement = () => {
               <TableCell>Name</TableCell>
               <TableCell>Email</TableCell>
               <TableCell>Documents</TableCell>
+              <TableCell>Last Upload</TableCell>
+              <TableCell>Latest Return</TableCell>
               <TableCell>Actions</TableCell>
             </TableRow>
           </TableHead>
           <TableBody>
             {clients.map((client) => (
               <TableRow key={client.id}>
-                <TableCell>{`${client.firstName} ${client.lastName}`}</TableCell>
+                <TableCell>{`${client.first_name || ''} ${client.last_name || ''}`}</TableCell>
                 <TableCell>{client.email}</TableCell>
                 <TableCell>
                   <Chip
                     icon={<FolderIcon />}
-                    label={`${client.documents?.length || 0} documents`}
+                    label={`${client.document_count} documents`}
                     color="primary"
                     variant="outlined"
                   />
                 </TableCell>
+                <TableCell>{formatDate(client.last_upload)}</TableCell>
+                <TableCell>
+                  {client.latest_return
+                    ? `${client.latest_return.tax_year}: ${client.latest_return.status.replace('_', ' ')}`
+                    : '—'}
+                </TableCell>
                 <TableCell>
                   <IconButton
                     color="primary"
@@ -168,6 +173,14 @@ const ClientManagement = () => {
         </Table>
       </TableContainer>
 
+      {nextCursor && (
+        <Box display="flex" justifyContent="center" mt={2}>
+          <Button variant="outlined" onClick={() => fetchClients(nextCursor)}>
+            Load more
+          </Button>
+        </Box>
+      )}
+
       <Dialog
         open={openDialog}
         onClose={handleCloseDialog}
@@ -175,10 +188,12 @@ const ClientManagement = () => {
         fullWidth
       >
         <DialogTitle>
-          Documents for {selectedClient?.firstName} {selectedClient?.lastName}
+          Documents for {selectedClient?.first_name} {selectedClient?.last_name}
         </DialogTitle>
         <DialogContent>
-          {documents.length === 0 ? (
+          {documentsLoading ? (
+            <Typography>Loading...</Typography>
+          ) : documents.length === 0 ? (
             <Typography color="textSecondary">No documents uploaded yet.</Typography>
           ) : (
             <List>
@@ -199,8 +214,8 @@ const ClientManagement = () => {
                     <DocumentIcon />
                   </ListItemIcon>
                   <ListItemText
-                    primary={doc.fileName}
-                    secondary={new Date(doc.uploadDate).toLocaleDateString()}
+                    primary={doc.path}
+                    secondary={formatDate(doc.created_at)}
                   />
                 </ListItem>
               ))}
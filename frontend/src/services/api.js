@@ -1,4 +1,6 @@
 import axios from 'axios';
+import { auth } from '../firebase';
+import API_ENDPOINTS from '../config/api';
 
 // Create axios instance with default config
 const api = axios.create({
@@ -8,6 +10,15 @@ const api = axios.create({
   },
 });
 
+// Users sign in with Firebase; the API takes its own access token, which is
+// issued in exchange for the Firebase ID token
+export const signInToApi = async (user) => {
+  const idToken = await user.getIdToken();
+  const response = await axios.post(API_ENDPOINTS.FIREBASE_LOGIN, { id_token: idToken });
+  localStorage.setItem('token', response.data.access_token);
+  return response.data;
+};
+
 // Add a request interceptor
 api.interceptors.request.use(
   (config) => {
@@ -25,7 +36,18 @@ api.interceptors.request.use(
 // Add a response interceptor
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const { config } = error;
+    if (error.response?.status === 401 && auth.currentUser && !config._retried) {
+      // The access token expired or was revoked; exchange again once
+      config._retried = true;
+      try {
+        await signInToApi(auth.currentUser);
+        return api(config);
+      } catch (exchangeError) {
+        console.error('Error signing in to the API:', exchangeError);
+      }
+    }
     if (error.response?.status === 401) {
       // Handle unauthorized access
       localStorage.removeItem('token');